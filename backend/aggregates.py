@@ -0,0 +1,187 @@
+"""
+In-process spend aggregates.
+
+Keeps per-category, per-month and per-(category, month) expense totals plus
+overall total and counts. Writes made through the store in this process are folded in
+incrementally; a write from anywhere else (another worker, the offline
+pipeline) shows up as a version gap and triggers a rebuild on next read.
+
+With a SharedCache (multi-worker server) every worker publishes its state
+after a fold or rebuild, keyed by store and version; a worker that sees a
+version gap first adopts the published state for the current version and
+only scans the store when there is none.
+"""
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+AGGREGATE_COLUMNS = ["Date", "Month", "Category", "Amount", "Is_Expense"]
+
+
+def _expense_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Expense rows with a usable Amount and Category, plus a YYYY-MM key."""
+    if df.empty or "Amount" not in df.columns or "Category" not in df.columns:
+        return pd.DataFrame(columns=["Category", "Amount", "MonthKey"])
+    if "Is_Expense" in df.columns:
+        df = df[df["Is_Expense"] == True]
+    amount = pd.to_numeric(df["Amount"], errors="coerce").replace([np.inf, -np.inf], np.nan)
+    out = pd.DataFrame({"Category": df["Category"], "Amount": amount})
+    if "Date" in df.columns:
+        month = df["Date"].astype(str).str.slice(0, 7)
+        month = month.where(df["Date"].notna())
+    else:
+        month = pd.Series(np.nan, index=df.index)
+    if "Month" in df.columns:
+        month = month.fillna(df["Month"].astype(str))
+    out["MonthKey"] = month
+    return out.dropna(subset=["Amount", "Category"])
+
+
+class SpendAggregates:
+    """
+    Running totals over the store. Call `attach(store)` once; `snapshot()`
+    then returns current figures, rebuilding only when the store version has
+    moved past what was folded in.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._store = None
+        self._shared = None
+        self._version: Optional[int] = None
+        self._reset()
+
+    def _reset(self):
+        self.by_category: Dict[str, list] = {}  # category -> [total, count]
+        self.by_month: Dict[str, list] = {}
+        self.by_category_month: Dict[tuple, list] = {}  # (category, month) -> [total, count]
+        self.total = 0.0
+        self.count = 0
+
+    def attach(self, store, shared=None):
+        """Follow `store`; `shared` is an optional sharedcache.SharedCache."""
+        self._store = store
+        self._shared = shared
+        store.subscribe(self._on_write)
+
+    def _publish(self):
+        if self._shared is None or self._version is None:
+            return
+        state = (self.by_category, self.by_month, self.by_category_month, self.total, self.count)
+        try:
+            self._shared.put("aggregates", self._store.location, state, version=self._version)
+        except Exception as e:
+            print(f"Failed to publish spend aggregates: {e}")
+
+    def _adopt(self, version: int) -> bool:
+        """Take the state another worker published for `version`, if any."""
+        if self._shared is None:
+            return False
+        try:
+            found = self._shared.get_versioned("aggregates", self._store.location)
+        except Exception as e:
+            print(f"Failed to read shared spend aggregates: {e}")
+            return False
+        if found is None or found[0] != version:
+            return False
+        self.by_category, self.by_month, self.by_category_month, self.total, self.count = found[1]
+        self._version = version
+        return True
+
+    def _fold(self, df: pd.DataFrame):
+        rows = _expense_rows(df)
+        if rows.empty:
+            return
+        self.total += float(rows["Amount"].sum())
+        self.count += len(rows)
+        for key_col, target in (("Category", self.by_category), ("MonthKey", self.by_month)):
+            grouped = rows.dropna(subset=[key_col]).groupby(key_col)["Amount"].agg(["sum", "count"])
+            for key, (amt, n) in zip(grouped.index, grouped.to_numpy()):
+                slot = target.setdefault(str(key), [0.0, 0])
+                slot[0] += float(amt)
+                slot[1] += int(n)
+        grouped = rows.dropna(subset=["MonthKey"]).groupby(["Category", "MonthKey"])["Amount"].agg(["sum", "count"])
+        for (cat, month), (amt, n) in zip(grouped.index, grouped.to_numpy()):
+            slot = self.by_category_month.setdefault((str(cat), str(month)), [0.0, 0])
+            slot[0] += float(amt)
+            slot[1] += int(n)
+
+    def _on_write(self, df: Optional[pd.DataFrame], version: int):
+        with self._lock:
+            if df is not None and self._version is not None and version == self._version + 1:
+                self._fold(df)
+                self._version = version
+                self._publish()
+            else:
+                # Missed a write (or the dataset was replaced): rebuild lazily
+                self._version = None
+
+    def rebuild(self):
+        with self._lock:
+            self._rebuild_locked()
+            self._publish()
+
+    def _rebuild_locked(self, attempts: int = 3):
+        # If the version moves while we scan, a write may be half-counted, so
+        # scan again. Writes landing after the scan are folded in by _on_write.
+        for _ in range(attempts):
+            before = self._store.version()
+            self._reset()
+            for chunk in self._store.iter_read(chunk_size=50000, columns=AGGREGATE_COLUMNS):
+                self._fold(chunk)
+            if self._store.version() == before:
+                self._version = before
+                return
+        self._version = None
+
+    def _ensure_fresh(self):
+        if self._version is not None and self._store.version() == self._version:
+            return
+        if self._adopt(self._store.version()):
+            return
+        self._rebuild_locked()
+        self._publish()
+
+    def snapshot(self, top: Optional[int] = None) -> dict:
+        """
+        Totals as plain dicts: categories sorted by spend (optionally only the
+        `top` ones), months in calendar order.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            categories = sorted(self.by_category.items(), key=lambda kv: kv[1][0], reverse=True)
+            if top is not None:
+                categories = categories[:top]
+            return {
+                "version": self._version,
+                "total": round(self.total, 2),
+                "count": self.count,
+                "by_category": [
+                    {"category": cat, "total": round(amt, 2), "count": n} for cat, (amt, n) in categories
+                ],
+                "by_month": [
+                    {"month": month, "total": round(amt, 2), "count": n}
+                    for month, (amt, n) in sorted(self.by_month.items())
+                ],
+            }
+
+    def monthly_totals(self) -> pd.DataFrame:
+        """
+        Expense totals as a month x category frame covering every calendar
+        month from the first to the last one seen (0 where nothing was spent).
+        """
+        with self._lock:
+            self._ensure_fresh()
+            items = [(cat, month, amt) for (cat, month), (amt, _) in self.by_category_month.items()]
+        if not items:
+            return pd.DataFrame()
+        df = pd.DataFrame(items, columns=["Category", "Month", "Amount"])
+        df["Month"] = pd.to_datetime(df["Month"], format="%Y-%m", errors="coerce").dt.to_period("M")
+        df = df.dropna(subset=["Month"])
+        if df.empty:
+            return pd.DataFrame()
+        wide = df.pivot_table(index="Month", columns="Category", values="Amount", aggfunc="sum")
+        months = pd.period_range(wide.index.min(), wide.index.max(), freq="M")
+        return wide.reindex(months).fillna(0.0).sort_index(axis=1)
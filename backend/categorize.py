@@ -0,0 +1,393 @@
+"""
+Merchant categorization engine.
+
+Lookups run cheapest first: the keyword rules (one compiled regex), an
+exact-match dictionary of normalized merchant names seen in training data,
+a bounded LRU memo of earlier model answers, and only then the TF-IDF +
+RandomForest model, fed the sparse TF-IDF row directly. Batches run the
+model once over all remaining distinct merchants.
+
+CategoryBackfill rewrites stored "Uncategorized" rows with predicted labels.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from metrics import span
+from sharedcache import pid_alive
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    # Windows: a backfill is only guarded within this process
+    HAS_FCNTL = False
+
+# Rule-based overrides for free-form inputs (non-merchant names). Earlier
+# rules win when several match.
+KEYWORD_RULES = [
+    (["medicine", "medicin", "pharmacy", "chemist", "drug", "tablet", "capsule", "hospital", "clinic"], "Health"),
+    (["egg", "grocery", "supermarket", "market", "mart", "vegetable", "fruit"], "Groceries"),
+    (["fine", "penalty", "challan", "ticket"], "Fees & Fines"),
+    (["fuel", "petrol", "diesel", "gas station", "pump"], "Transport"),
+    (["uber", "ola", "lyft", "cab", "taxi"], "Transport"),
+]
+
+MEMO_SIZE = 4096
+UNCATEGORIZED = "Uncategorized"
+BACKFILL_CHUNK_ROWS = 5000
+BACKFILL_NAMESPACE = "category_backfill"
+
+
+def normalize_merchant(text: str) -> str:
+    """
+    Lowercase, turn punctuation into spaces and collapse whitespace. The
+    TF-IDF vectorizer (lowercase, \\w\\w+ tokens) sees the same tokens in the
+    normalized and the raw text, so model answers can be keyed on it.
+    """
+    return " ".join(re.sub(r"[^\w]+", " ", str(text).lower()).split())
+
+
+class KeywordMatcher:
+    """
+    All keyword rules as one regex. A zero-width lookahead tries every
+    position, so overlapping keywords are all seen; the lowest rule index
+    among them wins, same as checking the rules in order.
+    """
+
+    def __init__(self, rules=KEYWORD_RULES):
+        self._rule_of: Dict[str, int] = {}
+        for i, (keywords, _) in enumerate(rules):
+            for k in keywords:
+                self._rule_of.setdefault(k, i)
+        self._labels = [label for _, label in rules]
+        # At one position the alternation picks the first listed keyword,
+        # so list them by rule index
+        ordered = sorted(self._rule_of, key=lambda k: (self._rule_of[k], -len(k)))
+        self._pattern = re.compile("(?=(" + "|".join(re.escape(k) for k in ordered) + "))")
+
+    def match(self, lower: str) -> Optional[str]:
+        best = None
+        for m in self._pattern.finditer(lower):
+            rule = self._rule_of[m.group(1)]
+            if best is None or rule < best:
+                best = rule
+                if best == 0:
+                    break
+        return None if best is None else self._labels[best]
+
+
+def build_merchant_lookup(merchants, categories, min_share: float = 0.95, labels=None) -> Dict[str, str]:
+    """
+    Normalized merchant -> category for merchants whose training rows agree
+    on one category at least `min_share` of the time. With `labels` (the
+    model's classes), categories outside them are left out.
+    """
+    df = pd.DataFrame({"key": pd.Series(merchants).astype(str).map(normalize_merchant),
+                       "Category": pd.Series(categories).astype(str).to_numpy()})
+    df = df[(df["key"] != "") & (df["Category"] != UNCATEGORIZED)]
+    if labels is not None:
+        df = df[df["Category"].isin(set(labels))]
+    if df.empty:
+        return {}
+    counts = df.groupby(["key", "Category"]).size().rename("n").reset_index()
+    counts["share"] = counts["n"] / counts.groupby("key")["n"].transform("sum")
+    top = counts.sort_values("n", ascending=False).drop_duplicates("key")
+    top = top[top["share"] >= min_share]
+    return dict(zip(top["key"], top["Category"]))
+
+
+class MerchantCategorizer:
+    """
+    categorize(text) -> (category, source) with source one of "rule",
+    "lookup", "memo" or "model". Returns (None, None) when only the model
+    could answer and it is not loaded. Thread-safe.
+    """
+
+    def __init__(self, vectorizer=None, model=None, encoder=None,
+                 lookup: Optional[Dict[str, str]] = None, memo_size: int = MEMO_SIZE):
+        self.vectorizer = vectorizer
+        self.model = model
+        self.encoder = encoder
+        # Lookup answers stay within the model's label set
+        labels = set(encoder.classes_) if encoder is not None else None
+        self.lookup = {k: v for k, v in (lookup or {}).items() if labels is None or v in labels}
+        self.matcher = KeywordMatcher()
+        self.memo_size = memo_size
+        self._memo: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counts = {"blank": 0, "rule": 0, "lookup": 0, "memo": 0, "model": 0, "unavailable": 0}
+
+    @property
+    def has_model(self) -> bool:
+        return self.vectorizer is not None and self.model is not None and self.encoder is not None
+
+    def _count(self, source: str, n: int = 1):
+        with self._lock:
+            self.counts[source] += n
+
+    def _memo_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            label = self._memo.get(key)
+            if label is not None:
+                self._memo.move_to_end(key)
+            return label
+
+    def _memo_put(self, key: str, label: str):
+        with self._lock:
+            self._memo[key] = label
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+    def predict_model(self, text: str) -> str:
+        return self.predict_many([text])[0]
+
+    def predict_many(self, texts: List[str]) -> np.ndarray:
+        # transform() returns a CSR matrix; the forest predicts on it as-is
+        with span("feature_build"):
+            X = self.vectorizer.transform(texts)
+        with span("model_predict"):
+            encoded = self.model.predict(X)
+        return self.encoder.inverse_transform(encoded)
+
+    def categorize(self, text: str) -> Tuple[Optional[str], Optional[str]]:
+        key = normalize_merchant(text)
+        if not key:
+            # Nothing for the rules or the model to go on
+            self._count("blank")
+            return UNCATEGORIZED, "blank"
+
+        label = self.matcher.match(str(text).lower())
+        if label is not None:
+            self._count("rule")
+            return label, "rule"
+
+        label = self.lookup.get(key)
+        if label is not None:
+            self._count("lookup")
+            return label, "lookup"
+
+        label = self._memo_get(key)
+        if label is not None:
+            self._count("memo")
+            return label, "memo"
+
+        if not self.has_model:
+            self._count("unavailable")
+            return None, None
+        label = self.predict_model(key)
+        self._memo_put(key, label)
+        self._count("model")
+        return label, "model"
+
+    def categorize_many(self, texts) -> Tuple[List[Optional[str]], List[Optional[str]], dict]:
+        """
+        Categorize a list of texts. Each distinct text goes through the fast
+        paths once; every distinct merchant left over is vectorized and
+        predicted in a single transform/predict call. Returns
+        (categories, sources, info) with categories None where only the
+        missing model could answer. Blank texts (None, empty, whitespace or
+        punctuation only) are "Uncategorized" without reaching the model.
+        """
+        texts = ["" if t is None else str(t) for t in texts]
+        uniques, inverse = np.unique(np.asarray(texts, dtype=object).astype(str), return_inverse=True)
+        labels = np.empty(len(uniques), dtype=object)
+        sources = np.empty(len(uniques), dtype=object)
+        pending: Dict[str, List[int]] = {}
+        for i, text in enumerate(uniques):
+            key = normalize_merchant(text)
+            if not key:
+                labels[i], sources[i] = UNCATEGORIZED, "blank"
+                continue
+            label = self.matcher.match(text.lower())
+            source = "rule"
+            if label is None:
+                label, source = self.lookup.get(key), "lookup"
+            if label is None:
+                label, source = self._memo_get(key), "memo"
+            if label is None:
+                pending.setdefault(key, []).append(i)
+                continue
+            labels[i], sources[i] = label, source
+
+        if pending and self.has_model:
+            keys = list(pending)
+            for key, label in zip(keys, self.predict_many(keys)):
+                self._memo_put(key, label)
+                for i in pending[key]:
+                    labels[i], sources[i] = label, "model"
+
+        row_sources = sources[inverse]
+        for source in self.counts:
+            n = int((row_sources == source).sum())
+            if n:
+                self._count(source, n)
+        missing = int(pd.isna(row_sources).sum())
+        if missing:
+            self._count("unavailable", missing)
+        info = {"rows": len(texts), "distinct": len(uniques),
+                "model_rows": len(pending) if self.has_model else 0}
+        return list(labels[inverse]), list(row_sources), info
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+            memo_entries = len(self._memo)
+        total = sum(counts.values())
+        fast = counts["blank"] + counts["rule"] + counts["lookup"] + counts["memo"]
+        return {
+            "requests": total,
+            "by_source": counts,
+            "fast_path_hit_rate": round(fast / total, 4) if total else None,
+            "memo_hit_rate": (
+                round(counts["memo"] / (counts["memo"] + counts["model"]), 4)
+                if counts["memo"] + counts["model"] else None
+            ),
+            "memo_entries": memo_entries,
+            "memo_size": self.memo_size,
+            "lookup_entries": len(self.lookup),
+        }
+
+
+class CategoryBackfill:
+    """
+    Walks stored rows with Category == "Uncategorized" in id order, predicts
+    a category for each chunk and writes it back with store.update_column.
+    The last id handled is checkpointed to `checkpoint_path` after every
+    chunk, so a run interrupted by a restart resumes where it stopped.
+
+    start() holds an exclusive lock on `checkpoint_path`.lock while it runs,
+    so two processes never backfill the same store. With a `shared`
+    sharedcache.SharedCache the status is published there, and get() in
+    any worker reports the latest run, wherever it ran.
+    """
+
+    def __init__(self, checkpoint_path: str, chunk_rows: int = BACKFILL_CHUNK_ROWS, shared=None):
+        self.checkpoint_path = checkpoint_path
+        self.chunk_rows = chunk_rows
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.status = {"status": "idle", "after_id": self._load_checkpoint(), "updated": 0,
+                       "chunks": 0, "ms_per_10k": None, "error": None,
+                       "started_at": None, "finished_at": None, "pid": os.getpid()}
+
+    def _load_checkpoint(self) -> Optional[int]:
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f).get("after_id")
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save_checkpoint(self, after_id: Optional[int]):
+        if after_id is None:
+            if os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
+            return
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"after_id": after_id, "saved_at": time.time()}, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def _update(self, **fields):
+        with self._lock:
+            self.status.update(fields, pid=os.getpid())
+            status = dict(self.status)
+        if self.shared is not None:
+            try:
+                self.shared.put(BACKFILL_NAMESPACE, self.checkpoint_path, status)
+            except Exception as e:
+                print(f"Category backfill: cannot publish status: {e}")
+
+    @property
+    def running(self) -> bool:
+        """A run started by this process is still going."""
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def get(self) -> dict:
+        """Status of the latest run (blocking with a shared cache)."""
+        with self._lock:
+            status = dict(self.status)
+        if self.shared is None or status["status"] in ("queued", "running"):
+            return status
+        published = self.shared.get(BACKFILL_NAMESPACE, self.checkpoint_path)
+        if published is None:
+            return status
+        if published["status"] in ("queued", "running") and not pid_alive(published["pid"]):
+            published.update(status="failed", error="The worker running the backfill exited")
+        return published
+
+    def _claim(self):
+        """Open file holding the cross-process run lock, or None if another process has it."""
+        fh = open(self.checkpoint_path + ".lock", "a")
+        if HAS_FCNTL:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                fh.close()
+                return None
+        return fh
+
+    def _run_claimed(self, store, categorizer, claim):
+        try:
+            self.run(store, categorizer)
+        finally:
+            # Closing the file releases the lock
+            claim.close()
+
+    def run(self, store, categorizer) -> dict:
+        """Backfill in the calling thread, resuming from the checkpoint."""
+        after_id = self._load_checkpoint()
+        self._update(status="running", after_id=after_id, updated=0, chunks=0, error=None,
+                     started_at=time.time(), finished_at=None)
+        if not categorizer.has_model:
+            self._update(status="failed", error="Categorization model not loaded", finished_at=time.time())
+            return self.get()
+        updated, predict_s = 0, 0.0
+        try:
+            while True:
+                chunk = store.read(columns=["Merchant"], categories=[UNCATEGORIZED],
+                                   after_id=after_id, limit=self.chunk_rows)
+                if chunk.empty:
+                    break
+                start = time.perf_counter()
+                labels, _, _ = categorizer.categorize_many(chunk["Merchant"].fillna("").tolist())
+                predict_s += time.perf_counter() - start
+                updated += store.update_column(chunk.index, "Category", labels)
+                after_id = int(chunk.index[-1])
+                self._save_checkpoint(after_id)
+                self._update(after_id=after_id, updated=updated, chunks=self.status["chunks"] + 1,
+                             ms_per_10k=round(predict_s * 1000 * 10000 / updated, 2) if updated else None)
+                if len(chunk) < self.chunk_rows:
+                    break
+            # Finished: the next run starts from the beginning again
+            self._save_checkpoint(None)
+            self._update(status="completed", after_id=None, finished_at=time.time())
+        except Exception as e:
+            print(f"Category backfill failed: {e}")
+            self._update(status="failed", error=str(e), finished_at=time.time())
+        return self.get()
+
+    def start(self, store, categorizer) -> bool:
+        """Run in a background thread; False if a run is already going here or in another process."""
+        with self._lock:
+            if self.running:
+                return False
+            claim = self._claim()
+            if claim is None:
+                return False
+            self._thread = threading.Thread(target=self._run_claimed, args=(store, categorizer, claim),
+                                            name="category-backfill", daemon=True)
+            self.status["status"] = "queued"
+        self._update()
+        self._thread.start()
+        return True
@@ -0,0 +1,424 @@
+"""
+Chat backends for the /chat endpoints.
+
+The API talks to a ChatBackend instead of the Gemini model directly, so a
+deterministic local stand-in can replace Gemini for load tests and offline
+CI (FINMATE_CHAT_BACKEND=local). Both support one-shot and streaming
+generation, and streaming calls record time-to-first-token and throughput.
+ChatGateway sits in front of either backend with a response cache, request
+coalescing and a token-bucket rate limiter. Under the multi-worker server
+the response cache is shared by all workers and the rate budget is split
+between them.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Optional
+
+from executors import run_io
+from sharedcache import SharedResponseCache
+
+SAFETY_FALLBACK = "I'm sorry, I couldn't generate a response for that query due to safety settings."
+
+
+def build_chat_prompt(query: str, context: str) -> str:
+    return (
+        "You are FinMate, a helpful and friendly financial assistant. "
+        "You have access to the user's recent spending summary below. "
+        "Use this context to answer questions if relevant. "
+        "If the user asks about something else, just answer normally. "
+        "Keep answers concise and practical.\n\n"
+        f"CONTEXT:\n{context}\n\n"
+        f"USER QUERY: {query}"
+    )
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count (words and punctuation runs)."""
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+class ChatBackend:
+    name = "base"
+
+    async def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield text pieces as they are produced."""
+        raise NotImplementedError
+
+
+class GeminiChatBackend(ChatBackend):
+    name = "gemini"
+
+    def __init__(self, model):
+        self.model = model
+
+    @staticmethod
+    def _has_text(response) -> bool:
+        return bool(response.candidates and response.candidates[0].content.parts)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt)
+        # Safety check
+        return response.text if self._has_text(response) else SAFETY_FALLBACK
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        produced = False
+        async for chunk in response:
+            if self._has_text(chunk):
+                produced = True
+                yield chunk.text
+        if not produced:
+            yield SAFETY_FALLBACK
+
+
+class LocalChatBackend(ChatBackend):
+    """
+    Deterministic stand-in: answers from the prompt's CONTEXT block without
+    any network call. `token_delay` (seconds) simulates generation speed.
+    """
+    name = "local"
+
+    def __init__(self, token_delay: float = 0.0):
+        self.token_delay = token_delay
+
+    @staticmethod
+    def _reply(prompt: str) -> str:
+        context = ""
+        query = prompt
+        if "CONTEXT:\n" in prompt:
+            context = prompt.split("CONTEXT:\n", 1)[1].split("\n\nUSER QUERY:", 1)[0]
+        if "USER QUERY:" in prompt:
+            query = prompt.split("USER QUERY:", 1)[1].strip()
+        lines = [line.strip(" -") for line in context.splitlines() if line.strip(" -")]
+        summary = "; ".join(lines[1:]) if len(lines) > 1 else "no transaction data yet"
+        return f'You asked: "{query}". Based on your records: {summary}. (local test backend)'
+
+    async def generate(self, prompt: str) -> str:
+        reply = self._reply(prompt)
+        if self.token_delay:
+            await asyncio.sleep(self.token_delay * count_tokens(reply))
+        return reply
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        for piece in re.findall(r"\S+\s*", self._reply(prompt)):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield piece
+
+
+def local_backend_from_env() -> LocalChatBackend:
+    return LocalChatBackend(token_delay=float(os.getenv("FINMATE_LOCAL_CHAT_DELAY_MS", "0")) / 1000)
+
+
+# --- Caching, coalescing and rate limiting ---
+
+def normalize_query(query: str) -> str:
+    """Lowercase, expand "'s", drop punctuation and collapse whitespace."""
+    text = query.lower().replace("'s", " is")
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def chat_cache_key(query: str, context: str) -> str:
+    """Same normalized question against the same spend snapshot -> same key."""
+    snapshot_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{normalize_query(query)}\0{snapshot_hash}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU cache with a per-entry time-to-live."""
+
+    # In process memory: safe to call from the event loop
+    blocking = False
+
+    def __init__(self, maxsize: int = 512, ttl: float = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: str):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RateLimited(Exception):
+    """Raised when the limiter queue is full."""
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` calls per second with bursts up to `capacity`.
+    Callers that find it empty wait in FIFO order; beyond `max_queue`
+    waiters, acquire() raises RateLimited instead of queueing.
+    """
+
+    def __init__(self, rate: float, capacity: float, max_queue: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.tokens = capacity
+        self.waiting = 0
+        self.max_waiting = 0
+        self.rejected = 0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise RateLimited("Chat is busy; please retry shortly")
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            # asyncio.Lock wakes waiters in FIFO order
+            async with self._lock:
+                while True:
+                    self._refill()
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+        finally:
+            self.waiting -= 1
+
+
+class ChatGateway(ChatBackend):
+    """
+    Wraps a ChatBackend with a response cache, coalescing of identical
+    in-flight requests and a token-bucket limiter, so only cache misses that
+    are not already being answered reach the upstream model.
+    """
+
+    def __init__(self, backend: ChatBackend, cache: ResponseCache, limiter: TokenBucket):
+        self.backend = backend
+        self.cache = cache
+        self.limiter = limiter
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    async def _cache_get(self, key: str) -> Optional[str]:
+        if self.cache.blocking:
+            return await run_io(self.cache.get, key)
+        return self.cache.get(key)
+
+    async def _cache_put(self, key: str, value: str):
+        if self.cache.blocking:
+            await run_io(self.cache.put, key, value)
+        else:
+            self.cache.put(key, value)
+
+    async def _remember(self, key: Optional[str], text: str):
+        # Only real answers are cached: not the safety refusal, not empty output
+        if key is not None and text and text != SAFETY_FALLBACK:
+            await self._cache_put(key, text)
+
+    async def _call_upstream(self, prompt: str, key: Optional[str]) -> str:
+        await self.limiter.acquire()
+        self.upstream_calls += 1
+        text = await self.backend.generate(prompt)
+        await self._remember(key, text)
+        return text
+
+    async def _stream_upstream(self, prompt: str, key: Optional[str], queue: asyncio.Queue) -> str:
+        """Stream into `queue` (None when done) and return the whole text."""
+        try:
+            await self.limiter.acquire()
+            self.upstream_calls += 1
+            pieces = []
+            async for piece in self.backend.stream(prompt):
+                pieces.append(piece)
+                queue.put_nowait(piece)
+        finally:
+            queue.put_nowait(None)
+        text = "".join(pieces)
+        await self._remember(key, text)
+        return text
+
+    async def generate(self, prompt: str, key: Optional[str] = None) -> str:
+        if key is not None:
+            cached = await self._cache_get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            task = self._inflight.get(key)
+            if task is not None:
+                self.coalesced += 1
+                return await asyncio.shield(task)
+        self.misses += 1
+        task = asyncio.ensure_future(self._call_upstream(prompt, key))
+        if key is not None:
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: one caller disconnecting must not cancel the shared call
+        return await asyncio.shield(task)
+
+    async def stream(self, prompt: str, key: Optional[str] = None) -> AsyncIterator[str]:
+        if key is not None:
+            cached = await self._cache_get(key)
+            if cached is not None:
+                self.hits += 1
+                yield cached
+                return
+            task = self._inflight.get(key)
+            if task is not None:
+                # Someone is already generating this answer; reuse it whole
+                self.coalesced += 1
+                yield await asyncio.shield(task)
+                return
+        self.misses += 1
+        # The upstream stream runs in its own task, registered like
+        # generate()'s, so identical requests wait for it and this caller
+        # disconnecting does not cut it short for them
+        queue = asyncio.Queue()
+        task = asyncio.ensure_future(self._stream_upstream(prompt, key, queue))
+        if key is not None:
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        while True:
+            piece = await queue.get()
+            if piece is None:
+                break
+            yield piece
+        # Re-raises upstream errors (e.g. RateLimited)
+        await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "cache_size": len(self.cache),
+            "upstream_calls": self.upstream_calls,
+            "in_flight": len(self._inflight),
+            "queue_depth": self.limiter.waiting,
+            "max_queue_depth": self.limiter.max_waiting,
+            "rate_limited": self.limiter.rejected,
+        }
+
+
+def gateway_from_env(backend: ChatBackend, shared=None) -> ChatGateway:
+    """`shared`: a sharedcache.SharedCache to keep responses in instead of process memory."""
+    ttl = float(os.getenv("FINMATE_CHAT_CACHE_TTL", "600"))
+    if shared is not None:
+        cache = SharedResponseCache(shared, ttl=ttl)
+    else:
+        cache = ResponseCache(maxsize=int(os.getenv("FINMATE_CHAT_CACHE_SIZE", "512")), ttl=ttl)
+    # FINMATE_CHAT_RPS / _BURST are for the whole server: each worker gets its share
+    workers = max(int(os.getenv("FINMATE_WORKERS", "1")), 1)
+    limiter = TokenBucket(
+        rate=float(os.getenv("FINMATE_CHAT_RPS", "0.5")) / workers,
+        capacity=max(float(os.getenv("FINMATE_CHAT_BURST", "5")) / workers, 1.0),
+        max_queue=int(os.getenv("FINMATE_CHAT_MAX_QUEUE", "20")),
+    )
+    return ChatGateway(backend, cache, limiter)
+
+
+class ChatMetrics:
+    """
+    Rolling time-to-first-token and tokens/sec figures over the last
+    `window` streamed responses.
+    """
+
+    def __init__(self, window: int = 500):
+        self._lock = threading.Lock()
+        self.ttft_ms = deque(maxlen=window)
+        self.tokens_per_sec = deque(maxlen=window)
+        self.streams = 0
+        self.errors = 0
+
+    def record(self, ttft_s: Optional[float], tokens: int, total_s: float):
+        with self._lock:
+            self.streams += 1
+            if ttft_s is not None:
+                self.ttft_ms.append(ttft_s * 1000)
+            # Decode rate after the first token arrived
+            gen_s = total_s - (ttft_s or 0)
+            if tokens and gen_s > 0:
+                self.tokens_per_sec.append(tokens / gen_s)
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    @staticmethod
+    def _percentile(values, q: float) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 2)
+
+    def summary(self) -> dict:
+        with self._lock:
+            ttft = list(self.ttft_ms)
+            tps = list(self.tokens_per_sec)
+            return {
+                "streams": self.streams,
+                "errors": self.errors,
+                "ttft_ms": {"p50": self._percentile(ttft, 0.5), "p95": self._percentile(ttft, 0.95)},
+                "tokens_per_sec": {"p50": self._percentile(tps, 0.5), "p95": self._percentile(tps, 0.95)},
+            }
+
+
+async def timed_stream(backend: ChatBackend, prompt: str, metrics: ChatMetrics, **kwargs):
+    """
+    Wrap backend.stream(), yielding (piece, stats) where stats is None until
+    the final item, which carries ttft/tokens/throughput for this response.
+    """
+    start = time.perf_counter()
+    ttft = None
+    tokens = 0
+    try:
+        async for piece in backend.stream(prompt, **kwargs):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            tokens += count_tokens(piece)
+            yield piece, None
+    except Exception:
+        metrics.record_error()
+        raise
+    total = time.perf_counter() - start
+    metrics.record(ttft, tokens, total)
+    gen_s = total - (ttft or 0)
+    yield None, {
+        "ttft_ms": round(ttft * 1000, 2) if ttft is not None else None,
+        "tokens": tokens,
+        "total_ms": round(total * 1000, 2),
+        "tokens_per_sec": round(tokens / gen_s, 2) if tokens and gen_s > 0 else None,
+    }
@@ -0,0 +1,44 @@
+"""
+Dedicated, bounded thread pools used by the async API handlers.
+
+Model inference and store I/O each get their own pool so a burst of one
+kind of work (e.g. a large batch score) cannot starve the other, and
+neither competes with Starlette's default threadpool or the event loop.
+Work runs in a copy of the caller's context (like asyncio.to_thread), so
+metrics spans inside it count toward the calling request.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+MODEL_WORKERS = int(os.getenv("FINMATE_MODEL_WORKERS", min(4, os.cpu_count() or 1)))
+IO_WORKERS = int(os.getenv("FINMATE_IO_WORKERS", 8))
+
+MODEL_EXECUTOR = ThreadPoolExecutor(max_workers=MODEL_WORKERS, thread_name_prefix="model")
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="store-io")
+
+
+async def run_model(fn, *args, **kwargs):
+    """Run CPU-bound model code (pandas feature building, sklearn predict)."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(MODEL_EXECUTOR, functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+async def run_io(fn, *args, **kwargs):
+    """Run blocking store / file I/O."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(IO_EXECUTOR, functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+async def iterate_io(iterator):
+    """Drive a blocking iterator on the I/O pool, yielding items asynchronously."""
+    sentinel = object()
+    while True:
+        item = await run_io(next, iterator, sentinel)
+        if item is sentinel:
+            return
+        yield item
@@ -0,0 +1,108 @@
+"""
+Feature engineering shared by scripts/preprocess_data.py and incremental
+appends.
+
+Rolling features use true time windows (the last 7 / 30 days of a
+category, not the last 7 rows) computed with one vectorized
+groupby().rolling() per window over a single sort. Appending new
+transactions recomputes only the windows they fall into: new rows plus
+any existing rows of the same category dated within a window after them.
+"""
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+WINDOWS = {"7d": pd.Timedelta(days=7), "30d": pd.Timedelta(days=30)}
+ROLLING_COLUMNS = [f"Category_Rolling_{stat}_{name}" for name in WINDOWS for stat in ("Mean", "Std")]
+MAX_WINDOW = max(WINDOWS.values())
+
+
+def add_date_features(df: pd.DataFrame) -> pd.DataFrame:
+    """DayOfWeek, DayOfMonth and IsWeekend from a datetime Date column."""
+    dates = df["Date"].dt
+    df["DayOfWeek"] = dates.dayofweek
+    df["DayOfMonth"] = dates.day
+    df["IsWeekend"] = (df["DayOfWeek"] >= 5).astype(int)
+    return df
+
+
+def rolling_features(df: pd.DataFrame, group: str = "Category", date: str = "Date",
+                     value: str = "Amount") -> pd.DataFrame:
+    """
+    Per-`group` time-window mean/std of `value` for each row, as a frame
+    with ROLLING_COLUMNS aligned to df.index. Rows on the same date are
+    taken in their existing order. The std of a single row is 0.
+    """
+    if df.empty:
+        return pd.DataFrame(index=df.index, columns=ROLLING_COLUMNS, dtype=float)
+    ordered = df[[group, date, value]].copy()
+    ordered[group] = ordered[group].fillna("").astype(str)
+    ordered[date] = pd.to_datetime(ordered[date], errors="coerce")
+    ordered[value] = pd.to_numeric(ordered[value], errors="coerce")
+    ordered = ordered.dropna(subset=[date])
+    # One stable sort: groups contiguous, dates ascending within a group
+    ordered = ordered.sort_values([group, date], kind="mergesort")
+    grouped = ordered.set_index(date).groupby(group, sort=False)[value]
+
+    out = pd.DataFrame(index=ordered.index)
+    for name, window in WINDOWS.items():
+        rolling = grouped.rolling(window, min_periods=1)
+        # Results come back group by group in the same order as `ordered`
+        out[f"Category_Rolling_Mean_{name}"] = rolling.mean().to_numpy()
+        out[f"Category_Rolling_Std_{name}"] = rolling.std().fillna(0).to_numpy()
+    return out.reindex(df.index)[ROLLING_COLUMNS]
+
+
+def update_rolling(existing: pd.DataFrame, new: pd.DataFrame, group: str = "Category",
+                   date: str = "Date", value: str = "Amount") -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Rolling features for `new` rows appended after `existing`.
+
+    `existing` only needs the rows of the new rows' categories dated from
+    MAX_WINDOW before the earliest new row onwards (see context_filter).
+    Returns (new_features, changed) where `changed` holds recomputed
+    features for existing rows whose windows now include a new row; it is
+    empty unless some new rows are dated before existing ones.
+    """
+    if new.empty:
+        return rolling_features(new, group, date, value), pd.DataFrame(columns=ROLLING_COLUMNS)
+    new_dates = pd.to_datetime(new[date], errors="coerce")
+    start = new_dates.groupby(new[group].fillna("").astype(str)).min()
+
+    cols = [group, date, value]
+    if existing.empty:
+        context = existing.reindex(columns=cols).iloc[:0]
+    else:
+        ex_dates = pd.to_datetime(existing[date], errors="coerce")
+        first_new = existing[group].fillna("").astype(str).map(start)
+        context = existing.loc[(ex_dates >= first_new - MAX_WINDOW).fillna(False), cols]
+
+    # Existing rows keep their place ahead of new rows on the same date
+    combined = pd.concat([context, new[cols]], keys=["existing", "new"])
+    feats = rolling_features(combined, group, date, value)
+    new_feats = feats.xs("new").set_axis(new.index)
+
+    ctx_feats = feats.xs("existing") if len(context) else pd.DataFrame(columns=ROLLING_COLUMNS)
+    if not len(context):
+        return new_feats, ctx_feats
+    ctx_dates = pd.to_datetime(context[date], errors="coerce")
+    affected = (ctx_dates >= context[group].fillna("").astype(str).map(start)).fillna(False).to_numpy()
+    return new_feats, ctx_feats[affected]
+
+
+def context_filter(new: pd.DataFrame, group: str = "Category", date: str = "Date") -> dict:
+    """Store read() filters that cover the context update_rolling needs."""
+    start = pd.to_datetime(new[date]).min() - MAX_WINDOW
+    return {"categories": sorted(new[group].dropna().astype(str).unique()),
+            "start_date": start.strftime("%Y-%m-%d")}
+
+
+def changed_rows(current: pd.DataFrame, recomputed: pd.DataFrame, atol: float = 1e-9) -> pd.DataFrame:
+    """Rows of `recomputed` that differ from the stored `current` values."""
+    if recomputed.empty:
+        return recomputed
+    old = current.reindex(index=recomputed.index, columns=ROLLING_COLUMNS).astype(float).to_numpy()
+    fresh = recomputed.astype(float).to_numpy()
+    same = np.isclose(old, fresh, atol=atol, equal_nan=True).all(axis=1)
+    return recomputed[~same]
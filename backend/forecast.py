@@ -0,0 +1,197 @@
+"""
+Per-category monthly spend forecasting.
+
+The forecaster is a direct multi-horizon regressor: one row per (category,
+horizon) with lag features taken from the monthly totals, scaled by the
+category's recent level so one model serves small and large categories.
+Serving a whole forecast (every category, every horizon) is a single
+predict call. scripts/train_models.py trains it on the same features.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+FORECAST_FEATURES = ["Horizon", "TargetMonth", "LogLevel", "Lag1Ratio", "Lag2Ratio", "Lag3Ratio"]
+MAX_HORIZON = 12
+LAGS = 3
+
+
+def monthly_totals(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Month x category expense totals from transaction rows (Date, Category,
+    Amount, Is_Expense), every calendar month in range present.
+    """
+    rows = df
+    if "Is_Expense" in rows.columns:
+        rows = rows[rows["Is_Expense"] == True]
+    month = pd.to_datetime(rows["Date"], errors="coerce").dt.to_period("M")
+    amount = pd.to_numeric(rows["Amount"], errors="coerce")
+    frame = pd.DataFrame({"Month": month, "Category": rows["Category"], "Amount": amount}).dropna()
+    if frame.empty:
+        return pd.DataFrame()
+    wide = frame.pivot_table(index="Month", columns="Category", values="Amount", aggfunc="sum", observed=True)
+    months = pd.period_range(wide.index.min(), wide.index.max(), freq="M")
+    return wide.reindex(months).fillna(0.0).sort_index(axis=1)
+
+
+def complete_months(totals: pd.DataFrame, today=None) -> pd.DataFrame:
+    """
+    Monthly totals ending at the last complete month, the forecast origin.
+    The current calendar month is still being spent in, so it (and anything
+    later) is dropped; when it is all there is, it is scaled up to a full
+    month from the days elapsed instead.
+    """
+    today = pd.Timestamp(today) if today is not None else pd.Timestamp.now()
+    current = today.to_period("M")
+    complete = totals[totals.index < current]
+    if len(complete):
+        return complete
+    partial = totals[totals.index == current]
+    if partial.empty:
+        return totals
+    return partial * (current.days_in_month / today.day)
+
+
+def _origin_features(values: np.ndarray, t: int):
+    """
+    Scaled lag features for origin month index `t` of a (months, series)
+    matrix. Returns (lag_ratios (series, LAGS), level (series,)).
+    """
+    lags = np.stack([values[t - k] if t - k >= 0 else values[0] for k in range(LAGS)], axis=1)
+    level = lags.mean(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = np.where(level[:, None] > 0, lags / level[:, None], 0.0)
+    return ratios, level
+
+
+def build_rows(ratios: np.ndarray, level: np.ndarray, origin: pd.Period, horizons: np.ndarray) -> np.ndarray:
+    """Feature matrix with one row per (series, horizon), series-major."""
+    n_series, n_h = len(level), len(horizons)
+    target_month = np.array([(origin + int(h)).month for h in horizons], dtype=np.float64)
+    X = np.empty((n_series * n_h, len(FORECAST_FEATURES)), dtype=np.float64)
+    X[:, 0] = np.tile(horizons, n_series)
+    X[:, 1] = np.tile(target_month, n_series)
+    X[:, 2] = np.repeat(np.log1p(level), n_h)
+    X[:, 3:] = np.repeat(ratios, n_h, axis=0)
+    return X
+
+
+def training_set(totals: pd.DataFrame, max_horizon: int = MAX_HORIZON):
+    """
+    (X, y) for every origin month with a full lag window and every horizon
+    that lands inside the history. y is the target month's spend divided by
+    the level at the origin; series with no recent spend are skipped.
+    """
+    values = totals.to_numpy(dtype=np.float64)
+    n_months = len(values)
+    X_parts, y_parts = [], []
+    for t in range(LAGS - 1, n_months - 1):
+        ratios, level = _origin_features(values, t)
+        horizons = np.arange(1, min(max_horizon, n_months - 1 - t) + 1, dtype=np.float64)
+        X = build_rows(ratios, level, totals.index[t], horizons)
+        targets = values[t + horizons.astype(int)].T.reshape(-1)  # series-major like X
+        scale = np.repeat(level, len(horizons))
+        keep = scale > 0
+        X_parts.append(X[keep])
+        y_parts.append(targets[keep] / scale[keep])
+    if not X_parts:
+        return np.empty((0, len(FORECAST_FEATURES))), np.empty(0)
+    return np.vstack(X_parts), np.concatenate(y_parts)
+
+
+class SpendForecaster:
+    """
+    Serves forecasts for the monthly totals it is given, from the last
+    complete month (see complete_months). Results for the full MAX_HORIZON
+    are cached per (model version, data signature), so repeated requests
+    skip the model until a complete month's total changes or a new month
+    starts. The cache holds the latest `cache_size` signatures, one per
+    user's history. With a `shared` sharedcache.SharedCache, results
+    computed by one worker are reused by the others.
+    """
+
+    def __init__(self, cache_size: int = 1024, shared=None):
+        self._lock = threading.Lock()
+        self.cache_size = cache_size
+        self.shared = shared
+        self._results: "OrderedDict[tuple, dict]" = OrderedDict()
+
+    @staticmethod
+    def signature(totals: pd.DataFrame) -> str:
+        h = hashlib.sha256()
+        h.update(",".join(map(str, totals.columns)).encode("utf-8"))
+        h.update(",".join(map(str, totals.index)).encode("utf-8"))
+        h.update(np.ascontiguousarray(totals.to_numpy(dtype=np.float64)).tobytes())
+        return h.hexdigest()
+
+    def _compute(self, model, totals: pd.DataFrame) -> dict:
+        values = totals.to_numpy(dtype=np.float64)
+        origin = totals.index[-1]
+        ratios, level = _origin_features(values, len(values) - 1)
+        horizons = np.arange(1, MAX_HORIZON + 1, dtype=np.float64)
+        if model is not None:
+            X = build_rows(ratios, level, origin, horizons)
+            # One call for every category and horizon
+            scaled = model.predict(X).reshape(len(level), MAX_HORIZON)
+            method = "model"
+        else:
+            # No trained forecaster: carry the recent level forward
+            scaled = np.ones((len(level), MAX_HORIZON))
+            method = "baseline"
+        amounts = np.clip(scaled * level[:, None], 0, None)
+        return {
+            "as_of": str(origin),
+            "method": method,
+            "months": [str(origin + int(h)) for h in horizons],
+            "categories": [str(c) for c in totals.columns],
+            "amounts": amounts,
+        }
+
+    def forecast(self, model, model_version: Optional[str], totals: pd.DataFrame,
+                 horizon: int, category: Optional[str] = None, today=None) -> dict:
+        totals = complete_months(totals, today)
+        key = (model_version if model is not None else None, self.signature(totals))
+        with self._lock:
+            result = self._results.get(key)
+            cached = result is not None
+            if cached:
+                self._results.move_to_end(key)
+        if not cached:
+            shared_key = f"{key[0]}:{key[1]}"
+            result = self.shared.get("forecast", shared_key) if self.shared is not None else None
+            cached = result is not None
+            if result is None:
+                result = self._compute(model, totals)
+                if self.shared is not None:
+                    self.shared.put("forecast", shared_key, result)
+            with self._lock:
+                self._results[key] = result
+                while len(self._results) > self.cache_size:
+                    self._results.popitem(last=False)
+
+        names = result["categories"]
+        if category is not None:
+            if category not in names:
+                raise KeyError(category)
+            rows = [names.index(category)]
+        else:
+            rows = list(range(len(names)))
+        amounts = result["amounts"][:, :horizon]
+        months = result["months"][:horizon]
+
+        def series(values):
+            return [{"month": m, "amount": round(float(v), 2)} for m, v in zip(months, values)]
+
+        return {
+            "as_of": result["as_of"],
+            "horizon": horizon,
+            "method": result["method"],
+            "model_version": model_version if model is not None else None,
+            "cached": cached,
+            "categories": [{"category": names[i], "forecast": series(amounts[i])} for i in rows],
+            "total": series(amounts[rows].sum(axis=0)),
+        }
@@ -0,0 +1,285 @@
+"""
+Array-compiled tree ensembles for serving.
+
+compile_forest() flattens a fitted IsolationForest (anomaly model) or
+RandomForestClassifier (merchant categorizer) into one set of contiguous
+node arrays shared by all its trees: split feature, threshold, left/right
+child and a per-leaf value. Rows are routed through every tree at once, one
+level per step, with numpy gathers, so a single-row call costs a few dozen
+array ops instead of sklearn's input validation and per-tree dispatch.
+
+Results are bit-identical to the sklearn model: inputs are cast to float32
+as sklearn's trees do, leaf values are precomputed with the same
+expressions, and per-tree values are summed in tree order (cumsum) like
+sklearn's sequential accumulation.
+
+Sparse (CSR) input, such as the categorizer's TF-IDF rows, is never
+densified: each step looks up the (row, feature) pairs it needs among the
+row's stored entries, and an absent entry reads as 0.0 as in sklearn.
+
+The traversal does rows x trees x depth numpy work, so past some batch size
+sklearn's C loop is faster: batches above `sklearn_above_rows` are handed to
+the source model (same results). scripts/benchmark_inference.py measures
+both paths and checks the outputs match.
+"""
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# Rows routed per traversal pass; bounds the (rows x trees) work arrays
+CHUNK_ROWS = 4096
+
+
+def _average_path_length(n_samples_leaf) -> np.ndarray:
+    """Same as sklearn.ensemble._iforest._average_path_length."""
+    n = np.asarray(n_samples_leaf, dtype=np.float64)
+    out = np.zeros(n.shape)
+    mask_1 = n <= 1
+    mask_2 = n == 2
+    not_mask = ~np.logical_or(mask_1, mask_2)
+    out[mask_2] = 1.0
+    out[not_mask] = 2.0 * (np.log(n[not_mask] - 1.0) + np.euler_gamma) - 2.0 * (n[not_mask] - 1.0) / n[not_mask]
+    return out
+
+
+def _node_depths(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    depth = np.zeros(len(left), dtype=np.int64)
+    # sklearn numbers children after their parent, so one forward pass works
+    for node in range(len(left)):
+        if left[node] != -1:
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+    return depth
+
+
+class CompiledForest:
+    """
+    Node arrays of all trees. Tree t's nodes are [offsets[t], offsets[t+1]);
+    children are absolute indices and a leaf points to itself, so routing
+    needs no leaf test: after max_depth steps every row sits on its leaf.
+    """
+
+    # Batch size above which the sklearn model is faster (see module docstring)
+    sklearn_above_rows = 0
+
+    def __init__(self, model, estimators, features_per_tree, n_features: int):
+        self.model = model
+        self.n_features_in_ = n_features
+        self.n_estimators = len(estimators)
+        trees = [est.tree_ for est in estimators]
+        counts = np.array([t.node_count for t in trees], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.roots = self.offsets[:-1].copy()
+
+        feature, threshold, left, right, leaf = [], [], [], [], []
+        for tree, offset, features in zip(trees, self.offsets, features_per_tree):
+            is_leaf = tree.children_left == -1
+            own = np.arange(offset, offset + tree.node_count)
+            # Trees fitted on a feature subset index into it; map to columns of X
+            feature.append(np.where(is_leaf, 0, np.asarray(features)[np.maximum(tree.feature, 0)]))
+            threshold.append(np.where(is_leaf, 0.0, tree.threshold))
+            left.append(np.where(is_leaf, own, tree.children_left + offset))
+            right.append(np.where(is_leaf, own, tree.children_right + offset))
+            leaf.append(is_leaf)
+        self.feature = np.concatenate(feature).astype(np.intp)
+        self.threshold = np.concatenate(threshold).astype(np.float64)
+        self.left = np.concatenate(left).astype(np.intp)
+        self.right = np.concatenate(right).astype(np.intp)
+        self.is_leaf = np.concatenate(leaf)
+        self.max_depth = max((t.max_depth for t in trees), default=0)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.feature)
+
+    def _prepare(self, X):
+        """X as a float32 ndarray, or as a float32 CSR matrix with sorted
+        indices if it is sparse."""
+        if hasattr(X, "tocsr"):
+            # sklearn's trees compare float32 inputs against float64 thresholds
+            if X.format != "csr" or X.dtype != np.float32:
+                X = X.tocsr().astype(np.float32)
+            if not X.has_canonical_format:
+                X = X.copy()
+                X.sum_duplicates()
+        else:
+            X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}; the model expects {self.n_features_in_} features")
+        return X
+
+    def _use_sklearn(self, X) -> bool:
+        return (X.shape[0] if hasattr(X, "shape") else len(X)) > self.sklearn_above_rows
+
+    @staticmethod
+    def _gather(X):
+        """
+        Function from flat positions (row * n_features + feature) to values
+        of X. For CSR, the stored entries' flat positions are sorted (rows in
+        order, sorted indices within a row), so each lookup is a binary search.
+        """
+        if not hasattr(X, "indptr"):
+            return X.ravel().take
+        rows = np.repeat(np.arange(X.shape[0], dtype=np.int64), np.diff(X.indptr))
+        keys = rows * X.shape[1] + X.indices
+        if len(keys) == 0:
+            return lambda flat: np.zeros(np.shape(flat), dtype=np.float32)
+        data = X.data
+
+        def gather(flat):
+            pos = np.minimum(np.searchsorted(keys, flat), len(keys) - 1)
+            return np.where(keys[pos] == flat, data[pos], np.float32(0.0))
+
+        return gather
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf node (absolute index) of every row in every tree: (rows, trees)."""
+        X = self._prepare(X)
+        n_rows = X.shape[0]
+        rows = np.arange(n_rows, dtype=np.int64)[:, None] * X.shape[1]
+        gather = self._gather(X)
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_estimators))
+        for _ in range(self.max_depth):
+            go_left = gather(rows + self.feature[nodes]) <= self.threshold[nodes]
+            nxt = np.where(go_left, self.left[nodes], self.right[nodes])
+            if np.array_equal(nxt, nodes):
+                break
+            nodes = nxt
+        return nodes
+
+
+class CompiledIsolationForest(CompiledForest):
+    """decision_function / score_samples / predict of a fitted IsolationForest."""
+
+    sklearn_above_rows = 8192
+
+    def __init__(self, model):
+        n_features = model.n_features_in_
+        # As in sklearn, trees only see a column subset when max_features < 1
+        features = (model.estimators_features_ if model._max_features != n_features
+                    else [np.arange(n_features)] * len(model.estimators_))
+        super().__init__(model, model.estimators_, features, n_features)
+        # Per leaf: nodes on the root-to-leaf path + average path length of
+        # the samples left there - 1, the term sklearn adds per tree
+        depth = np.concatenate([_node_depths(e.tree_.children_left, e.tree_.children_right)
+                                for e in model.estimators_])
+        n_samples = np.concatenate([e.tree_.n_node_samples for e in model.estimators_])
+        self.leaf_value = (depth + 1) + _average_path_length(n_samples) - 1.0
+        self.denominator = len(model.estimators_) * _average_path_length([model.max_samples_])[0]
+        self.offset_ = model.offset_
+
+    def _path_lengths(self, X) -> np.ndarray:
+        X = self._prepare(X)
+        depths = np.zeros(X.shape[0])
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            chunk = X[start:start + CHUNK_ROWS]
+            depths[start:start + chunk.shape[0]] = np.cumsum(self.leaf_value[self.apply(chunk)], axis=1)[:, -1]
+        return depths
+
+    def _score_samples(self, X) -> np.ndarray:
+        depths = self._path_lengths(X)
+        denominator = np.asarray(self.denominator)
+        return -(2 ** (-np.divide(depths, denominator, out=np.ones_like(depths), where=denominator != 0)))
+
+    def _sklearn_input(self, X):
+        names = getattr(self.model, "feature_names_in_", None)
+        # Fitted on a frame: pass one to avoid sklearn's feature-name warning
+        if names is not None and not hasattr(X, "columns"):
+            return pd.DataFrame(np.asarray(X), columns=names)
+        return X
+
+    def score_samples(self, X) -> np.ndarray:
+        if self._use_sklearn(X):
+            return self.model.score_samples(self._sklearn_input(X))
+        return self._score_samples(X)
+
+    def decision_function(self, X) -> np.ndarray:
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X) -> np.ndarray:
+        """1 for inliers, -1 for anomalies (decision_function < 0)."""
+        scores = self.decision_function(X)
+        labels = np.ones_like(scores, dtype=int)
+        labels[scores < 0] = -1
+        return labels
+
+
+class CompiledForestClassifier(CompiledForest):
+    """predict_proba / predict of a fitted single-output RandomForestClassifier."""
+
+    sklearn_above_rows = 128
+
+    def __init__(self, model):
+        if model.n_outputs_ != 1:
+            raise TypeError("Only single-output forests can be compiled")
+        n_features = model.n_features_in_
+        super().__init__(model, model.estimators_, [np.arange(n_features)] * len(model.estimators_), n_features)
+        self.classes_ = model.classes_
+        self.n_classes_ = model.n_classes_
+        # Per leaf: the tree's class distribution, normalized as
+        # DecisionTreeClassifier.predict_proba does
+        values = []
+        for est in model.estimators_:
+            proba = est.tree_.value[:, 0, :self.n_classes_].copy()
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            proba /= normalizer
+            values.append(proba)
+        self.leaf_value = np.concatenate(values)
+
+    def _predict_proba(self, X) -> np.ndarray:
+        X = self._prepare(X)
+        out = np.zeros((X.shape[0], self.n_classes_))
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            chunk = X[start:start + CHUNK_ROWS]
+            out[start:start + chunk.shape[0]] = np.cumsum(self.leaf_value[self.apply(chunk)], axis=1)[:, -1]
+        return out / self.n_estimators
+
+    def predict_proba(self, X) -> np.ndarray:
+        if self._use_sklearn(X):
+            return self.model.predict_proba(X)
+        return self._predict_proba(X)
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def compile_forest(model):
+    """
+    Compiled form of a fitted IsolationForest or RandomForestClassifier.
+    Raises TypeError for any other model.
+    """
+    from sklearn.ensemble import IsolationForest, RandomForestClassifier
+
+    if isinstance(model, IsolationForest):
+        return CompiledIsolationForest(model)
+    if isinstance(model, RandomForestClassifier):
+        return CompiledForestClassifier(model)
+    raise TypeError(f"Cannot compile {type(model).__name__}")
+
+
+def matches(compiled, X) -> bool:
+    """
+    Whether the compiled traversal (whatever the batch size) gives exactly
+    the sklearn model's outputs on X.
+    """
+    model = compiled.model
+    if isinstance(compiled, CompiledIsolationForest):
+        return bool(np.array_equal(model.score_samples(compiled._sklearn_input(X)), compiled._score_samples(X)))
+    proba = compiled._predict_proba(X)
+    return bool(np.array_equal(model.predict_proba(X), proba)
+                and np.array_equal(model.predict(X), compiled.classes_.take(np.argmax(proba, axis=1), axis=0)))
+
+
+def try_compile(model, name: str = "model") -> Optional[object]:
+    """compile_forest(), logging the result; None if the model cannot be compiled."""
+    start = time.perf_counter()
+    try:
+        compiled = compile_forest(model)
+    except Exception as e:
+        print(f"Serving {name} with sklearn: {e}")
+        return None
+    print(f"Compiled {name}: {compiled.n_estimators} trees, {compiled.node_count} nodes "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return compiled
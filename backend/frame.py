@@ -0,0 +1,163 @@
+"""
+Compact in-memory transaction frame for the scripts/ pipeline.
+
+compact_frame() turns a store read into small dtypes: categoricals for
+low-cardinality strings (Merchant, Category, Month, Description), datetime64
+Date, float32 amounts and features, the smallest integer type that fits,
+and one-byte bool flags instead of Python objects. get_frame() holds one
+such frame per process and keeps it current with the store.
+
+train_models.py and perform_eda.py read the dataset through it. The API
+does not: it streams store chunks (GET /transactions, the aggregate
+rebuild, the category backfill) and keeps only aggregates, so no worker
+holds the whole dataset.
+
+scripts/benchmark_memory.py measures bytes per row against plain read().
+"""
+import threading
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from store import CORE_COLUMNS, FRAME_DTYPES, get_store, typed_frame
+
+# Object columns with at most this share of distinct values become categoricals
+CATEGORY_MAX_SHARE = 0.5
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    FRAME_DTYPES for the core columns (see store.typed_frame); other numeric
+    columns are narrowed to float32 / the smallest integer type, and text
+    columns with few distinct values become categoricals.
+    """
+    df = typed_frame(df)
+    for col in df.columns:
+        if col in FRAME_DTYPES:
+            continue
+        values = df[col]
+        if pd.api.types.is_bool_dtype(values) or isinstance(values.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_integer_dtype(values):
+            df[col] = pd.to_numeric(values, downcast="integer")
+        elif pd.api.types.is_float_dtype(values):
+            df[col] = values.astype(np.float32)
+        elif values.dtype == object:
+            present = values.notna()
+            numbers = pd.to_numeric(values, errors="coerce")
+            if CORE_COLUMNS.get(col) != "TEXT" and (numbers.notna() == present).all():
+                # Numeric column read back as objects (e.g. all-NULL in SQLite)
+                df[col] = numbers.astype(np.float32)
+            elif values[present].nunique() <= CATEGORY_MAX_SHARE * max(len(values), 1):
+                df[col] = values.where(~present, values.astype(str)).astype("category")
+    return df
+
+
+def concat_compact(frames) -> pd.DataFrame:
+    """pd.concat that keeps categoricals categorical by unioning their categories."""
+    frames = [f.copy(deep=False) for f in frames if len(f.columns)]
+    if len(frames) <= 1:
+        return frames[0] if frames else pd.DataFrame()
+    for col in set().union(*(f.columns for f in frames)):
+        cats = [f[col] for f in frames if col in f.columns and isinstance(f[col].dtype, pd.CategoricalDtype)]
+        if not cats:
+            continue
+        union = pd.Index(sorted(set().union(*(c.cat.categories for c in cats)), key=str))
+        for f in frames:
+            if col in f.columns:
+                f[col] = f[col].astype(pd.CategoricalDtype(union))
+    return pd.concat(frames)
+
+
+def bytes_per_row(df: pd.DataFrame) -> float:
+    """Deep memory use (values, index, string payloads) divided by rows."""
+    return float(df.memory_usage(deep=True, index=True).sum()) / max(len(df), 1)
+
+
+class SharedFrame:
+    """
+    All stored transactions as one compact frame, loaded on first use.
+    Appends made through the store in this process are picked up by reading
+    only the rows after the last loaded id; replace(), update_column() or a
+    write from another process (a version gap) reload it on next access.
+
+    The frame returned by get() is shared: treat it as read-only.
+    """
+
+    def __init__(self, store=None):
+        self._store = store
+        self._lock = threading.Lock()
+        self._df: Optional[pd.DataFrame] = None
+        self._version: Optional[int] = None
+        self._appends = 0
+        self._stale = False
+        self._subscribed = False
+        self.loads = 0
+        self.extends = 0
+
+    def _attach(self):
+        if not self._subscribed:
+            self._store = self._store or get_store()
+            self._store.subscribe(self._on_write)
+            self._subscribed = True
+
+    def _on_write(self, df: Optional[pd.DataFrame], version: int):
+        with self._lock:
+            if df is None:
+                self._stale = True
+            else:
+                self._appends += 1
+
+    def _load(self, version: int):
+        self._appends, self._stale = 0, False
+        self._df = compact_frame(self._store.read_frame())
+        self._version = version
+        self.loads += 1
+
+    def _extend(self, version: int):
+        last_id = int(self._df.index.max()) if len(self._df) else None
+        new = self._store.read_frame(after_id=last_id)
+        if not new.empty:
+            self._df = concat_compact([self._df, compact_frame(new)])
+        self._appends -= version - self._version
+        self._version = version
+        self.extends += 1
+
+    def get(self, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        with self._lock:
+            self._attach()
+            current = self._store.version()
+            if self._df is None or self._stale or current - self._version > self._appends:
+                self._load(current)
+            elif current != self._version:
+                self._extend(current)
+            df = self._df
+        if columns is None:
+            return df
+        return df[[c for c in columns if c in df.columns]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            df = self._df
+            return {
+                "rows": 0 if df is None else len(df),
+                "version": self._version,
+                "bytes_per_row": None if df is None else round(bytes_per_row(df), 1),
+                "loads": self.loads,
+                "extends": self.extends,
+            }
+
+
+_FRAME: Optional[SharedFrame] = None
+_FRAME_LOCK = threading.Lock()
+
+
+def get_frame() -> SharedFrame:
+    """Process-wide shared frame over get_store()."""
+    global _FRAME
+    if _FRAME is None:
+        with _FRAME_LOCK:
+            if _FRAME is None:
+                _FRAME = SharedFrame()
+    return _FRAME
@@ -0,0 +1,301 @@
+"""
+CSV ingestion.
+
+Uploads are parsed in bounded chunks straight from the file object (or the
+raw request body), each chunk is cleaned with vectorized pandas ops, scored
+by the anomaly model and appended to the store before the next chunk is
+read, so peak memory stays flat regardless of file size.
+"""
+import asyncio
+import contextvars
+import functools
+import io
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from anomaly import score_frame
+from metrics import span
+from normalize import detect_layout, parse_amounts, parse_dates
+from sharedcache import pid_alive
+
+# Uploads up to this many bytes are ingested inside the request
+INLINE_UPLOAD_BYTES = 5 * 1024 * 1024
+# Rows parsed, scored and appended per chunk
+CHUNK_ROWS = 10000
+JOB_WORKERS = 2
+# Finished jobs are kept (in memory and in the shared cache) for this long
+JOB_TTL = 24 * 3600
+# At most this many jobs are kept in memory; the oldest finished go first
+MAX_JOBS = 1000
+JOB_NAMESPACE = "ingest_jobs"
+
+
+def normalize_chunk(new_df: pd.DataFrame, layout: dict):
+    """
+    Clean one chunk of an upload. Returns (clean_df, rejected_rows).
+    """
+    if layout.get("swap"):
+        new_df = new_df.rename(columns={"Amount": "Category", "Category": "Amount"})
+
+    # Currency Cleaning
+    if "Amount" in new_df.columns:
+        new_df["Amount"] = parse_amounts(new_df["Amount"], decimal_comma=layout.get("decimal_comma"))
+    else:
+        new_df["Amount"] = np.nan
+
+    # Fill defaults
+    if "Merchant" not in new_df.columns: new_df["Merchant"] = "Unknown"
+    if "Category" not in new_df.columns: new_df["Category"] = "Uncategorized"
+
+    new_df["Merchant"] = new_df["Merchant"].fillna("Unknown")
+    new_df["Category"] = new_df["Category"].fillna("Uncategorized")
+    new_df["Amount"] = new_df["Amount"].fillna(0)
+
+    # Date Parsing; rows with unparseable dates are rejected
+    rejected = 0
+    if "Date" in new_df.columns:
+        new_df["Date"] = parse_dates(new_df["Date"], date_format=layout.get("date_format"))
+        valid = new_df["Date"].notna()
+        rejected = int((~valid).sum())
+        new_df = new_df[valid].copy()
+        new_df["Month"] = new_df["Date"].dt.strftime("%Y-%m")
+        new_df["Date"] = new_df["Date"].dt.strftime("%Y-%m-%d")
+
+    new_df["Is_Expense"] = True
+    return new_df, rejected
+
+
+def apply_anomaly_scores(df: pd.DataFrame, model, encoder) -> pd.DataFrame:
+    """
+    Return `df` with Is_Anomaly and Anomaly_Score filled from the anomaly
+    model. Without a model every row is stored as not anomalous.
+    """
+    df = df.copy()
+    if model is None or df.empty:
+        df["Is_Anomaly"] = False
+        df["Anomaly_Score"] = np.nan
+        return df
+    result = score_frame(model, encoder, df)
+    df["Anomaly_Score"] = result["scores"]
+    df["Is_Anomaly"] = result["scores"] < 0
+    return df
+
+
+def ingest_csv(fileobj, store, model, encoder, chunk_rows: int = CHUNK_ROWS,
+               on_progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    Parse `fileobj` in chunks of `chunk_rows`, clean, score and append each
+    chunk. Returns accepted/rejected row counts and anomalies found.
+    """
+    stats = {"accepted": 0, "rejected": 0, "anomalies": 0, "chunks": 0, "bytes_read": 0}
+    layout = None
+    reader = pd.read_csv(fileobj, chunksize=chunk_rows)
+    while True:
+        # Reading includes waiting for the body of a streamed upload
+        with span("csv_read"):
+            chunk = next(reader, None)
+        if chunk is None:
+            break
+        with span("normalize"):
+            if layout is None:
+                layout = detect_layout(chunk)
+            clean, rejected = normalize_chunk(chunk, layout)
+        clean = apply_anomaly_scores(clean, model, encoder)
+        with span("store_write"):
+            store.append(clean)
+
+        stats["accepted"] += len(clean)
+        stats["rejected"] += rejected
+        stats["anomalies"] += int(clean["Is_Anomaly"].sum())
+        stats["chunks"] += 1
+        try:
+            stats["bytes_read"] = fileobj.tell()
+        except (AttributeError, OSError, ValueError):
+            pass
+        if on_progress:
+            on_progress(dict(stats))
+    return stats
+
+
+class QueueReader(io.RawIOBase):
+    """
+    Blocking file-like reader fed from another thread (or the event loop)
+    through a bounded queue. `None` marks end of stream.
+    """
+
+    def __init__(self, maxsize: int = 16):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._buffer = b""
+        self._eof = False
+        self._pos = 0
+        self._abandoned = threading.Event()
+
+    def feed(self, data: Optional[bytes]):
+        """Queue `data` (None for EOF); gives up once the reader is abandoned."""
+        while not self._abandoned.is_set():
+            try:
+                self.queue.put(data, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    async def afeed(self, data: Optional[bytes], poll: float = 0.01):
+        """Like feed(), but waits on the event loop instead of blocking a thread."""
+        while not self._abandoned.is_set():
+            try:
+                self.queue.put_nowait(data)
+                return
+            except queue.Full:
+                await asyncio.sleep(poll)
+
+    def abandon(self):
+        """Called by the consumer when it stops reading, to unblock producers."""
+        self._abandoned.set()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and not self._eof:
+            data = self.queue.get()
+            if data is None:
+                self._eof = True
+            else:
+                self._buffer = data
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        self._pos += n
+        return n
+
+    def tell(self):
+        return self._pos
+
+
+class IngestJobs:
+    """
+    Tracks ingestion jobs. Large uploads run in a background worker pool and
+    append every scored chunk as soon as it is ready, so rows become visible
+    incrementally and progress can be polled. With a `shared`
+    sharedcache.SharedCache every status change is published there too, so
+    any worker of a multi-worker server can answer a poll (blocking: call
+    create/get from request handlers through run_io).
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, shared=None,
+                 ttl: float = JOB_TTL, max_jobs: int = MAX_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.shared = shared
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+
+    def _prune(self):
+        """Forget finished jobs past the TTL, then the oldest finished ones over
+        max_jobs, making room for one more. Queued and running jobs are always
+        kept. Call with the lock held."""
+        cutoff = time.time() - self.ttl
+        finished = [job for job in self._jobs.values() if job["finished_at"] is not None]
+        finished.sort(key=lambda job: job["finished_at"])
+        excess = len(self._jobs) + 1 - self.max_jobs  # room for the new job
+        for job in finished:
+            if job["finished_at"] >= cutoff and excess <= 0:
+                break
+            del self._jobs[job["job_id"]]
+            excess -= 1
+
+    def _publish(self, job: dict):
+        if self.shared is None:
+            return
+        try:
+            self.shared.put(JOB_NAMESPACE, job["job_id"], job, ttl=JOB_TTL)
+        except Exception as e:
+            print(f"Ingest job {job['job_id']}: cannot publish status: {e}")
+
+    def create(self, job_id: Optional[str] = None, bytes_total: Optional[int] = None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued",
+                "accepted": 0,
+                "rejected": 0,
+                "anomalies": 0,
+                "chunks": 0,
+                "bytes_read": 0,
+                "bytes_total": bytes_total,
+                "progress": 0.0,
+                "error": None,
+                "created_at": time.time(),
+                "finished_at": None,
+                "pid": os.getpid(),
+            }
+            job = dict(self._jobs[job_id])
+        self._publish(job)
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            if job["bytes_total"] and "progress" not in fields:
+                job["progress"] = round(min(job["bytes_read"] / job["bytes_total"], 1.0), 4)
+            job = dict(job)
+        self._publish(job)
+
+    def run(self, job_id: str, fileobj, store, model, encoder, chunk_rows: int = CHUNK_ROWS) -> dict:
+        """Run an ingest in the calling thread, recording progress under `job_id`."""
+        self.update(job_id, status="running")
+        try:
+            stats = ingest_csv(fileobj, store, model, encoder, chunk_rows,
+                               on_progress=lambda s: self.update(job_id, **s))
+            self.update(job_id, status="completed", progress=1.0, finished_at=time.time())
+            return stats
+        except Exception as e:
+            print(f"Ingest job {job_id} failed: {e}")
+            self.update(job_id, status="failed", error=str(e), finished_at=time.time())
+            raise
+
+    async def run_async(self, job_id: str, fileobj, store, model, encoder) -> dict:
+        """run() on the job worker pool, awaitable from a request handler."""
+        loop = asyncio.get_running_loop()
+        # In the request's context, so its metrics spans count toward it
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, functools.partial(
+            ctx.run, self.run, job_id, fileobj, store, model, encoder))
+
+    def submit(self, fileobj, store, model, encoder, bytes_total: Optional[int] = None) -> str:
+        """Ingest `fileobj` in the background; the job closes it when done."""
+        job_id = self.create(bytes_total=bytes_total)
+
+        def _run():
+            try:
+                self.run(job_id, fileobj, store, model, encoder)
+            except Exception:
+                pass  # recorded on the job
+            finally:
+                fileobj.close()
+
+        self._executor.submit(_run)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return dict(job)
+        # Started by another worker
+        job = self.shared.get(JOB_NAMESPACE, job_id) if self.shared is not None else None
+        if job and job["status"] in ("queued", "running") and not pid_alive(job["pid"]):
+            job.update(status="failed", error="The worker running this job exited")
+        return job
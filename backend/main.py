@@ -1,25 +1,53 @@
+import asyncio
+import hashlib
+import importlib.util
+import io
+import itertools
+import json
 import os
-import pickle
+import time
 from typing import List, Optional
 
+# google.generativeai takes seconds to import: only check it is installed
+# here, it is imported by load_genai() during warm-up
 try:
-    import google.generativeai as genai
-    HAS_GEMINI = True
-except ImportError:
+    HAS_GEMINI = importlib.util.find_spec("google.generativeai") is not None
+except (ImportError, ValueError):
     HAS_GEMINI = False
+if not HAS_GEMINI:
     print("Warning: google-generativeai not found. Chat features will be disabled.")
-except AttributeError:
-    # Handle the specific 'packages_distributions' error on Python < 3.10
-    HAS_GEMINI = False
-    print("Warning: google-generativeai failed to load (Python version incompatibility). Chat features disabled.")
+genai = None
 import numpy as np
 import pandas as pd
-import uvicorn
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, File, UploadFile
+from fastapi import FastAPI, HTTPException, File, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
+from anomaly import FEATURES as ANOMALY_FEATURES, score_frame, throughput
+from categorize import MerchantCategorizer
+from chat import (
+    ChatMetrics,
+    GeminiChatBackend,
+    RateLimited,
+    build_chat_prompt,
+    chat_cache_key,
+    gateway_from_env,
+    local_backend_from_env,
+    timed_stream,
+)
+from forecast import MAX_HORIZON, SpendForecaster
+from forest import CompiledForest, try_compile
+from executors import iterate_io, run_io, run_model
+from ingest import INLINE_UPLOAD_BYTES, IngestJobs, QueueReader, apply_anomaly_scores, ingest_csv
+from metrics import METRICS, MetricsMiddleware, record_stage, span
+from registry import ModelLoadError, ModelRegistry
+from sharedcache import get_shared_cache
+from store import CORE_COLUMNS, DATA_DIR
+from tenants import TenantRegistry
+from warmup import Warmup
+
 app = FastAPI(title="Budget Analysis AI API")
 
 # --- CORS Configuration ---
@@ -38,74 +66,139 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-route counts/latency and per-stage spans, served on GET /metrics
+app.add_middleware(MetricsMiddleware)
 
 # --- Load Models ---
-# Ideally these should be loaded once at startup
-MODELS = {}
+# Versioned registry under <repo>/models; each model loads on first use
+MODELS = ModelRegistry()
 CHAT_MODEL = None
+CATEGORIZER = None # (model version, MerchantCategorizer), see get_categorizer()
+ENGINES = {} # model name -> (model version, compiled forest or sklearn model), see get_engine()
+CHAT_BACKEND = None # chat.ChatGateway (cache + limiter) used by the /chat endpoints
+CHAT_METRICS = ChatMetrics()
+INGEST_JOBS = IngestJobs(shared=get_shared_cache())
+TENANTS = TenantRegistry() # per-user stores + aggregates; user_id None is the shared store
+SPEND_FORECASTER = SpendForecaster(shared=get_shared_cache())
+WARMUP = Warmup() # background model / store / Gemini initialization, see GET /ready
+
+
+def model_metrics():
+    """Model load status for GET /metrics."""
+    status = MODELS.status()
+    loaded, errors = set(status["loaded"]), status["errors"]
+    yield ("finmate_model_info", "gauge", "Model version being served.",
+           [({"version": status["version"] or "none", "current": status["current"] or "none"}, 1)])
+    yield ("finmate_model_loaded", "gauge", "1 if the model of the active version is loaded.",
+           [({"model": name}, name in loaded) for name in status["available"]])
+    yield ("finmate_model_load_error", "gauge", "1 if the model failed to load.",
+           [({"model": name}, name in errors) for name in status["available"]])
+    yield ("finmate_model_compiled", "gauge", "1 if the model is served from compiled node arrays.",
+           [({"model": name}, isinstance(engine, CompiledForest))
+            for name, (version, engine) in ENGINES.items() if version == MODELS.version and engine is not None])
+    tenants = TENANTS.stats()
+    yield ("finmate_tenants_open", "gauge", "Per-user partitions held open.", [({}, tenants["open"])])
+    yield ("finmate_ready", "gauge", "1 once background warm-up has finished.", [({}, WARMUP.ready)])
+
+
+METRICS.add_collector(model_metrics)
+if get_shared_cache() is not None:
+    # Multi-worker server: /metrics sums the counters of every worker
+    METRICS.share(get_shared_cache())
 
 # --- Environment & Gemini ---
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# "gemini" (default) or "local" for the deterministic offline stand-in
+CHAT_BACKEND_NAME = os.getenv("FINMATE_CHAT_BACKEND", "gemini").lower()
+# The model chosen by discovery is remembered here so restarts skip list_models()
+GEMINI_MODEL_CACHE = os.getenv("FINMATE_GEMINI_MODEL_CACHE", os.path.join(DATA_DIR, "gemini_model.json"))
+GEMINI_MODEL_CACHE_TTL = float(os.getenv("FINMATE_GEMINI_MODEL_CACHE_TTL", 7 * 24 * 3600))
+
+# --- Transactions API ---
+STREAM_CHUNK_ROWS = 5000
+MAX_PAGE_SIZE = 10000
+MAX_ANOMALY_BATCH = 100000
+MAX_CATEGORIZE_BATCH = 100000
 
 
 # Static files mount moved to the end
 
 
 def load_models():
-    model_dir = "../models"
-    try:
-        with open(f"{model_dir}/anomaly_model.pkl", "rb") as f:
-            MODELS["anomaly"] = pickle.load(f)
-        with open(f"{model_dir}/spending_forecaster.pkl", "rb") as f:
-            MODELS["forecast"] = pickle.load(f)
-        with open(f"{model_dir}/merchant_categorizer.pkl", "rb") as f:
-            MODELS["categorizer"] = pickle.load(f)
-        with open(f"{model_dir}/merchant_vectorizer.pkl", "rb") as f:
-            MODELS["vectorizer"] = pickle.load(f)
-        with open(f"{model_dir}/category_encoder.pkl", "rb") as f:
-            MODELS["encoder"] = pickle.load(f)
-        print("All models loaded successfully.")
-    except Exception as e:
-        print(f"Error loading models: {e}")
-        # In production this might be fatal, but for dev we continue
-        pass
+    """
+    Report which model version the registry will serve. Models themselves
+    are loaded (memory-mapped) on first use; POST /models/reload switches to
+    a newly published version.
+    """
+    status = MODELS.status()
+    if status["version"] is None:
+        print(f"No models found in {status['models_dir']}; model endpoints will return 503.")
+    else:
+        print(f"Model registry: version {status['version']} ({len(status['available'])} models) "
+              f"from {status['models_dir']}")
+    schema = status["feature_schema"].get("anomaly")
+    if schema and schema != ANOMALY_FEATURES:
+        print(f"Warning: anomaly model expects features {schema}, API builds {ANOMALY_FEATURES}")
 
 
-def build_spend_snapshot():
+def get_engine(name: str):
     """
-    Load recent transactions and build a short summary of top spending categories.
-    Returns a string to be injected into the chat prompt, or None on failure.
+    MODELS[name] compiled to node arrays (forest.compile_forest) for the
+    active version, or the sklearn model itself if it cannot be compiled.
+    None if the version has no such model.
     """
-    data_path = "../data/processed/cleaned_transactions.csv"
-    if not os.path.exists(data_path):
-        return None
-    try:
-        df = pd.read_csv(data_path)
-        if df.empty or "Category" not in df.columns or "Amount" not in df.columns:
-            return None
+    version = MODELS.version
+    cached = ENGINES.get(name)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    model = MODELS.get(name)
+    engine = None if model is None else (try_compile(model, name) or model)
+    ENGINES[name] = (version, engine)
+    return engine
+
 
-        # Prefer expense rows if the flag exists
-        if "Is_Expense" in df.columns:
-            df = df[df["Is_Expense"] == True]
+def get_categorizer() -> MerchantCategorizer:
+    """
+    Categorization engine for the active model version, rebuilt (with a
+    fresh memo) whenever the registry switches versions. The merchant lookup
+    is the one trained with the version; versions without one use rules and
+    the model only.
+    """
+    global CATEGORIZER
+    version = MODELS.version
+    if CATEGORIZER is not None and CATEGORIZER[0] == version:
+        return CATEGORIZER[1]
+    categorizer = MerchantCategorizer(
+        MODELS.get("vectorizer"), get_engine("categorizer"), MODELS.get("encoder"), lookup=MODELS.get("lookup")
+    )
+    CATEGORIZER = (version, categorizer)
+    return categorizer
 
-        # Guard against bad data
-        df = df.replace([np.inf, -np.inf], np.nan).dropna(subset=["Amount", "Category"])
 
-        top = (
-            df.groupby("Category")["Amount"]
-            .sum()
-            .sort_values(ascending=False)
-            .head(3)
-        )
-        if top.empty:
+async def get_tenant(user_id: Optional[str] = None):
+    """The user's partition (store + aggregates); 400 for a malformed user_id."""
+    try:
+        return await run_io(TENANTS.get, user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def build_spend_snapshot(aggregates):
+    """
+    Build a short summary of top spending categories from the cached
+    aggregates. Returns a string to be injected into the chat prompt, or None
+    on failure.
+    """
+    try:
+        summary = aggregates.snapshot(top=3)
+        if not summary["by_category"]:
             return None
 
-        lines = [f"{cat}: {amt:,.0f}" for cat, amt in top.items()]
-        total = df["Amount"].sum()
+        lines = [f"{c['category']}: {c['total']:,.0f}" for c in summary["by_category"]]
         return (
             "Recent spending summary from your transactions:\n"
-            f"- Total spend (all recorded): {total:,.0f}\n"
+            f"- Total spend (all recorded): {summary['total']:,.0f}\n"
             f"- Top categories:\n  - " + "\n  - ".join(lines)
         )
     except Exception as e:
@@ -113,21 +206,71 @@ def build_spend_snapshot():
         return None
 
 
+def load_genai():
+    """Import google.generativeai on first use; None if it cannot be loaded."""
+    global genai, HAS_GEMINI
+    if genai is None and HAS_GEMINI:
+        try:
+            import google.generativeai as module
+            genai = module
+        except (ImportError, AttributeError) as e:
+            # AttributeError: the 'packages_distributions' error on Python < 3.10
+            HAS_GEMINI = False
+            print(f"Warning: google-generativeai failed to load ({e}). Chat features disabled.")
+    return genai
+
+
+def gemini_cache_key() -> str:
+    # A new API key or GEMINI_MODEL override invalidates the cached choice
+    key = f"{GEMINI_API_KEY}|{os.getenv('GEMINI_MODEL') or ''}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def cached_gemini_model() -> Optional[str]:
+    """The model chosen for this key by an earlier discovery, if still fresh."""
+    try:
+        with open(GEMINI_MODEL_CACHE) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("key") != gemini_cache_key() or time.time() - cached.get("saved_at", 0) > GEMINI_MODEL_CACHE_TTL:
+        return None
+    return cached.get("model")
+
+
+def save_gemini_model(model: str):
+    try:
+        os.makedirs(os.path.dirname(GEMINI_MODEL_CACHE) or ".", exist_ok=True)
+        tmp = GEMINI_MODEL_CACHE + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"key": gemini_cache_key(), "model": model, "saved_at": time.time()}, f)
+        os.replace(tmp, GEMINI_MODEL_CACHE)
+    except OSError as e:
+        print(f"Could not cache Gemini model choice: {e}")
+
+
 def init_chat_model():
     """
-    Initialize the Gemini model if an API key is available.
+    Initialize the Gemini model if an API key is available. The model chosen
+    by discovery is cached in GEMINI_MODEL_CACHE, so later starts skip the
+    list_models() network call.
     """
     global CHAT_MODEL
-    if not HAS_GEMINI:
-        print("Skipping Gemini init: Library not loaded.")
-        return
-        
     if not GEMINI_API_KEY:
         print("GEMINI_API_KEY not set; chat endpoint will return 503.")
         return
+    if load_genai() is None:
+        print("Skipping Gemini init: Library not loaded.")
+        return
     try:
         genai.configure(api_key=GEMINI_API_KEY)
 
+        cached = cached_gemini_model()
+        if cached:
+            CHAT_MODEL = genai.GenerativeModel(cached)
+            print(f"Gemini chat model initialized (cached choice): {cached}")
+            return
+
         def list_available_models():
             models = [
                 m.name for m in genai.list_models()
@@ -149,6 +292,7 @@ def init_chat_model():
                 try:
                     CHAT_MODEL = genai.GenerativeModel(candidate)
                     print(f"Gemini chat model initialized (env override): {candidate}")
+                    save_gemini_model(candidate)
                     return
                 except Exception as e:
                     print(f"Env override model failed: {candidate} -> {e}. Falling back to auto-select.")
@@ -188,14 +332,69 @@ def init_chat_model():
 
         CHAT_MODEL = genai.GenerativeModel(chosen)
         print(f"Gemini chat model initialized: {chosen}")
+        save_gemini_model(chosen)
     except Exception as e:
         print(f"Failed to initialize Gemini model: {e}")
         CHAT_MODEL = None
 
+def init_chat_backend():
+    """
+    Pick the chat backend: the local stand-in when requested, otherwise
+    Gemini if init_chat_model() found a usable model.
+    """
+    global CHAT_BACKEND
+    if CHAT_BACKEND_NAME == "local":
+        backend = local_backend_from_env()
+        print("Chat backend: local stand-in")
+    elif CHAT_MODEL is not None:
+        backend = GeminiChatBackend(CHAT_MODEL)
+    else:
+        CHAT_BACKEND = None
+        return
+    CHAT_BACKEND = gateway_from_env(backend, shared=get_shared_cache())
+
+def preload_models():
+    """
+    Load the active version's models and compile the served forests,
+    without touching the store. server.py calls this before forking its
+    workers, so they share one copy-on-write copy of the models.
+    """
+    for name in MODELS.status()["available"]:
+        MODELS.get(name)
+    get_engine("anomaly")
+    get_engine("categorizer")
+
+
+def warm_models():
+    preload_models()
+    get_categorizer()
+
+
+def warm_store():
+    """Open the shared store and build its spend aggregates."""
+    TENANTS.default().aggregates.snapshot(top=1)
+
+
+def warm_chat():
+    init_chat_model()
+    init_chat_backend()
+
+
 @app.on_event("startup")
 async def startup_event():
+    """
+    Only cheap setup happens before the server accepts traffic; models,
+    the default store and Gemini discovery warm up in the background (see
+    GET /ready).
+    """
     load_models()
-    init_chat_model()
+    WARMUP.add("models", warm_models, run=run_model)
+    WARMUP.add("store", warm_store)
+    if CHAT_BACKEND_NAME == "local":
+        init_chat_backend()
+    else:
+        WARMUP.add("chat", warm_chat)
+    WARMUP.start()
 
 # --- Pydantic Models for Input ---
 class TransactionInput(BaseModel):
@@ -203,139 +402,308 @@ class TransactionInput(BaseModel):
     category: str
     date: str # YYYY-MM-DD
     merchant: Optional[str] = None
+    user_id: Optional[str] = None # None: the shared store
+
+class StoredSelection(BaseModel):
+    start_date: Optional[str] = None # YYYY-MM-DD, inclusive
+    end_date: Optional[str] = None
+    categories: Optional[List[str]] = None
+    limit: Optional[int] = None
+    user_id: Optional[str] = None
+
+class AnomalyBatchInput(BaseModel):
+    transactions: Optional[List[TransactionInput]] = None
+    stored: Optional[StoredSelection] = None
 
 class CategorizeInput(BaseModel):
     merchant: str
 
+class CategorizeBatchInput(BaseModel):
+    merchants: List[str]
+
 class ChatInput(BaseModel):
     query: str
+    user_id: Optional[str] = None
 
 # --- Endpoints ---
 
 
-# --- Helpers ---
-def clean_currency(val):
-    if isinstance(val, str):
-        cleaned = pd.Series(val).str.replace(r'[^\d.-]', '', regex=True).values[0]
-        return cleaned
-    return val
-
-def is_mostly_numeric(series):
-    clean = series.astype(str).str.replace(r'[^\d.-]', '', regex=True)
-    numeric = pd.to_numeric(clean, errors='coerce')
-    return numeric.notna().mean() > 0.5
+def tenant_writer(user_id: Optional[str]):
+    try:
+        return TENANTS.writer(user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/upload")
-async def upload_csv(file: UploadFile = File(...)):
+async def upload_csv(file: UploadFile = File(...), user_id: Optional[str] = None):
+    """
+    Imports a CSV of transactions. The file is parsed, cleaned, scored and
+    appended in bounded chunks. Large files are ingested by a background
+    job; the response is then a 202 with a job id to poll.
+
+    Rows go to `user_id`'s partition; without it a User_Id column, if
+    present, routes each row to its user.
+    """
+    writer = tenant_writer(user_id)
     try:
-        data_path = "../data/processed/cleaned_transactions.csv"
-        
-        # Save temp
-        temp_path = f"../data/processed/{file.filename}"
-        with open(temp_path, "wb") as f:
-            f.write(await file.read())
+        size = file.size
+        if size is None:
+            await file.seek(0, os.SEEK_END)
+            size = file.file.tell()
+            await file.seek(0)
 
-        new_df = pd.read_csv(temp_path)
-        
-        # Cleanup temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        if size > INLINE_UPLOAD_BYTES:
+            # Hand the spooled upload over to the job; FastAPI closes the
+            # placeholder when the request ends, the job closes the original
+            spooled, file.file = file.file, io.BytesIO()
+            job_id = await run_io(INGEST_JOBS.submit, spooled, writer, get_engine("anomaly"),
+                                  MODELS.get("encoder"), bytes_total=size)
+            return JSONResponse(status_code=202, content={
+                "message": "CSV accepted; ingesting in background",
+                "job_id": job_id,
+                "status_url": f"/upload/jobs/{job_id}",
+            })
 
-        # Robust Logic
-        required_cols = {"Date", "Merchant", "Amount"}
-        
-        # 1. Check strict columns
-        if not required_cols.issubset(new_df.columns):
-            # 2. Smart Swap Heuristic
-            if "Amount" in new_df.columns and "Category" in new_df.columns:
-                if not is_mostly_numeric(new_df["Amount"]) and is_mostly_numeric(new_df["Category"]):
-                    new_df.rename(columns={'Amount': 'Temp', 'Category': 'Amount'}, inplace=True)
-                    new_df.rename(columns={'Temp': 'Category'}, inplace=True)
-
-        # 3. Currency Cleaning
-        if "Amount" in new_df.columns:
-            new_df["Amount"] = new_df["Amount"].apply(clean_currency)
-            new_df["Amount"] = pd.to_numeric(new_df["Amount"], errors="coerce")
-
-        # 4. Fill defaults
-        if "Merchant" not in new_df.columns: new_df["Merchant"] = "Unknown"
-        if "Category" not in new_df.columns: new_df["Category"] = "Uncategorized"
-        
-        new_df["Merchant"] = new_df["Merchant"].fillna("Unknown")
-        new_df["Category"] = new_df["Category"].fillna("Uncategorized")
-        new_df["Amount"] = new_df["Amount"].fillna(0)
-        
-        # 5. Date Parsing
-        if "Date" in new_df.columns:
-            new_df["Date"] = pd.to_datetime(new_df["Date"], dayfirst=True, errors="coerce")
-            new_df.dropna(subset=["Date"], inplace=True)
-            new_df["Month"] = new_df["Date"].dt.strftime("%Y-%m")
-            new_df["Date"] = new_df["Date"].dt.strftime("%Y-%m-%d")
-            
-        new_df["Is_Expense"] = True
-        new_df["Is_Anomaly"] = False # Default
-
-        # Append
-        if os.path.exists(data_path):
-            existing = pd.read_csv(data_path)
-            combined = pd.concat([existing, new_df], ignore_index=True)
-            combined.to_csv(data_path, index=False)
-        else:
-            new_df.to_csv(data_path, index=False)
-            
-        return {"message": "CSV uploaded and merged successfully", "count": len(new_df)}
+        stats = await run_io(ingest_csv, file.file, writer, get_engine("anomaly"), MODELS.get("encoder"))
+        return {
+            "message": "CSV uploaded and merged successfully",
+            "count": stats["accepted"],
+            "rejected": stats["rejected"],
+            "anomalies": stats["anomalies"],
+        }
 
+    except (pd.errors.EmptyDataError, pd.errors.ParserError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid CSV: {e}")
     except Exception as e:
         print(f"Upload failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/upload/stream")
+async def upload_csv_stream(request: Request, job_id: Optional[str] = None, user_id: Optional[str] = None):
+    """
+    Imports a CSV sent as the raw request body (Content-Type: text/csv).
+    The body is parsed chunk by chunk while it is still arriving. Pass
+    `job_id` to poll progress at /upload/jobs/{job_id} during the upload.
+    `user_id` works as for /upload.
+    """
+    writer = tenant_writer(user_id)
+    if job_id and await run_io(INGEST_JOBS.get, job_id):
+        raise HTTPException(status_code=409, detail="job_id already in use")
+    length = request.headers.get("content-length")
+    job_id = await run_io(INGEST_JOBS.create, job_id, bytes_total=int(length) if length else None)
+
+    reader = QueueReader()
+
+    async def consume():
+        try:
+            return await INGEST_JOBS.run_async(job_id, reader, writer,
+                                               get_engine("anomaly"), MODELS.get("encoder"))
+        finally:
+            reader.abandon()
+
+    consumer = asyncio.ensure_future(consume())
+    try:
+        async for data in request.stream():
+            if data:
+                await reader.afeed(data)
+    finally:
+        await reader.afeed(None)
+
+    try:
+        stats = await consumer
+    except (pd.errors.EmptyDataError, pd.errors.ParserError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid CSV: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "message": "CSV streamed and merged successfully",
+        "job_id": job_id,
+        "count": stats["accepted"],
+        "rejected": stats["rejected"],
+        "anomalies": stats["anomalies"],
+        "chunks": stats["chunks"],
+    }
+
+@app.get("/upload/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    """
+    Progress of a background upload scoring job, whichever worker runs it.
+    """
+    job = await run_io(INGEST_JOBS.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job
+
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Budget Analysis AI API is running"}
 
+@app.get("/ready")
+async def readiness():
+    """
+    Readiness, separate from the liveness check on /: 503 until background
+    warm-up (models, default store, Gemini discovery) has finished. Steps
+    that failed are listed; their resources load on first use instead.
+    """
+    status = WARMUP.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/models")
+async def model_status():
+    """
+    Active model version, its manifest and which models are loaded so far.
+    """
+    return MODELS.status()
+
+@app.post("/models/reload")
+async def reload_models(version: Optional[str] = None):
+    """
+    Switch to `version`, or to the version models/CURRENT points at. The new
+    models are loaded before they replace the running ones. 400 for a
+    malformed version name, 404 for one that is not published.
+    """
+    try:
+        changed = await run_model(MODELS.reload, version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {e}")
+    except ModelLoadError as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed: {e}")
+    if changed:
+        load_models()
+    return {"changed": changed, **MODELS.status()}
+
+@app.get("/summary")
+async def get_summary(top: Optional[int] = Query(None, ge=1), user_id: Optional[str] = None):
+    """
+    Spend totals per category and per month, served from the aggregate cache
+    of the user's partition.
+    """
+    tenant = await get_tenant(user_id)
+    try:
+        with span("aggregate"):
+            return await run_io(tenant.aggregates.snapshot, top=top)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def score_transaction(transaction: TransactionInput) -> dict:
+    """
+    Scores one transaction with the anomaly model (blocking; run it on the
+    model executor).
+    """
+    start = time.perf_counter()
+    # Preprocess Input
+    # We need to match features trained on: Amount, Category_Encoded, DayOfWeek, IsWeekend
+    # Encode Category
+    if "encoder" in MODELS:
+        try:
+            cat_encoded = MODELS["encoder"].transform([transaction.category])[0]
+        except:
+            cat_encoded = -1 # Unknown category
+    else:
+        cat_encoded = 0
+
+    dt = pd.to_datetime(transaction.date)
+    day_of_week = dt.dayofweek
+    is_weekend = 1 if day_of_week >= 5 else 0
+
+    # Prepare Feature Vector
+    features = [[transaction.amount, cat_encoded, day_of_week, is_weekend]]
+    record_stage("feature_build", time.perf_counter() - start)
+
+    # Predict
+    with span("model_predict"):
+        prediction = get_engine("anomaly").predict(np.asarray(features, dtype=np.float64))[0]
+    # -1 is anomaly, 1 is normal
+    is_anomaly = True if prediction == -1 else False
+
+    return {
+        "is_anomaly": is_anomaly,
+        "confidence": "High" # Isolation forest decision function could vary
+    }
+
 @app.post("/analyze/anomaly")
-def check_anomaly(transaction: TransactionInput):
+async def check_anomaly(transaction: TransactionInput):
     """
     Checks if a single transaction is an anomaly.
     """
     if "anomaly" not in MODELS:
         raise HTTPException(status_code=503, detail="Anomaly model not loaded")
-    
-    # Preprocess Input
-    # We need to match features trained on: Amount, Category_Encoded, DayOfWeek, IsWeekend
     try:
-        # Encode Category
-        if "encoder" in MODELS:
-            try:
-                cat_encoded = MODELS["encoder"].transform([transaction.category])[0]
-            except:
-                cat_encoded = -1 # Unknown category
+        return await run_model(score_transaction, transaction)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def batch_rows(result: dict, ids) -> list:
+    scores = [None if np.isnan(v) else round(float(v), 6) for v in result["scores"]]
+    rows = [
+        {"index": i, "score": score, "is_anomaly": flag}
+        for i, (score, flag) in enumerate(zip(scores, result["is_anomaly"].tolist()))
+    ]
+    if ids is not None:
+        for row, row_id in zip(rows, ids.tolist()):
+            row["id"] = row_id
+    return rows
+
+@app.post("/analyze/anomaly/batch")
+async def check_anomaly_batch(batch: AnomalyBatchInput):
+    """
+    Scores many transactions in one call. Pass either `transactions` inline or
+    `stored` to score rows already in the transaction store.
+    """
+    if "anomaly" not in MODELS:
+        raise HTTPException(status_code=503, detail="Anomaly model not loaded")
+    if (batch.transactions is None) == (batch.stored is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of 'transactions' or 'stored'")
+
+    try:
+        t0 = time.perf_counter()
+        if batch.transactions is not None:
+            if len(batch.transactions) > MAX_ANOMALY_BATCH:
+                raise HTTPException(status_code=413, detail=f"Batch limited to {MAX_ANOMALY_BATCH} transactions")
+            txs = batch.transactions
+            df = pd.DataFrame({
+                "Amount": [t.amount for t in txs],
+                "Category": [t.category for t in txs],
+                "Date": [t.date for t in txs],
+            })
+            ids = None
         else:
-            cat_encoded = 0
-            
-        dt = pd.to_datetime(transaction.date)
-        day_of_week = dt.dayofweek
-        is_weekend = 1 if day_of_week >= 5 else 0
-        
-        # Prepare Feature Vector
-        features = [[transaction.amount, cat_encoded, day_of_week, is_weekend]]
-        
-        # Predict
-        prediction = MODELS["anomaly"].predict(features)[0]
-        # -1 is anomaly, 1 is normal
-        is_anomaly = True if prediction == -1 else False
-        
+            sel = batch.stored
+            limit = min(sel.limit or MAX_ANOMALY_BATCH, MAX_ANOMALY_BATCH)
+            tenant = await get_tenant(sel.user_id)
+            with span("store_read"):
+                df = await tenant.store.aread(columns=["Amount", "Category", "Date"], start_date=sel.start_date,
+                                              end_date=sel.end_date, categories=sel.categories, limit=limit)
+            ids = df.index.to_numpy()
+        t_load = time.perf_counter() - t0
+
+        result = await run_model(score_frame, get_engine("anomaly"), MODELS.get("encoder"), df)
+        rows = batch_rows(result, ids)
+
+        timing = result["timing"]
+        total_s = time.perf_counter() - t0
         return {
-            "is_anomaly": is_anomaly,
-            "confidence": "High" # Isolation forest decision function could vary
+            "count": len(rows),
+            "anomalies": int(np.sum(result["is_anomaly"] == True)),
+            "invalid": int((~result["valid"]).sum()),
+            "results": rows,
+            "throughput": {
+                **throughput(len(rows), timing["feature_ms"] / 1000, timing["predict_ms"] / 1000, total_s),
+                "load_ms": round(t_load * 1000, 3),
+            },
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/predict/spending")
-def predict_spending(prev_month_spend: float):
+async def predict_spending(prev_month_spend: float):
     """
     Predicts next month's spending based on previous month.
+    Superseded by GET /forecast, which uses the stored monthly history.
     """
     if "forecast" not in MODELS:
         raise HTTPException(status_code=503, detail="Forecast model not loaded")
@@ -348,89 +716,254 @@ def predict_spending(prev_month_spend: float):
         # In a real app we'd track time.
         
         features = [[25, prev_month_spend]] 
-        prediction = MODELS["forecast"].predict(features)[0]
+        prediction = (await run_model(MODELS["forecast"].predict, features))[0]
         
         return {"predicted_spend": round(prediction, 2)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/forecast")
+async def forecast_spending(horizon: int = Query(3, ge=1, le=MAX_HORIZON), category: Optional[str] = None,
+                           user_id: Optional[str] = None):
+    """
+    Forecasts monthly spend per category for the next `horizon` months from
+    the user's stored monthly totals (optionally for one `category`).
+    """
+    tenant = await get_tenant(user_id)
+    with span("aggregate"):
+        totals = await run_io(tenant.aggregates.monthly_totals)
+    if totals.empty:
+        raise HTTPException(status_code=404, detail="No spending history to forecast from")
+    if category is not None and category not in totals.columns:
+        raise HTTPException(status_code=404, detail=f"Unknown category: {category}")
+    with span("model_predict"):
+        return await run_model(SPEND_FORECASTER.forecast, MODELS.get("spend_forecaster"), MODELS.version,
+                               totals, horizon, category)
+
+def categorize_text(text: str):
+    """
+    Returns (category, source) for a merchant/free-form text (blocking; run
+    it on the model executor).
+    """
+    category, source = get_categorizer().categorize(text)
+    if category is None:
+        raise HTTPException(status_code=503, detail="Categorization model not loaded")
+    return category, source
+
 @app.post("/categorize")
-def categorize_merchant(input_data: CategorizeInput):
+async def categorize_merchant(input_data: CategorizeInput):
     """
     Predicts category for a given merchant name.
     """
+    text = (input_data.merchant or "").strip()
+    if not text:
+        raise HTTPException(status_code=400, detail="merchant is required")
     try:
-        text = (input_data.merchant or "").strip()
-        if not text:
-            raise HTTPException(status_code=400, detail="merchant is required")
-
-        # --- Rule-based overrides for free-form inputs (non-merchant names) ---
-        # Normalize
-        lower = text.lower()
-        keyword_rules = [
-            (["medicine", "medicin", "pharmacy", "chemist", "drug", "tablet", "capsule", "hospital", "clinic"], "Health"),
-            (["egg", "grocery", "supermarket", "market", "mart", "vegetable", "fruit"], "Groceries"),
-            (["fine", "penalty", "challan", "ticket"], "Fees & Fines"),
-            (["fuel", "petrol", "diesel", "gas station", "pump"], "Transport"),
-            (["uber", "ola", "lyft", "cab", "taxi"], "Transport"),
-        ]
-        for keywords, cat in keyword_rules:
-            if any(k in lower for k in keywords):
-                return {"merchant": input_data.merchant, "category": cat, "source": "rule"}
+        category, source = await run_model(categorize_text, text)
+        return {"merchant": input_data.merchant, "category": category, "source": source}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # --- ML fallback ---
-        if "categorizer" not in MODELS or "vectorizer" not in MODELS:
-            raise HTTPException(status_code=503, detail="Categorization model not loaded")
+@app.post("/categorize/batch")
+async def categorize_batch(input_data: CategorizeBatchInput):
+    """
+    Categorizes a list of merchants. Distinct merchants not answered by the
+    rules, lookup or memo are vectorized and predicted in one call.
+    """
+    merchants = input_data.merchants
+    if not merchants:
+        raise HTTPException(status_code=400, detail="merchants must not be empty")
+    if len(merchants) > MAX_CATEGORIZE_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch limited to {MAX_CATEGORIZE_BATCH} merchants")
+    blank = [i for i, m in enumerate(merchants) if not m.strip()]
+    if blank:
+        raise HTTPException(status_code=400, detail=f"merchants must not be blank (positions {blank[:10]})")
+    start = time.perf_counter()
+    categories, sources, info = await run_model(get_categorizer().categorize_many, merchants)
+    elapsed = time.perf_counter() - start
+    if any(c is None for c in categories):
+        raise HTTPException(status_code=503, detail="Categorization model not loaded")
+    return {
+        "count": len(merchants),
+        "results": [
+            {"merchant": m, "category": c, "source": src} for m, c, src in zip(merchants, categories, sources)
+        ],
+        "timing": {
+            **info,
+            "total_ms": round(elapsed * 1000, 2),
+            "ms_per_10k": round(elapsed * 1000 * 10000 / len(merchants), 2),
+        },
+    }
 
-        vectorized_text = MODELS["vectorizer"].transform([text]).toarray()
-        pred_encoded = MODELS["categorizer"].predict(vectorized_text)[0]
-        pred_label = MODELS["encoder"].inverse_transform([pred_encoded])[0]
-        
-        return {"merchant": input_data.merchant, "category": pred_label, "source": "model"}
+@app.post("/categorize/backfill", status_code=202)
+async def start_category_backfill(user_id: Optional[str] = None):
+    """
+    Starts (or resumes from its checkpoint) the background job that fills in
+    stored "Uncategorized" rows of the user's partition with predicted
+    categories.
+    """
+    tenant = await get_tenant(user_id)
+    categorizer = await run_model(get_categorizer)
+    if not categorizer.has_model:
+        raise HTTPException(status_code=503, detail="Categorization model not loaded")
+    started = await run_io(tenant.backfill.start, tenant.store, categorizer)
+    return {"started": started, **(await run_io(tenant.backfill.get))}
+
+@app.get("/categorize/backfill")
+async def category_backfill_status(user_id: Optional[str] = None):
+    """Status of the user's latest backfill run, whichever worker runs it."""
+    return await run_io((await get_tenant(user_id)).backfill.get)
+
+@app.get("/categorize/stats")
+async def categorize_stats():
+    """
+    Hit counts per lookup stage (rule, lookup, memo, model) and hit rates.
+    """
+    return get_categorizer().stats()
+
+def records_json(df: pd.DataFrame, lines: bool = False) -> str:
+    """
+    Serialize a frame as a JSON array of records (or NDJSON lines).
+    NaN/Inf become null via vectorized replacement instead of walking
+    every value in Python. The default double_precision prints amounts as
+    written (780.59); more digits expose binary noise (780.590000000000032).
+    """
+    num_cols = df.select_dtypes(include=[np.number]).columns
+    if len(num_cols):
+        df = df.copy()
+        df[num_cols] = df[num_cols].replace([np.inf, -np.inf], np.nan)
+    return df.to_json(orient="records", lines=lines)
+
+
+def timed_chunks(chunks, stage: str = "store_read"):
+    """Iterate `chunks`, timing each fetch as a metrics stage."""
+    chunks = iter(chunks)
+    while True:
+        with span(stage):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def stream_records(chunks, ndjson: bool = False):
+    """
+    Stream DataFrame chunks either as one JSON array or as NDJSON lines.
+
+    The response has started by the time a later chunk fails, so the error
+    is logged and signalled in the body: NDJSON ends with an {"error": ...}
+    line; a JSON array is left unterminated by re-raising, which aborts the
+    connection instead of handing the client a short but valid array.
+    """
+    try:
+        if ndjson:
+            for chunk in timed_chunks(chunks):
+                if len(chunk):
+                    with span("serialize"):
+                        body = records_json(chunk, lines=True)
+                    yield body if body.endswith("\n") else body + "\n"
+            return
+        yield "["
+        first = True
+        for chunk in timed_chunks(chunks):
+            with span("serialize"):
+                body = records_json(chunk)[1:-1]
+            if not body:
+                continue
+            yield body if first else "," + body
+            first = False
+        yield "]"
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        print(f"Transaction stream failed: {e}")
+        if not ndjson:
+            raise
+        yield json.dumps({"error": str(e)}) + "\n"
+
 
 @app.get("/transactions")
-def get_transactions():
+async def get_transactions(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    category: Optional[List[str]] = Query(None),
+    merchant: Optional[List[str]] = Query(None),
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    is_anomaly: Optional[bool] = None,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[int] = Query(None, ge=0),
+    output_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    user_id: Optional[str] = None,
+):
     """
-    Returns transaction history for the dashboard.
+    Returns transaction history for the dashboard, from the user's partition
+    (the shared store without `user_id`).
+
+    Supports server-side filters, a `fields=` column projection and
+    offset or cursor pagination. Without `limit` every matching row is
+    streamed. When a page is full, the cursor for the next page is returned
+    in the X-Next-Cursor header.
     """
+    columns = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    unknown = [c for c in columns or [] if c != "id" and c not in CORE_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    store = (await get_tenant(user_id)).store
     try:
-        # Load from the processed CSV used by the original app
-        # Adjust path as needed relative to backend/main.py
-        data_path = "../data/processed/cleaned_transactions.csv"
-        if os.path.exists(data_path):
-            df = pd.read_csv(data_path)
-            
-            # Simple, robust way to handle NaN/Inf for JSON compliance:
-            # Convert to dict first, then recursively clean.
-            records = df.to_dict(orient="records")
-            
-            def clean_nan(obj):
-                if isinstance(obj, float):
-                    if np.isnan(obj) or np.isinf(obj):
-                        return None
-                elif isinstance(obj, dict):
-                    return {k: clean_nan(v) for k, v in obj.items()}
-                elif isinstance(obj, list):
-                    return [clean_nan(i) for i in obj]
-                return obj
-                
-            cleaned_records = [clean_nan(record) for record in records]
-            return cleaned_records
+        filters = {
+            "start_date": start_date,
+            "end_date": end_date,
+            "categories": category,
+            "merchants": merchant,
+            "min_amount": min_amount,
+            "max_amount": max_amount,
+            "is_anomaly": is_anomaly,
+        }
+        include_id = columns is not None and "id" in columns
+
+        headers = {}
+        if limit is None:
+            chunks = store.iter_read(chunk_size=STREAM_CHUNK_ROWS, offset=offset,
+                                     after_id=cursor, columns=columns, **filters)
         else:
-            return []
+            # Fetch one extra row to know whether another page exists
+            with span("store_read"):
+                page = await store.aread(columns=columns, limit=limit + 1, offset=offset,
+                                         after_id=cursor, **filters)
+            if len(page) > limit:
+                page = page.iloc[:limit]
+                headers["X-Next-Cursor"] = str(int(page.index[-1]))
+            chunks = [page.iloc[i: i + STREAM_CHUNK_ROWS] for i in range(0, len(page), STREAM_CHUNK_ROWS)]
+
+        if include_id:
+            chunks = (chunk.reset_index()[columns] for chunk in chunks)
+
+        # Read the first chunk before the 200 goes out, so an early store
+        # error is still a proper HTTP error
+        chunks = iter(chunks)
+        with span("store_read"):
+            first = await run_io(next, chunks, None)
+        chunks = itertools.chain([] if first is None else [first], chunks)
+
+        ndjson = output_format == "ndjson"
+        media_type = "application/x-ndjson" if ndjson else "application/json"
+        # Store reads and JSON encoding both run on the I/O pool, chunk by chunk
+        return StreamingResponse(iterate_io(stream_records(chunks, ndjson=ndjson)),
+                                 media_type=media_type, headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/transactions")
-def add_transaction(transaction: TransactionInput):
+async def add_transaction(transaction: TransactionInput):
     """
-    Adds a new transaction to the CSV file.
+    Adds a new transaction to the transaction store (the user's partition
+    when `user_id` is set).
     """
+    tenant = await get_tenant(transaction.user_id)
     try:
-        data_path = "../data/processed/cleaned_transactions.csv"
-        
         # Create a new record
         new_record = {
             "Date": transaction.date,
@@ -439,61 +972,109 @@ def add_transaction(transaction: TransactionInput):
             "Category": transaction.category,
             "Is_Expense": True,
             "Month": pd.to_datetime(transaction.date).strftime("%Y-%m"),
-            "Is_Anomaly": False # Default
         }
         
-        # Append to CSV
-        if os.path.exists(data_path):
-            df = pd.read_csv(data_path)
-            new_df = pd.DataFrame([new_record])
-            df = pd.concat([df, new_df], ignore_index=True)
-            df.to_csv(data_path, index=False)
-            return {"message": "Transaction added successfully"}
-        else:
-             # Create new if doesn't exist
-            df = pd.DataFrame([new_record])
-            df.to_csv(data_path, index=False)
-            return {"message": "Transaction file created and transaction added"}
-            
+        new_df = await run_model(apply_anomaly_scores, pd.DataFrame([new_record]),
+                                 get_engine("anomaly"), MODELS.get("encoder"))
+        with span("store_write"):
+            await tenant.store.aappend(new_df)
+        return {"message": "Transaction added successfully", "is_anomaly": bool(new_df["Is_Anomaly"].iloc[0])}
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/chat")
-@app.post("/chat")
-def chat_endpoint(input_data: ChatInput):
+async def chat_endpoint(input_data: ChatInput):
     """
     Chat with the AI financial advisor.
     """
-    if not CHAT_MODEL:
-        raise HTTPException(status_code=503, detail="Chat model not initialized")
+    if not CHAT_BACKEND:
+        detail = "Chat model not initialized" if WARMUP.ready else "Chat model is still initializing; see /ready"
+        raise HTTPException(status_code=503, detail=detail)
+    tenant = await get_tenant(input_data.user_id)
 
     try:
         # Build Context
-        context = build_spend_snapshot() or "No recent transaction data available."
-        
-        system_prompt = (
-            "You are FinMate, a helpful and friendly financial assistant. "
-            "You have access to the user's recent spending summary below. "
-            "Use this context to answer questions if relevant. "
-            "If the user asks about something else, just answer normally. "
-            "Keep answers concise and practical.\n\n"
-            f"CONTEXT:\n{context}\n\n"
-            f"USER QUERY: {input_data.query}"
-        )
-        
-        response = CHAT_MODEL.generate_content(system_prompt)
-        
-        # Safety check
-        if response.candidates and response.candidates[0].content.parts:
-             return {"response": response.text}
-        else:
-             return {"response": "I'm sorry, I couldn't generate a response for that query due to safety settings."}
+        with span("context"):
+            context = await run_io(build_spend_snapshot, tenant.aggregates) or "No recent transaction data available."
+        with span("prompt"):
+            system_prompt = build_chat_prompt(input_data.query, context)
+            key = chat_cache_key(input_data.query, context)
+        with span("llm"):
+            response = await CHAT_BACKEND.generate(system_prompt, key=key)
+        return {"response": response}
 
+    except RateLimited as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         print(f"Chat generation failed: {e}")
         # Return a friendly error instead of 500
         return {"response": "I'm having trouble thinking right now. Please try again."}
 
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(input_data: ChatInput):
+    """
+    Chat with the AI financial advisor, streaming the answer as Server-Sent
+    Events: `data: {"token": ...}` per piece, then an `event: done` carrying
+    time-to-first-token and tokens/sec for this response.
+    """
+    if not CHAT_BACKEND:
+        detail = "Chat model not initialized" if WARMUP.ready else "Chat model is still initializing; see /ready"
+        raise HTTPException(status_code=503, detail=detail)
+    tenant = await get_tenant(input_data.user_id)
+
+    with span("context"):
+        context = await run_io(build_spend_snapshot, tenant.aggregates) or "No recent transaction data available."
+    with span("prompt"):
+        system_prompt = build_chat_prompt(input_data.query, context)
+        key = chat_cache_key(input_data.query, context)
+
+    async def events():
+        try:
+            with span("llm"):
+                async for piece, stats in timed_stream(CHAT_BACKEND, system_prompt, CHAT_METRICS, key=key):
+                    if stats is None:
+                        yield sse_event({"token": piece})
+                    else:
+                        yield sse_event({**stats, "backend": CHAT_BACKEND.name}, event="done")
+        except RateLimited as e:
+            yield sse_event({"error": str(e)}, event="error")
+        except Exception as e:
+            print(f"Chat stream failed: {e}")
+            yield sse_event({"error": "I'm having trouble thinking right now. Please try again."}, event="error")
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/chat/metrics")
+async def chat_metrics():
+    """
+    Rolling time-to-first-token and tokens/sec for streamed chat responses,
+    plus response cache, coalescing and rate limiter queue counters.
+    """
+    return {
+        "backend": CHAT_BACKEND.name if CHAT_BACKEND else None,
+        **CHAT_METRICS.summary(),
+        # stats() counts the shared cache's entries in SQLite
+        "gateway": await run_io(CHAT_BACKEND.stats) if CHAT_BACKEND else None,
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus text format: request counts, errors and latency histograms
+    per route, time per internal stage (store_read, feature_build,
+    model_predict, llm, serialize, ...) per route, and model load status.
+    Under the multi-worker server the counters are summed over workers.
+    """
+    # Aggregating over workers reads the shared cache
+    body = await run_io(METRICS.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 # --- Serve built frontend if present (for single-container deploys) ---
 # MOUNTED LAST to avoid intercepting API routes
 FRONTEND_DIST = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend-react", "dist"))
@@ -503,4 +1084,6 @@ else:
     print("Frontend dist not found; API-only mode.")
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,303 @@
+"""
+Request metrics in the Prometheus text format.
+
+MetricsMiddleware (pure ASGI, so streamed bodies are included) records per
+route: request counts by status, errors and a latency histogram. Inside a
+request, code marks its internal stages with
+
+    with span("store_read"):
+        df = store.read(...)
+
+or record_stage() for durations it already measured. Stage time is summed
+per request and observed once per (route, stage) when the request ends,
+so the stage histograms show where each route's time goes. Spans outside a
+request (background jobs) are observed under route "background".
+run_io/run_model copy the request context into their worker threads, so
+spans in model and store code are attributed to the calling route.
+
+METRICS.render() produces the GET /metrics body; add_collector() adds
+gauges computed at scrape time (model load status, ...).
+
+Under the multi-worker server, METRICS.share(shared_cache) makes every
+worker publish its counters to the shared cache (keyed by pid, at most
+every PUBLISH_INTERVAL seconds) and render() sum them over all workers,
+so a scrape landing on any worker sees the same monotonic counters.
+Counters of workers that died are kept; in-flight gauges are not.
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sharedcache import pid_alive
+
+# Seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BACKGROUND = "background"
+PUBLISH_INTERVAL = float(os.getenv("FINMATE_METRICS_PUBLISH_S", "1.0"))
+SHARED_NAMESPACE = "metrics"
+
+# Stage time of the request being handled: {stage: seconds}
+_STAGES: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("finmate_stages", default=None)
+# Spans of one request can run in several threads at once
+_STAGES_LOCK = threading.Lock()
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # First bucket with value <= bound; len(buckets) is +Inf
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _merge_counts(total: dict, part: dict):
+    for key, n in part.items():
+        total[key] = total.get(key, 0) + n
+
+
+def _merge_histograms(total: dict, part: dict):
+    for key, (counts, hist_sum, count) in part.items():
+        if key in total:
+            old_counts, old_sum, old_count = total[key]
+            counts = [a + b for a, b in zip(old_counts, counts)]
+            hist_sum, count = old_sum + hist_sum, old_count + count
+        total[key] = (list(counts), hist_sum, count)
+
+
+# A collector returns (name, type, help, [(labels, value), ...]) families
+Family = Tuple[str, str, str, List[Tuple[dict, float]]]
+
+
+class Metrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.errors: Dict[Tuple[str, str], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.stages: Dict[Tuple[str, str], Histogram] = {}
+        self.in_flight = 0
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._shared = None
+        self._publisher_pid: Optional[int] = None
+        self._dirty = threading.Event()
+
+    def add_collector(self, fn: Callable[[], Iterable[Family]]):
+        self._collectors.append(fn)
+
+    def share(self, shared, interval: float = PUBLISH_INTERVAL):
+        """Publish to and aggregate over `shared` (a sharedcache.SharedCache)."""
+        self._shared = shared
+        self._interval = interval
+
+    def _ensure_publisher(self):
+        # Started lazily in the process that serves requests: server.py
+        # imports the app before forking, and threads do not survive a fork
+        if self._shared is None or self._publisher_pid == os.getpid():
+            return
+        self._publisher_pid = os.getpid()
+        self._dirty = threading.Event()
+        threading.Thread(target=self._publish_loop, name="metrics-publish", daemon=True).start()
+
+    def _publish_loop(self):
+        while True:
+            self._dirty.wait()
+            self._dirty.clear()
+            self._publish()
+            time.sleep(self._interval)
+
+    def _publish(self):
+        try:
+            self._shared.put(SHARED_NAMESPACE, str(os.getpid()), self.snapshot())
+        except Exception as e:
+            print(f"Metrics publish failed: {e}")
+
+    def snapshot(self) -> dict:
+        """This process's counters as plain data."""
+        def hists(table):
+            return {key: (list(h.counts), h.sum, h.count) for key, h in table.items()}
+
+        with self._lock:
+            return {"pid": os.getpid(), "requests": dict(self.requests), "errors": dict(self.errors),
+                    "latency": hists(self.latency), "stages": hists(self.stages), "in_flight": self.in_flight}
+
+    def collect(self) -> dict:
+        """Counters to render: this process's, or the sum over all workers when shared."""
+        own = self.snapshot()
+        if self._shared is None:
+            return own
+        self._publish()
+        try:
+            snapshots = [value for _, value in self._shared.items(SHARED_NAMESPACE)]
+        except Exception as e:
+            print(f"Metrics aggregation failed: {e}")
+            return own
+        total = {"requests": {}, "errors": {}, "latency": {}, "stages": {}, "in_flight": 0}
+        for snap in snapshots:
+            _merge_counts(total["requests"], snap["requests"])
+            _merge_counts(total["errors"], snap["errors"])
+            _merge_histograms(total["latency"], snap["latency"])
+            _merge_histograms(total["stages"], snap["stages"])
+            if snap["pid"] == own["pid"] or pid_alive(snap["pid"]):
+                total["in_flight"] += snap["in_flight"]
+        return total
+
+    def _histogram(self, table: dict, key) -> Histogram:
+        hist = table.get(key)
+        if hist is None:
+            hist = table[key] = Histogram(self.buckets)
+        return hist
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float,
+                        stages: Optional[Dict[str, float]] = None):
+        with self._lock:
+            key = (method, route, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if status >= 500:
+                self.errors[(method, route)] = self.errors.get((method, route), 0) + 1
+            self._histogram(self.latency, (method, route)).observe(seconds)
+            for stage, spent in (stages or {}).items():
+                self._histogram(self.stages, (route, stage)).observe(spent)
+        if self._shared is not None:
+            self._ensure_publisher()
+            self._dirty.set()
+
+    def observe_stage(self, route: str, stage: str, seconds: float):
+        with self._lock:
+            self._histogram(self.stages, (route, stage)).observe(seconds)
+        if self._shared is not None:
+            self._ensure_publisher()
+            self._dirty.set()
+
+    def _render_histograms(self, out: list, name: str, help_text: str, table: dict, label_names):
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} histogram")
+        for key, (counts, hist_sum, count) in sorted(table.items()):
+            labels = dict(zip(label_names, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                out.append(f"{name}_bucket{_labels({**labels, 'le': repr(bound)})} {cumulative}")
+            out.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {count}")
+            out.append(f"{name}_sum{_labels(labels)} {hist_sum!r}")
+            out.append(f"{name}_count{_labels(labels)} {count}")
+
+    def render(self) -> str:
+        data = self.collect()
+        out = []
+        out.append("# HELP finmate_http_requests_total HTTP requests by method, route and status.")
+        out.append("# TYPE finmate_http_requests_total counter")
+        for (method, route, status), n in sorted(data["requests"].items()):
+            out.append(f"finmate_http_requests_total{_labels({'method': method, 'route': route, 'status': status})} {n}")
+        out.append("# HELP finmate_http_request_errors_total Requests that failed with a 5xx or an unhandled error.")
+        out.append("# TYPE finmate_http_request_errors_total counter")
+        for (method, route), n in sorted(data["errors"].items()):
+            out.append(f"finmate_http_request_errors_total{_labels({'method': method, 'route': route})} {n}")
+        out.append("# HELP finmate_http_requests_in_flight Requests being handled.")
+        out.append("# TYPE finmate_http_requests_in_flight gauge")
+        out.append(f"finmate_http_requests_in_flight {data['in_flight']}")
+        self._render_histograms(out, "finmate_http_request_duration_seconds",
+                                "Request latency, including streamed bodies.", data["latency"], ("method", "route"))
+        self._render_histograms(out, "finmate_stage_duration_seconds",
+                                "Time per request spent in an internal stage.", data["stages"], ("route", "stage"))
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                out.append(f"# HELP {name} {help_text}")
+                out.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    out.append(f"{name}{_labels(labels)} {float(value)!r}")
+        return "\n".join(out) + "\n"
+
+
+METRICS = Metrics()
+
+
+def record_stage(stage: str, seconds: float):
+    """Add `seconds` to `stage` for the current request (or observe it as background work)."""
+    stages = _STAGES.get()
+    if stages is None:
+        METRICS.observe_stage(BACKGROUND, stage, seconds)
+        return
+    with _STAGES_LOCK:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str):
+    """Time the block as `stage` of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        # Unmatched paths would give one series per URL
+        return "unmatched"
+    return path or "/"
+
+
+class MetricsMiddleware:
+    def __init__(self, app, metrics: Metrics = METRICS):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+        stages: Dict[str, float] = {}
+        token = _STAGES.set(stages)
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with self.metrics._lock:
+            self.metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_status)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            _STAGES.reset(token)
+            with self.metrics._lock:
+                self.metrics.in_flight -= 1
+            with _STAGES_LOCK:
+                stages = dict(stages)
+            self.metrics.observe_request(scope["method"], _route_label(scope), status,
+                                         time.perf_counter() - start, stages)
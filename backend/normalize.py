@@ -0,0 +1,163 @@
+"""
+Column normalization shared by CSV ingestion and scripts/preprocess_data.py.
+
+Everything here works on whole Series with vectorized string ops. Column
+type detection looks at a bounded sample, and the detected layout (swap,
+decimal style, date format) is computed once per export and reused for
+every chunk.
+"""
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+SAMPLE_SIZE = 1000
+
+# Currency markers stripped before parsing (symbols and common codes)
+CURRENCY_RE = r"(?i)(?:[₹$€£¥]|\b(?:rs|inr|usd|eur|gbp)\b\.?)"
+# "1.234,56" style: dot thousands, comma decimal
+COMMA_DECIMAL_RE = r"^-?\d{1,3}(?:\.\d{3})*,\d{1,2}$|^-?\d+,\d{1,2}$"
+
+# Tried in order; day-first layouts come before month-first ones so that
+# ambiguous dates keep the old dayfirst=True behaviour.
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%d/%m/%Y",
+    "%d-%m-%Y",
+    "%d.%m.%Y",
+    "%d/%m/%y",
+    "%d-%m-%y",
+    "%d %b %Y",
+    "%d-%b-%Y",
+    "%d-%b-%y",
+    "%d %B %Y",
+    "%Y/%m/%d",
+    "%m/%d/%Y",
+    "%m-%d-%Y",
+    "%b %d, %Y",
+]
+
+
+def sample(series: pd.Series, size: int = SAMPLE_SIZE) -> pd.Series:
+    """Non-null values spread evenly across the series, at most `size` of them."""
+    values = series.dropna()
+    if len(values) <= size:
+        return values
+    step = len(values) / size
+    return values.iloc[(np.arange(size) * step).astype(int)]
+
+
+def detect_decimal_comma(series: pd.Series) -> bool:
+    """True if most sampled values look like "1.234,56"."""
+    values = sample(series)
+    if values.empty or pd.api.types.is_numeric_dtype(values):
+        return False
+    stripped = values.astype(str).str.replace(CURRENCY_RE, "", regex=True).str.strip()
+    return stripped.str.match(COMMA_DECIMAL_RE).mean() > 0.5
+
+
+def parse_amounts(series: pd.Series, decimal_comma: Optional[bool] = None) -> pd.Series:
+    """
+    Parse currency strings into signed floats.
+
+    Handles currency symbols/codes (₹, Rs., INR, $ ...), thousands
+    separators, "1.234,56" decimal commas, parentheses for negatives and
+    CR/DR suffixes (DR is negative). Unparseable values become NaN.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    if decimal_comma is None:
+        decimal_comma = detect_decimal_comma(series)
+
+    s = series.astype("string").str.strip()
+    s = s.str.replace(CURRENCY_RE, "", regex=True).str.strip()
+
+    # No \b: "500DR" has no word boundary between the digit and the suffix
+    suffix = s.str.extract(r"(?i)(?<=[\d\s.)])\s*(CR|DR)\.?$", expand=False).str.upper()
+    s = s.str.replace(r"(?i)(?<=[\d\s.)])\s*(?:CR|DR)\.?$", "", regex=True)
+    parens = s.str.match(r"^\s*\(.*\)\s*$").fillna(False)
+
+    if decimal_comma:
+        s = s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    else:
+        s = s.str.replace(",", "", regex=False)
+    s = s.str.replace(r"[^\d.\-]", "", regex=True)
+
+    amounts = pd.to_numeric(s, errors="coerce").astype(float)
+    negative = (parens | (suffix == "DR").fillna(False)).to_numpy(dtype=bool)
+    values = amounts.to_numpy()
+    values = np.where(negative, -np.abs(values), values)
+    return pd.Series(values, index=series.index, name=series.name)
+
+
+def is_mostly_numeric(series: pd.Series, threshold: float = 0.5) -> bool:
+    """Whether more than `threshold` of a sample parses as an amount."""
+    values = sample(series)
+    if values.empty:
+        return False
+    return parse_amounts(values).notna().mean() > threshold
+
+
+def detect_layout(df: pd.DataFrame, required=("Date", "Merchant", "Amount")) -> dict:
+    """
+    Inspect a sample of an export once and describe how to read it:
+    whether Amount/Category are swapped, the amount decimal style and the
+    date format. The result is reused for every chunk of the same upload.
+    """
+    swap = False
+    if not set(required).issubset(df.columns):
+        if "Amount" in df.columns and "Category" in df.columns:
+            swap = not is_mostly_numeric(df["Amount"]) and is_mostly_numeric(df["Category"])
+
+    amount_col = "Category" if swap else "Amount"
+    layout = {"swap": swap, "decimal_comma": False, "date_format": None}
+    if amount_col in df.columns:
+        layout["decimal_comma"] = detect_decimal_comma(df[amount_col])
+    if "Date" in df.columns:
+        layout["date_format"] = infer_date_format(df["Date"])
+    return layout
+
+
+def infer_date_format(series: pd.Series, threshold: float = 0.9) -> Optional[str]:
+    """
+    Return the first entry of DATE_FORMATS that parses at least `threshold`
+    of a sample, or None. Callers cache the result (see detect_layout) so
+    later chunks of the same export skip inference.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return None
+    values = sample(series.astype(str).str.strip(), size=200)
+    if values.empty:
+        return None
+    for fmt in DATE_FORMATS:
+        parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+        if parsed.notna().mean() >= threshold:
+            return fmt
+    return None
+
+
+def _parse_dates_slow(series: pd.Series, dayfirst: bool) -> pd.Series:
+    try:
+        # pandas >= 2 infers one format per column unless told otherwise
+        return pd.to_datetime(series, dayfirst=dayfirst, errors="coerce", format="mixed")
+    except (TypeError, ValueError):
+        return pd.to_datetime(series, dayfirst=dayfirst, errors="coerce")
+
+
+def parse_dates(series: pd.Series, date_format: Optional[str] = None, dayfirst: bool = True) -> pd.Series:
+    """
+    Parse a date column with an explicit (inferred or given) format, falling
+    back to pandas' per-value inference only when no known format fits.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    fmt = date_format or infer_date_format(series)
+    if not fmt:
+        return _parse_dates_slow(series, dayfirst)
+    parsed = pd.to_datetime(series, format=fmt, errors="coerce")
+    # Stragglers in another layout go through the slow path individually
+    missing = parsed.isna() & series.notna()
+    if missing.any():
+        parsed[missing] = _parse_dates_slow(series[missing], dayfirst)
+    return parsed
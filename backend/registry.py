@@ -0,0 +1,252 @@
+"""
+Versioned model registry.
+
+Layout under MODELS_DIR (default <repo>/models, absolute, so the API works
+from any cwd):
+
+    models/
+      CURRENT                 name of the active version
+      <version>/manifest.json version, created_at, data_hash, feature_schema, files
+      <version>/<name>.joblib one uncompressed joblib file per model
+
+Models are loaded on first access and their numpy arrays are memory-mapped
+(joblib mmap_mode="r"), so uvicorn workers forked from one parent share the
+same page-cache pages. scripts/train_models.py publishes new versions;
+reload() swaps a running process over to the current one without a restart.
+A models/ directory with only the old flat *.pkl files is served as version
+"legacy".
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+from typing import Dict, Optional
+
+import joblib
+import pandas as pd
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MODELS_DIR = os.path.abspath(os.getenv("FINMATE_MODELS_DIR", os.path.join(BASE_DIR, "models")))
+
+# Flat files written by older versions of train_models.py
+LEGACY_FILES = {
+    "anomaly": "anomaly_model.pkl",
+    "forecast": "spending_forecaster.pkl",
+    "categorizer": "merchant_categorizer.pkl",
+    "vectorizer": "merchant_vectorizer.pkl",
+    "encoder": "category_encoder.pkl",
+    "lookup": "merchant_lookup.pkl",
+}
+
+# Version names are single directory names under MODELS_DIR
+_VERSION = re.compile(r"^[0-9A-Za-z_.-]+$")
+
+
+class ModelLoadError(Exception):
+    pass
+
+
+def version_dir(models_dir: str, version: str) -> str:
+    """Directory of `version` under `models_dir` (ValueError if the name could leave it)."""
+    version = str(version).strip()
+    if not _VERSION.match(version) or ".." in version:
+        raise ValueError(f"Invalid model version {version!r}: use letters, digits, '_', '-' or '.'")
+    root = os.path.realpath(models_dir)
+    path = os.path.realpath(os.path.join(root, version))
+    if os.path.dirname(path) != root:
+        raise ValueError(f"Invalid model version {version!r}: outside {models_dir}")
+    return path
+
+
+def frame_hash(df: pd.DataFrame) -> str:
+    """Stable hash of a training frame (values and column names)."""
+    h = hashlib.sha256()
+    h.update(",".join(map(str, df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def _read_manifest(version_dir: str) -> dict:
+    with open(os.path.join(version_dir, "manifest.json")) as f:
+        return json.load(f)
+
+
+def _write_text_atomic(path: str, text: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def publish(models: Dict[str, object], data_hash: str, feature_schema: dict,
+            models_dir: str = MODELS_DIR, version: Optional[str] = None, keep: int = 5,
+            inputs: Optional[Dict[str, str]] = None) -> str:
+    """
+    Write `models` as a new version, point CURRENT at it and drop all but
+    the newest `keep` versions. `inputs` maps model names to a hash of what
+    they were trained on, so the next run can reuse unchanged models.
+    Returns the version name.
+    """
+    version = version or time.strftime("%Y%m%d-%H%M%S") + "-" + data_hash[:8]
+    os.makedirs(models_dir, exist_ok=True)
+    final_dir = os.path.join(models_dir, version)
+    tmp_dir = final_dir + ".partial"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    files = {}
+    for name, obj in models.items():
+        files[name] = f"{name}.joblib"
+        # No compression: compressed files cannot be memory-mapped
+        joblib.dump(obj, os.path.join(tmp_dir, files[name]))
+    manifest = {
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "data_hash": data_hash,
+        "feature_schema": feature_schema,
+        "inputs": inputs or {},
+        "files": files,
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_dir, final_dir)
+    _write_text_atomic(os.path.join(models_dir, "CURRENT"), version)
+
+    versions = sorted(d for d in os.listdir(models_dir)
+                      if os.path.isfile(os.path.join(models_dir, d, "manifest.json")))
+    for old in versions[:-keep]:
+        shutil.rmtree(os.path.join(models_dir, old), ignore_errors=True)
+    return version
+
+
+class ModelRegistry:
+    """
+    Dict-like access to the active model version: `registry["anomaly"]`
+    loads on first use, `"anomaly" in registry` says whether the version has
+    it, `registry.get(name)` returns None if it is missing or fails to load.
+    """
+
+    def __init__(self, models_dir: str = MODELS_DIR, version: Optional[str] = None):
+        self.models_dir = models_dir
+        self._lock = threading.RLock()
+        self._loaded: Dict[str, object] = {}
+        self.errors: Dict[str, str] = {}
+        self.manifest: dict = {}
+        self._dir: Optional[str] = None
+        self._open(version or self.current_version())
+
+    # --- version resolution ---
+
+    def current_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.models_dir, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _resolve(self, version: Optional[str]):
+        """(directory, manifest) for `version`, or the legacy flat layout."""
+        if version:
+            directory = version_dir(self.models_dir, version)
+            return directory, _read_manifest(directory)
+        files = {name: fname for name, fname in LEGACY_FILES.items()
+                 if os.path.exists(os.path.join(self.models_dir, fname))}
+        return self.models_dir, {"version": "legacy" if files else None, "data_hash": None,
+                                 "feature_schema": {}, "files": files}
+
+    def _open(self, version: Optional[str]):
+        try:
+            self._dir, self.manifest = self._resolve(version)
+        except (OSError, ValueError) as e:
+            print(f"Model registry: cannot open version {version}: {e}")
+            self._dir, self.manifest = self.models_dir, {"version": None, "files": {}}
+        self._loaded = {}
+        self.errors = {}
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.manifest.get("version")
+
+    # --- loading ---
+
+    def _load_file(self, path: str):
+        if path.endswith(".pkl"):
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        return joblib.load(path, mmap_mode="r")
+
+    def _load(self, name: str):
+        fname = self.manifest.get("files", {}).get(name)
+        if fname is None:
+            raise KeyError(name)
+        path = os.path.join(self._dir, fname)
+        try:
+            obj = self._load_file(path)
+        except Exception as e:
+            self.errors[name] = str(e)
+            print(f"Model registry: failed to load {name} from {path}: {e}")
+            raise ModelLoadError(f"{name}: {e}") from e
+        self.errors.pop(name, None)
+        return obj
+
+    def __getitem__(self, name: str):
+        obj = self._loaded.get(name)
+        if obj is not None:
+            return obj
+        with self._lock:
+            if name not in self._loaded:
+                self._loaded[name] = self._load(name)
+            return self._loaded[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.manifest.get("files", {})
+
+    def get(self, name: str, default=None):
+        try:
+            return self[name]
+        except (KeyError, ModelLoadError):
+            return default
+
+    def load_all(self):
+        """Load every model of the active version now (raises on failure)."""
+        for name in self.manifest.get("files", {}):
+            self[name]
+
+    def reload(self, version: Optional[str] = None) -> bool:
+        """
+        Switch to `version` (default: whatever CURRENT names now). The new
+        version is fully loaded before it replaces the active one, so a
+        broken publish leaves the running models untouched. Returns whether
+        the version changed; ValueError for a name that is not a directory
+        under models_dir.
+        """
+        if version and not os.path.isfile(os.path.join(version_dir(self.models_dir, version), "manifest.json")):
+            raise FileNotFoundError(version)
+        staged = ModelRegistry(self.models_dir, version)
+        if staged.version is None:
+            raise ModelLoadError(f"No models found for version {version or self.current_version()}")
+        if staged.version == self.version:
+            return False
+        staged.load_all()
+        with self._lock:
+            self._dir, self.manifest = staged._dir, staged.manifest
+            self._loaded, self.errors = staged._loaded, {}
+        print(f"Model registry: now serving version {self.version}")
+        return True
+
+    def status(self) -> dict:
+        return {
+            "version": self.version,
+            "models_dir": self.models_dir,
+            "created_at": self.manifest.get("created_at"),
+            "data_hash": self.manifest.get("data_hash"),
+            "feature_schema": self.manifest.get("feature_schema", {}),
+            "available": sorted(self.manifest.get("files", {})),
+            "loaded": sorted(self._loaded),
+            "errors": dict(self.errors),
+            "current": self.current_version() or self.version,
+        }
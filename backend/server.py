@@ -0,0 +1,168 @@
+"""
+Multi-worker API server.
+
+    python server.py                    # FINMATE_WORKERS workers (default 1)
+    python server.py --workers 4 --port 8000
+
+With one worker this is plain uvicorn. With more, this process:
+
+1. starts the store writer process (writer.py), through which every
+   worker's writes are applied one at a time,
+2. imports the app and loads and compiles the models (main.preload_models),
+3. forks the workers, which accept on one shared listening socket and
+   inherit the models copy-on-write; gc.freeze() keeps the collector from
+   touching (and so copying) the inherited objects,
+4. restarts a worker or the writer that dies, and stops everything on
+   SIGTERM / SIGINT.
+
+Workers share spend aggregates, forecast results and chat responses
+through a SharedCache file (sharedcache.py) in a per-run directory.
+"""
+import argparse
+import gc
+import os
+import secrets
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from multiprocessing import get_context
+from multiprocessing.connection import Client, wait
+
+WRITER_START_TIMEOUT = 120
+STOP_TIMEOUT = 30
+# A process that dies within this many seconds of starting is restarted after a pause
+MIN_UPTIME = 5.0
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _child(target, *args):
+    # Forked children inherit the supervisor's handlers; uvicorn installs its own
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    target(*args)
+
+
+def _run_worker(app, sock: socket.socket, log_level: str):
+    import uvicorn
+
+    config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _wait_for_writer(process, address: str, authkey: bytes):
+    start = time.monotonic()
+    while time.monotonic() - start < WRITER_START_TIMEOUT:
+        if not process.is_alive():
+            raise RuntimeError(f"Store writer exited with code {process.exitcode}")
+        try:
+            Client(address, family="AF_UNIX", authkey=authkey).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Store writer did not start within {WRITER_START_TIMEOUT}s")
+
+
+def serve(workers: int, host: str, port: int, log_level: str = "info"):
+    if workers <= 1:
+        import uvicorn
+
+        uvicorn.run("main:app", host=host, port=port, log_level=log_level)
+        return
+
+    run_dir = tempfile.mkdtemp(prefix="finmate-")
+    address = os.path.join(run_dir, "writer.sock")
+    authkey = secrets.token_bytes(16)
+    # Read by the backend modules at import, in this process and the children
+    os.environ["FINMATE_WORKERS"] = str(workers)
+    os.environ["FINMATE_WRITER_ADDRESS"] = address
+    os.environ["FINMATE_WRITER_AUTHKEY"] = authkey.hex()
+    os.environ.setdefault("FINMATE_SHARED_CACHE", os.path.join(run_dir, "shared_cache.db"))
+
+    import writer
+
+    ctx = get_context("fork")
+    started = {}
+
+    def start_writer():
+        process = ctx.Process(target=_child, args=(writer.serve, address, authkey), name="finmate-writer")
+        process.start()
+        started[process.name] = time.monotonic()
+        return process
+
+    # Forked before the app and models are loaded: the writer only needs the store
+    processes = {"writer": start_writer()}
+    _wait_for_writer(processes["writer"], address, authkey)
+
+    import main
+
+    start = time.perf_counter()
+    main.preload_models()
+    print(f"Preloaded models in {time.perf_counter() - start:.2f}s; forking {workers} workers")
+    if threading.active_count() > 1:
+        print(f"Warning: {threading.active_count() - 1} threads running before fork")
+    gc.collect()
+    gc.freeze()
+    sock = _bind(host, port)
+
+    def start_worker(index: int):
+        process = ctx.Process(target=_child, args=(_run_worker, main.app, sock, log_level),
+                              name=f"finmate-worker-{index}")
+        process.start()
+        started[process.name] = time.monotonic()
+        return process
+
+    for i in range(workers):
+        processes[f"worker-{i}"] = start_worker(i)
+    print(f"Serving on http://{host}:{port} with {workers} workers (run dir {run_dir})")
+
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        while not stopping.is_set():
+            wait([p.sentinel for p in processes.values()], timeout=1.0)
+            for name, process in list(processes.items()):
+                if process.is_alive() or stopping.is_set():
+                    continue
+                print(f"{process.name} (pid {process.pid}) exited with code {process.exitcode}; restarting")
+                if time.monotonic() - started[process.name] < MIN_UPTIME:
+                    time.sleep(MIN_UPTIME)
+                processes[name] = start_writer() if name == "writer" else start_worker(int(name.split("-")[1]))
+    finally:
+        # Workers first, so in-flight writes still reach the writer
+        worker_processes = [p for name, p in processes.items() if name != "writer"]
+        for group in (worker_processes, [processes["writer"]]):
+            for process in group:
+                if process.is_alive():
+                    process.terminate()
+            for process in group:
+                process.join(STOP_TIMEOUT)
+                if process.is_alive():
+                    process.kill()
+        sock.close()
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the API with one or more worker processes.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("FINMATE_WORKERS", 1)))
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    serve(args.workers, args.host, args.port, args.log_level)
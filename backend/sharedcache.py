@@ -0,0 +1,160 @@
+"""
+Cache shared by the worker processes of a multi-worker server.
+
+A key/value table in a local SQLite file (WAL mode, so readers never block),
+namespaced per use: spend aggregates, forecast results, chat responses,
+upload job and category backfill status, request metrics.
+Values are pickled. An entry can carry a version; put() with a version
+only replaces an entry with an older one, so workers racing to publish
+state for the same store cannot move it backwards.
+
+server.py points FINMATE_SHARED_CACHE at a file in its run directory; with
+the variable unset (single process) get_shared_cache() returns None and
+every cache stays in process memory as before.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+SHARED_CACHE_PATH = os.getenv("FINMATE_SHARED_CACHE")
+SHARED_CACHE_SIZE = int(os.getenv("FINMATE_SHARED_CACHE_SIZE", 10000))
+# Expired and excess entries are pruned once every this many puts
+PRUNE_EVERY = 256
+
+
+def pid_alive(pid: int) -> bool:
+    """Whether process `pid` still exists (entries a dead worker left behind are stale)."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class SharedCache:
+    def __init__(self, path: str, maxsize: int = SHARED_CACHE_SIZE):
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._puts = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (namespace TEXT, key TEXT, version INTEGER, "
+                "expires_at REAL, stored_at REAL, value BLOB, PRIMARY KEY (namespace, key))"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread, opened in the process that uses it
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get_versioned(self, namespace: str, key: str) -> Optional[Tuple[Optional[int], Any]]:
+        """(version, value) of a live entry, or None."""
+        row = self._conn().execute(
+            "SELECT version, expires_at, value FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return row[0], pickle.loads(row[2])
+
+    def get(self, namespace: str, key: str) -> Any:
+        found = self.get_versioned(namespace, key)
+        return None if found is None else found[1]
+
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None,
+            version: Optional[int] = None):
+        now = time.time()
+        row = (namespace, key, version, None if ttl is None else now + ttl, now,
+               pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO cache VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (namespace, key) DO UPDATE SET "
+                "version = excluded.version, expires_at = excluded.expires_at, "
+                "stored_at = excluded.stored_at, value = excluded.value "
+                "WHERE excluded.version IS NULL OR cache.version IS NULL OR excluded.version >= cache.version",
+                row,
+            )
+        self._puts += 1
+        if self._puts % PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        """Drop expired entries, then the oldest ones beyond maxsize."""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+            conn.execute(
+                "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,),
+            )
+
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        """(key, value) of every live entry in `namespace`."""
+        rows = self._conn().execute(
+            "SELECT key, expires_at, value FROM cache WHERE namespace = ?", (namespace,)
+        ).fetchall()
+        now = time.time()
+        return [(key, pickle.loads(value)) for key, expires_at, value in rows
+                if expires_at is None or expires_at >= now]
+
+    def count(self, namespace: Optional[str] = None) -> int:
+        if namespace is None:
+            return self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return self._conn().execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+
+class SharedResponseCache:
+    """
+    chat.ResponseCache interface over one namespace of a SharedCache. Calls
+    block on SQLite, so ChatGateway runs them on the I/O pool (`blocking`);
+    a locked or failing cache file counts as a miss.
+    """
+
+    blocking = True
+
+    def __init__(self, shared: SharedCache, ttl: float = 600.0, namespace: str = "chat"):
+        self.shared = shared
+        self.ttl = ttl
+        self.namespace = namespace
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            return self.shared.get(self.namespace, key)
+        except sqlite3.Error as e:
+            print(f"Shared chat cache read failed: {e}")
+            return None
+
+    def put(self, key: str, value: str):
+        try:
+            self.shared.put(self.namespace, key, value, ttl=self.ttl)
+        except sqlite3.Error as e:
+            print(f"Shared chat cache write failed: {e}")
+
+    def __len__(self):
+        return self.shared.count(self.namespace)
+
+
+_SHARED: Optional[SharedCache] = None
+_SHARED_LOCK = threading.Lock()
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """Process-wide SharedCache when FINMATE_SHARED_CACHE is set, else None."""
+    global _SHARED
+    if SHARED_CACHE_PATH and _SHARED is None:
+        with _SHARED_LOCK:
+            if _SHARED is None:
+                _SHARED = SharedCache(SHARED_CACHE_PATH)
+    return _SHARED
@@ -0,0 +1,1124 @@
+"""
+Transaction storage layer.
+
+The API and the scripts/ pipeline read and write transactions through a
+TransactionStore instead of rewriting cleaned_transactions.csv on every insert.
+Three backends are available, selected with the FINMATE_STORE env var:
+
+- "sqlite"   (default) embedded SQLite database in WAL mode.
+- "segments" append-only log of JSON-lines segment files with a small
+             per-segment index used to skip segments that cannot match.
+- "parquet"  month-partitioned Parquet files with explicit column types
+             (needs pyarrow).
+
+All of them index or partition on Date, so appends cost O(rows added) and
+never rewrite existing data. In-place corrections (update_column) are
+UPDATEs on SQLite; the file backends rewrite only the files they touch.
+
+read() returns the same frame from every backend (dates as YYYY-MM-DD
+text); read_frame() returns the typed columns of FRAME_DTYPES for
+analysis code.
+"""
+import glob
+import io
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from executors import iterate_io, run_io
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    # Windows: fall back to in-process locking only
+    HAS_FCNTL = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_DIR = os.getenv("FINMATE_DATA_DIR", os.path.join(BASE_DIR, "data", "processed"))
+
+# Core schema shared by the API and the preprocessing pipeline.
+# Extra columns (engineered features etc.) are added on demand.
+CORE_COLUMNS = {
+    "Date": "TEXT",
+    "Merchant": "TEXT",
+    "Amount": "REAL",
+    "Category": "TEXT",
+    "Is_Expense": "INTEGER",
+    "Month": "TEXT",
+    "Is_Anomaly": "INTEGER",
+    "Anomaly_Score": "REAL",
+    "Description": "TEXT",
+}
+BOOL_COLUMNS = {"Is_Expense", "Is_Anomaly"}
+INDEXED_COLUMNS = ["Date", "Month", "Category", "Merchant"]
+
+# Column types of read_frame() and of the Parquet files
+FRAME_DTYPES = {
+    "Date": "datetime64[ns]",
+    "Merchant": "category",
+    "Category": "category",
+    "Month": "category",
+    "Amount": "float32",
+    "Is_Expense": "bool",
+    "Is_Anomaly": "bool",
+}
+
+
+def _as_list(value) -> Optional[List]:
+    if value is None:
+        return None
+    if isinstance(value, (str, int, float)):
+        return [value]
+    return list(value)
+
+
+def _normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Make a frame safe to persist: dates as YYYY-MM-DD text, Month as text,
+    NaN/Inf as missing.
+    """
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime("%Y-%m-%d")
+    if "Month" in df.columns:
+        df["Month"] = df["Month"].where(df["Month"].isna(), df["Month"].astype(str))
+    num_cols = df.select_dtypes(include=[np.number]).columns
+    if len(num_cols):
+        df[num_cols] = df[num_cols].replace([np.inf, -np.inf], np.nan)
+    return df
+
+
+def _restore_types(df: pd.DataFrame) -> pd.DataFrame:
+    for col in BOOL_COLUMNS & set(df.columns):
+        df[col] = df[col].map({1: True, 0: False, True: True, False: False, "True": True, "False": False})
+    return df
+
+
+def typed_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert a read() frame to FRAME_DTYPES: datetime Date, categorical
+    strings, float32 Amount and plain bool flags (missing -> False).
+    """
+    df = df.copy()
+    for col, dtype in FRAME_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if col == "Date":
+            df[col] = pd.to_datetime(df[col], errors="coerce").astype(dtype)
+        elif dtype == "category":
+            values = df[col]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                continue
+            df[col] = values.where(values.isna(), values.astype(str)).astype("category")
+        elif dtype == "bool":
+            df[col] = _restore_types(df[[col]].copy())[col].eq(True)
+        else:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+    return df
+
+
+class TransactionStore:
+    """
+    Interface implemented by every storage backend.
+
+    Every write bumps a monotonically increasing version (shared across
+    processes) and notifies subscribers with the rows written, so caches can
+    update incrementally and detect writes made elsewhere.
+    """
+
+    def __init__(self):
+        self._listeners: List[Callable] = []
+
+    def subscribe(self, callback: Callable[[Optional[pd.DataFrame], int], None]):
+        """
+        Register `callback(df, version)`, called after each committed write.
+        `df` holds the appended rows, or None when the dataset was replaced.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, df: Optional[pd.DataFrame], version: int):
+        for callback in self._listeners:
+            try:
+                callback(df, version)
+            except Exception as e:
+                print(f"Store listener failed: {e}")
+
+    @property
+    def location(self) -> str:
+        """Database file or directory; identifies the dataset across processes."""
+        raise NotImplementedError
+
+    def version(self) -> int:
+        """Current data version; changes whenever any process writes."""
+        raise NotImplementedError
+
+    def append(self, df: pd.DataFrame) -> int:
+        """Append rows and return how many were written."""
+        raise NotImplementedError
+
+    def replace(self, df: pd.DataFrame) -> int:
+        """Replace the whole dataset (used by the offline pipeline)."""
+        raise NotImplementedError
+
+    def update_column(self, ids: Iterable[int], column: str, values: Iterable) -> int:
+        """
+        Set `column` to `values` for the rows with the given ids (one write,
+        one version bump). Subscribers get df=None, as after replace().
+        Returns the number of rows updated.
+        """
+        raise NotImplementedError
+
+    def read(
+        self,
+        columns: Optional[Iterable[str]] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        months: Optional[Iterable[str]] = None,
+        categories: Optional[Iterable[str]] = None,
+        merchants: Optional[Iterable[str]] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        is_anomaly: Optional[bool] = None,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> pd.DataFrame:
+        """
+        Return matching rows as a DataFrame indexed by the store row id, in id
+        order. Date bounds are inclusive YYYY-MM-DD strings; `after_id` is a
+        keyset cursor (only rows with a larger id are returned).
+        """
+        raise NotImplementedError
+
+    def read_frame(self, columns: Optional[Iterable[str]] = None, **filters) -> pd.DataFrame:
+        """read() with the typed columns of FRAME_DTYPES (see typed_frame)."""
+        return typed_frame(self.read(columns=columns, **filters))
+
+    def iter_read(self, chunk_size: int = 5000, limit: Optional[int] = None,
+                  offset: int = 0, after_id: Optional[int] = None, **filters) -> Iterator[pd.DataFrame]:
+        """
+        Yield matching rows in id order as DataFrames of at most `chunk_size`
+        rows, so callers never hold the full result in memory.
+        """
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = self.read(after_id=after_id, limit=size, offset=offset, **filters)
+            # Not chunk.empty: a projection onto the id alone has rows but no columns
+            if len(chunk) == 0:
+                return
+            yield chunk
+            after_id = int(chunk.index[-1])
+            offset = 0
+            if remaining is not None:
+                remaining -= len(chunk)
+            if len(chunk) < size:
+                return
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def is_empty(self) -> bool:
+        return self.count() == 0
+
+    def seed(self, df: pd.DataFrame) -> int:
+        """Append `df` only if the store is still empty (safe across processes)."""
+        raise NotImplementedError
+
+    # --- async API: blocking work runs on the shared store I/O pool ---
+
+    async def aappend(self, df: pd.DataFrame) -> int:
+        return await run_io(self.append, df)
+
+    async def aread(self, **kwargs) -> pd.DataFrame:
+        return await run_io(self.read, **kwargs)
+
+    def aiter_read(self, **kwargs) -> AsyncIterator[pd.DataFrame]:
+        return iterate_io(self.iter_read(**kwargs))
+
+    async def aversion(self) -> int:
+        return await run_io(self.version)
+
+
+# --- SQLite backend ---
+
+class SQLiteStore(TransactionStore):
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        with conn:
+            cols = ", ".join(f'"{c}" {t}' for c, t in CORE_COLUMNS.items())
+            conn.execute(f"CREATE TABLE IF NOT EXISTS transactions (id INTEGER PRIMARY KEY AUTOINCREMENT, {cols})")
+            for col in INDEXED_COLUMNS:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS idx_tx_{col.lower()} ON transactions ("{col}")')
+            conn.execute("CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value INTEGER)")
+            conn.execute("INSERT OR IGNORE INTO store_meta (key, value) VALUES ('version', 0)")
+        self._columns = self._load_columns()
+
+    @property
+    def location(self) -> str:
+        return self.path
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; SQLite serializes writers across processes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _load_columns(self) -> List[str]:
+        rows = self._conn().execute("PRAGMA table_info(transactions)").fetchall()
+        return [r[1] for r in rows if r[1] != "id"]
+
+    def _ensure_columns(self, conn: sqlite3.Connection, df: pd.DataFrame):
+        missing = [c for c in df.columns if c not in self._columns]
+        if not missing:
+            return
+        with self._schema_lock:
+            # Another process may have added the column in the meantime
+            self._columns = self._load_columns()
+            for col in missing:
+                if col in self._columns:
+                    continue
+                if pd.api.types.is_bool_dtype(df[col]) or pd.api.types.is_integer_dtype(df[col]):
+                    sql_type = "INTEGER"
+                elif pd.api.types.is_numeric_dtype(df[col]):
+                    sql_type = "REAL"
+                else:
+                    sql_type = "TEXT"
+                conn.execute(f'ALTER TABLE transactions ADD COLUMN "{col}" {sql_type}')
+                self._columns.append(col)
+
+    def _insert(self, conn: sqlite3.Connection, df: pd.DataFrame) -> int:
+        if df.empty:
+            return 0
+        self._ensure_columns(conn, df)
+        cols = list(df.columns)
+        placeholders = ", ".join("?" for _ in cols)
+        col_sql = ", ".join(f'"{c}"' for c in cols)
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        conn.executemany(f"INSERT INTO transactions ({col_sql}) VALUES ({placeholders})", rows)
+        return len(df)
+
+    @staticmethod
+    def _bump_version(conn: sqlite3.Connection) -> int:
+        # Runs inside the write transaction, so versions and writes stay in step
+        conn.execute("UPDATE store_meta SET value = value + 1 WHERE key = 'version'")
+        return conn.execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()[0]
+
+    def version(self) -> int:
+        return self._conn().execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()[0]
+
+    def append(self, df: pd.DataFrame) -> int:
+        df = _normalize_frame(df)
+        if df.empty:
+            return 0
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            written = self._insert(conn, df)
+            version = self._bump_version(conn)
+        self._notify(df, version)
+        return written
+
+    def replace(self, df: pd.DataFrame) -> int:
+        df = _normalize_frame(df)
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM transactions")
+            written = self._insert(conn, df)
+            version = self._bump_version(conn)
+        self._notify(None, version)
+        return written
+
+    def update_column(self, ids, column, values):
+        if column not in self._load_columns():
+            raise KeyError(column)
+        rows = [(None if pd.isna(v) else v, int(i)) for i, v in zip(ids, values)]
+        if not rows:
+            return 0
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.executemany(f'UPDATE transactions SET "{column}" = ? WHERE id = ?', rows)
+            updated = cur.rowcount
+            version = self._bump_version(conn)
+        self._notify(None, version)
+        return updated
+
+    def seed(self, df: pd.DataFrame) -> int:
+        df = _normalize_frame(df)
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]:
+                return 0
+            written = self._insert(conn, df)
+            version = self._bump_version(conn)
+        self._notify(df, version)
+        return written
+
+    def _where(self, start_date=None, end_date=None, months=None, categories=None, merchants=None,
+               min_amount=None, max_amount=None, is_anomaly=None, after_id=None):
+        clauses, params = [], []
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(int(after_id))
+        if start_date:
+            clauses.append('"Date" >= ?')
+            params.append(start_date)
+        if end_date:
+            clauses.append('"Date" <= ?')
+            params.append(end_date)
+        for col, values in (("Month", months), ("Category", categories), ("Merchant", merchants)):
+            values = _as_list(values)
+            if values is not None:
+                clauses.append(f'"{col}" IN ({", ".join("?" for _ in values)})')
+                params.extend(str(v) for v in values)
+        if min_amount is not None:
+            clauses.append('"Amount" >= ?')
+            params.append(float(min_amount))
+        if max_amount is not None:
+            clauses.append('"Amount" <= ?')
+            params.append(float(max_amount))
+        if is_anomaly is not None:
+            clauses.append('"Is_Anomaly" = ?')
+            params.append(1 if is_anomaly else 0)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def read(self, columns=None, limit=None, offset=0, **filters):
+        self._columns = self._load_columns()
+        if columns is None:
+            selected = list(self._columns)
+        else:
+            selected = [c for c in columns if c in self._columns]
+        where, params = self._where(**filters)
+        col_sql = ", ".join(["id"] + [f'"{c}"' for c in selected])
+        sql = f"SELECT {col_sql} FROM transactions{where} ORDER BY id"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params += [-1 if limit is None else int(limit), int(offset)]
+        df = pd.read_sql_query(sql, self._conn(), params=params, index_col="id")
+        return _restore_types(df)
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+
+# --- Shared by the directory-based backends ---
+
+class _DirectoryStore(TransactionStore):
+    """
+    Writers serialize on a LOCK file (flock across processes, a thread lock
+    within one) and publish the data version in a VERSION file. Subclasses
+    implement _refresh_index() to pick up files written by other processes.
+    """
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._lock_path = os.path.join(directory, "LOCK")
+        self._version_path = os.path.join(directory, "VERSION")
+
+    @property
+    def location(self) -> str:
+        return self.directory
+
+    def _refresh_index(self):
+        raise NotImplementedError
+
+    def _locked(self):
+        store = self
+
+        class _Guard:
+            def __enter__(self):
+                store._lock.acquire()
+                self.fh = open(store._lock_path, "a")
+                if HAS_FCNTL:
+                    fcntl.flock(self.fh, fcntl.LOCK_EX)
+                # Pick up files written by other processes
+                store._refresh_index()
+                return self
+
+            def __exit__(self, *exc):
+                if HAS_FCNTL:
+                    fcntl.flock(self.fh, fcntl.LOCK_UN)
+                self.fh.close()
+                store._lock.release()
+
+        return _Guard()
+
+    def version(self) -> int:
+        try:
+            with open(self._version_path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _bump_version(self) -> int:
+        # Caller holds the write lock
+        version = self.version() + 1
+        tmp = self._version_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(version))
+        os.replace(tmp, self._version_path)
+        return version
+
+
+# --- Append-only segment log backend ---
+
+class SegmentLogStore(_DirectoryStore):
+    """
+    Rows are appended to JSON-lines segment files which are rolled over once
+    they reach `segment_rows`. Each segment has a sidecar index with its row id
+    range, date range and the distinct months/categories/merchants it holds.
+    """
+
+    def __init__(self, directory: str, segment_rows: int = 50000):
+        super().__init__(directory)
+        self.segment_rows = segment_rows
+        self._index: Dict[str, dict] = {}
+        self._refresh_index()
+
+    def _segment_paths(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, "seg-*.jsonl")))
+
+    def _index_path(self, seg_path: str) -> str:
+        return seg_path[: -len(".jsonl")] + ".idx.json"
+
+    def _refresh_index(self):
+        index = {}
+        for seg in self._segment_paths():
+            cached = self._index.get(seg)
+            idx_path = self._index_path(seg)
+            if cached is not None and cached.get("_mtime") == os.path.getmtime(idx_path):
+                index[seg] = cached
+                continue
+            with open(idx_path) as f:
+                meta = json.load(f)
+            meta["_mtime"] = os.path.getmtime(idx_path)
+            index[seg] = meta
+        self._index = index
+
+    def _next_id(self) -> int:
+        if not self._index:
+            return 1
+        return max(m["start_id"] + m["rows"] for m in self._index.values())
+
+    def _write_rows(self, df: pd.DataFrame):
+        next_id = self._next_id()
+        segments = self._segment_paths()
+        offset = 0
+        while offset < len(df):
+            if segments and self._index[segments[-1]]["rows"] < self.segment_rows:
+                seg = segments[-1]
+                meta = self._index[seg]
+            else:
+                seg = os.path.join(self.directory, f"seg-{len(segments) + 1:06d}.jsonl")
+                meta = {"start_id": next_id, "rows": 0, "min_date": None, "max_date": None,
+                        "months": [], "categories": [], "merchants": []}
+                segments.append(seg)
+            room = self.segment_rows - meta["rows"]
+            chunk = df.iloc[offset: offset + room]
+            with open(seg, "a", encoding="utf-8") as f:
+                payload = chunk.to_json(orient="records", lines=True, force_ascii=False)
+                # Older pandas omits the trailing newline
+                f.write(payload if payload.endswith("\n") else payload + "\n")
+            self._update_meta(meta, chunk)
+            with open(self._index_path(seg), "w") as f:
+                json.dump({k: v for k, v in meta.items() if not k.startswith("_")}, f)
+            meta["_mtime"] = os.path.getmtime(self._index_path(seg))
+            self._index[seg] = meta
+            offset += len(chunk)
+            next_id += len(chunk)
+
+    @staticmethod
+    def _update_meta(meta: dict, chunk: pd.DataFrame):
+        meta["rows"] += len(chunk)
+        if "Date" in chunk.columns:
+            dates = chunk["Date"].dropna().astype(str)
+            if not dates.empty:
+                lo, hi = dates.min(), dates.max()
+                meta["min_date"] = lo if meta["min_date"] is None else min(meta["min_date"], lo)
+                meta["max_date"] = hi if meta["max_date"] is None else max(meta["max_date"], hi)
+        for col, key in (("Month", "months"), ("Category", "categories"), ("Merchant", "merchants")):
+            if col in chunk.columns:
+                values = set(meta[key]) | set(chunk[col].dropna().astype(str).unique())
+                meta[key] = sorted(values)
+
+    def append(self, df: pd.DataFrame) -> int:
+        df = _normalize_frame(df)
+        if df.empty:
+            return 0
+        with self._locked():
+            self._write_rows(df)
+            version = self._bump_version()
+        self._notify(df, version)
+        return len(df)
+
+    def replace(self, df: pd.DataFrame) -> int:
+        df = _normalize_frame(df)
+        with self._locked():
+            for seg in self._segment_paths():
+                os.remove(self._index_path(seg))
+                os.remove(seg)
+            self._index = {}
+            if not df.empty:
+                self._write_rows(df)
+            version = self._bump_version()
+        self._notify(None, version)
+        return len(df)
+
+    def _load_segment(self, seg: str, meta: dict) -> pd.DataFrame:
+        with open(seg, encoding="utf-8") as f:
+            lines = f.readlines()[: meta["rows"]]
+        if not lines:
+            return pd.DataFrame()
+        df = pd.read_json(io.StringIO("".join(lines)), orient="records", lines=True,
+                          dtype=False, convert_dates=False)
+        df.index = pd.RangeIndex(meta["start_id"], meta["start_id"] + len(df), name="id")
+        return df
+
+    def update_column(self, ids, column, values):
+        # Segments are never edited in place: each touched segment is
+        # rewritten to a temp file and swapped in with os.replace, so readers
+        # see either the old or the new segment, never a partial one.
+        updates = pd.Series(list(values), index=pd.Index([int(i) for i in ids]), dtype=object)
+        if updates.empty:
+            return 0
+        updated = 0
+        with self._locked():
+            for seg, meta in list(self._index.items()):
+                lo, hi = meta["start_id"], meta["start_id"] + meta["rows"]
+                part = updates[(updates.index >= lo) & (updates.index < hi)]
+                if part.empty:
+                    continue
+                df = self._load_segment(seg, meta)
+                if column not in df.columns:
+                    df[column] = None
+                df[column] = df[column].astype(object)
+                df.loc[part.index, column] = part.values
+                tmp = seg + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    payload = df.to_json(orient="records", lines=True, force_ascii=False)
+                    f.write(payload if payload.endswith("\n") else payload + "\n")
+                fresh = {"start_id": lo, "rows": 0, "min_date": None, "max_date": None,
+                         "months": [], "categories": [], "merchants": []}
+                self._update_meta(fresh, df)
+                os.replace(tmp, seg)
+                with open(self._index_path(seg), "w") as f:
+                    json.dump(fresh, f)
+                fresh["_mtime"] = os.path.getmtime(self._index_path(seg))
+                self._index[seg] = fresh
+                updated += len(part)
+            version = self._bump_version()
+        self._notify(None, version)
+        return updated
+
+    def seed(self, df: pd.DataFrame) -> int:
+        df = _normalize_frame(df)
+        with self._locked():
+            if self._index or df.empty:
+                return 0
+            self._write_rows(df)
+            version = self._bump_version()
+        self._notify(df, version)
+        return len(df)
+
+    @staticmethod
+    def _segment_matches(meta, start_date, end_date, months, categories, merchants, after_id) -> bool:
+        if after_id is not None and meta["start_id"] + meta["rows"] - 1 <= after_id:
+            return False
+        if start_date and meta["max_date"] is not None and meta["max_date"] < start_date:
+            return False
+        if end_date and meta["min_date"] is not None and meta["min_date"] > end_date:
+            return False
+        for values, key in ((months, "months"), (categories, "categories"), (merchants, "merchants")):
+            if values is not None and not set(meta[key]) & values:
+                return False
+        return True
+
+    def _iter_segments(self, columns=None, start_date=None, end_date=None, months=None, categories=None,
+                       merchants=None, min_amount=None, max_amount=None, is_anomaly=None, after_id=None):
+        """Yield the filtered rows of each segment that can match, in id order."""
+        with self._lock:
+            self._refresh_index()
+            index = dict(self._index)
+        sets = {}
+        for col, values in (("Month", months), ("Category", categories), ("Merchant", merchants)):
+            values = _as_list(values)
+            sets[col] = None if values is None else {str(v) for v in values}
+
+        for seg, meta in index.items():
+            if not self._segment_matches(meta, start_date, end_date, sets["Month"], sets["Category"],
+                                         sets["Merchant"], after_id):
+                continue
+            df = self._load_segment(seg, meta)
+            if df.empty:
+                continue
+
+            mask = np.ones(len(df), dtype=bool)
+            if after_id is not None:
+                mask &= df.index.values > after_id
+            if start_date and "Date" in df.columns:
+                mask &= (df["Date"].astype(str) >= start_date).values
+            if end_date and "Date" in df.columns:
+                mask &= (df["Date"].astype(str) <= end_date).values
+            for col, values in sets.items():
+                if values is not None:
+                    mask &= df[col].astype(str).isin(values).values if col in df.columns else False
+            if (min_amount is not None or max_amount is not None) and "Amount" in df.columns:
+                amount = pd.to_numeric(df["Amount"], errors="coerce")
+                if min_amount is not None:
+                    mask &= (amount >= min_amount).values
+                if max_amount is not None:
+                    mask &= (amount <= max_amount).values
+            if is_anomaly is not None:
+                flags = _restore_types(df[["Is_Anomaly"]].copy())["Is_Anomaly"] if "Is_Anomaly" in df.columns else None
+                mask &= (flags == bool(is_anomaly)).values if flags is not None else False
+            df = df[mask]
+            if df.empty:
+                continue
+            if columns is not None:
+                df = df[[c for c in columns if c in df.columns]]
+            yield _restore_types(df)
+
+    def read(self, columns=None, limit=None, offset=0, **filters):
+        frames = []
+        wanted = None if limit is None else offset + limit
+        seen = 0
+        for part in self._iter_segments(columns=columns, **filters):
+            frames.append(part)
+            seen += len(part)
+            if wanted is not None and seen >= wanted:
+                break
+        if not frames:
+            return pd.DataFrame(columns=list(columns or CORE_COLUMNS.keys())).rename_axis("id")
+        df = pd.concat(frames)
+        if offset or limit is not None:
+            df = df.iloc[offset: wanted]
+        return df
+
+    def iter_read(self, chunk_size=5000, limit=None, offset=0, after_id=None, **filters):
+        remaining = limit
+        for part in self._iter_segments(after_id=after_id, **filters):
+            if offset:
+                skip = min(offset, len(part))
+                part = part.iloc[skip:]
+                offset -= skip
+            for start in range(0, len(part), chunk_size):
+                chunk = part.iloc[start: start + chunk_size]
+                if remaining is not None:
+                    chunk = chunk.iloc[:remaining]
+                    remaining -= len(chunk)
+                if len(chunk):
+                    yield chunk
+                if remaining is not None and remaining <= 0:
+                    return
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh_index()
+            return sum(m["rows"] for m in self._index.values())
+
+
+# --- Month-partitioned Parquet backend ---
+
+def _parquet_types() -> Dict[str, "pa.DataType"]:
+    strings = pa.dictionary(pa.int32(), pa.string())
+    return {
+        "Date": pa.timestamp("ms"),
+        "Merchant": strings,
+        "Category": strings,
+        "Month": strings,
+        "Amount": pa.float32(),
+        "Is_Expense": pa.bool_(),
+        "Is_Anomaly": pa.bool_(),
+        "Anomaly_Score": pa.float64(),
+        "Description": pa.string(),
+    }
+
+
+def _month_keys(df: pd.DataFrame) -> np.ndarray:
+    """Partition key (YYYY-MM) of each row; rows without a date go to "unknown"."""
+    if "Date" not in df.columns:
+        return np.full(len(df), "unknown", dtype=object)
+    dates = pd.to_datetime(df["Date"], errors="coerce")
+    return dates.dt.strftime("%Y-%m").fillna("unknown").to_numpy(dtype=object)
+
+
+def _to_arrow(df: pd.DataFrame) -> "pa.Table":
+    """Normalized frame indexed by row id -> table with explicit column types."""
+    types = _parquet_types()
+    arrays = [pa.array(df.index.to_numpy(dtype=np.int64))]
+    names = ["id"]
+    for col in df.columns:
+        values = df[col]
+        dtype = types.get(col)
+        if col == "Date":
+            dates = pd.to_datetime(values, errors="coerce").astype("datetime64[ms]")
+            array = pa.array(dates, type=dtype, from_pandas=True)
+        elif dtype is not None and pa.types.is_dictionary(dtype):
+            text = values.where(values.isna(), values.astype(str))
+            array = pa.array(text, type=pa.string(), from_pandas=True).dictionary_encode()
+        elif col in BOOL_COLUMNS:
+            array = pa.array(_restore_types(df[[col]].copy())[col], type=dtype, from_pandas=True)
+        elif dtype == pa.string():
+            array = pa.array(values.where(values.isna(), values.astype(str)), type=dtype, from_pandas=True)
+        elif dtype is not None:
+            array = pa.array(pd.to_numeric(values, errors="coerce"), type=dtype, from_pandas=True)
+        else:
+            # Engineered feature columns keep their inferred type
+            array = pa.array(values, from_pandas=True)
+        arrays.append(array)
+        names.append(col)
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def _to_text(df: pd.DataFrame) -> pd.DataFrame:
+    """Typed Parquet columns -> the read() conventions shared by all backends."""
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            df[col] = values.dt.strftime("%Y-%m-%d").astype(object).where(values.notna(), None)
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            df[col] = values.astype(object).where(values.notna(), None)
+        elif values.dtype == np.float32:
+            # float32 keeps about 7 significant digits; amounts are in cents
+            df[col] = values.astype(np.float64).round(2)
+    return df
+
+
+class ParquetStore(_DirectoryStore):
+    """
+    Month-partitioned Parquet dataset:
+
+        parquet/month=YYYY-MM/part-<first id>-<last id>.parquet
+
+    Each write adds one file per month it touches, with the row id as a
+    column. Once a month holds `compact_files` files smaller than a row
+    group (e.g. from single-row POST /transactions), the write merges them
+    into one, so the file count stays bounded. Columns are stored typed
+    (categorical strings, timestamp Date, float32 Amount, bool flags), so
+    reads never re-parse text. read() prunes partitions by date and files
+    by id range, then hands the other filters and the column projection to
+    the Parquet reader, which skips row groups using their min/max
+    statistics.
+    """
+
+    def __init__(self, directory: str, row_group_rows: int = 65536, compact_files: int = 8):
+        if not HAS_PYARROW:
+            raise RuntimeError("The parquet store needs pyarrow (pip install pyarrow)")
+        super().__init__(directory)
+        self.row_group_rows = row_group_rows
+        self.compact_files = compact_files
+        self._files: Dict[str, dict] = {}
+        self._refresh_index()
+
+    def _file_paths(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, "month=*", "part-*.parquet")))
+
+    def _refresh_index(self):
+        files = {}
+        for path in self._file_paths():
+            try:
+                mtime = os.path.getmtime(path)
+                cached = self._files.get(path)
+                if cached is not None and cached["_mtime"] == mtime:
+                    files[path] = cached
+                    continue
+                meta = pq.read_metadata(path)
+            except FileNotFoundError:
+                # Removed by a concurrent replace()
+                continue
+            first, last = os.path.basename(path)[len("part-"): -len(".parquet")].split("-")
+            files[path] = {
+                "month": os.path.basename(os.path.dirname(path))[len("month="):],
+                "first_id": int(first),
+                "last_id": int(last),
+                "rows": meta.num_rows,
+                "columns": set(meta.schema.names),
+                "_mtime": mtime,
+            }
+        self._files = files
+
+    def _next_id(self) -> int:
+        if not self._files:
+            return 1
+        return max(m["last_id"] for m in self._files.values()) + 1
+
+    def _write_partitions(self, df: pd.DataFrame) -> List[str]:
+        """Write rows (indexed by id) as one file per month. Returns the paths."""
+        paths = []
+        for month, part in df.groupby(_month_keys(df), sort=True):
+            directory = os.path.join(self.directory, f"month={month}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{part.index.min():012d}-{part.index.max():012d}.parquet")
+            tmp = path + ".tmp"
+            pq.write_table(_to_arrow(part), tmp, row_group_size=self.row_group_rows)
+            os.replace(tmp, path)
+            paths.append(path)
+        return paths
+
+    def _write_rows(self, df: pd.DataFrame):
+        first_id = self._next_id()
+        df = df.set_axis(pd.RangeIndex(first_id, first_id + len(df), name="id"))
+        paths = self._write_partitions(df)
+        self._refresh_index()
+        for month in sorted({self._files[path]["month"] for path in paths}):
+            self._compact(month)
+
+    def _compact(self, month: str):
+        """Merge the month's small files into one once there are compact_files of them."""
+        small = sorted((meta["first_id"], path) for path, meta in self._files.items()
+                       if meta["month"] == month and meta["rows"] < self.row_group_rows)
+        if len(small) < self.compact_files:
+            return
+        frames = [_to_text(pq.read_table(path, partitioning=None).to_pandas().set_index("id"))
+                  for _, path in small]
+        df = pd.concat(frames).sort_index()
+        # Leftovers of an interrupted compaction hold rows twice
+        df = df[~df.index.duplicated()]
+        written = self._write_partitions(df)
+        # The merged file is in place before the parts go; until then
+        # readers drop the duplicate ids (see _scan)
+        for _, path in small:
+            if path not in written:
+                os.remove(path)
+        self._refresh_index()
+
+    def append(self, df: pd.DataFrame) -> int:
+        df = _normalize_frame(df)
+        if df.empty:
+            return 0
+        with self._locked():
+            self._write_rows(df)
+            version = self._bump_version()
+        self._notify(df, version)
+        return len(df)
+
+    def replace(self, df: pd.DataFrame) -> int:
+        df = _normalize_frame(df)
+        with self._locked():
+            for directory in glob.glob(os.path.join(self.directory, "month=*")):
+                shutil.rmtree(directory)
+            self._files = {}
+            if not df.empty:
+                self._write_rows(df)
+            version = self._bump_version()
+        self._notify(None, version)
+        return len(df)
+
+    def seed(self, df: pd.DataFrame) -> int:
+        df = _normalize_frame(df)
+        with self._locked():
+            if self._files or df.empty:
+                return 0
+            self._write_rows(df)
+            version = self._bump_version()
+        self._notify(df, version)
+        return len(df)
+
+    def update_column(self, ids, column, values):
+        # Like the segment log: touched files are rewritten and swapped in
+        updates = pd.Series(list(values), index=pd.Index([int(i) for i in ids]), dtype=object)
+        if updates.empty:
+            return 0
+        updated = 0
+        with self._locked():
+            for path, meta in list(self._files.items()):
+                part = updates[(updates.index >= meta["first_id"]) & (updates.index <= meta["last_id"])]
+                if part.empty:
+                    continue
+                df = _to_text(pq.read_table(path, partitioning=None).to_pandas().set_index("id"))
+                hit = part.index.intersection(df.index)
+                if hit.empty:
+                    continue
+                if column not in df.columns:
+                    df[column] = None
+                df[column] = df[column].astype(object)
+                df.loc[hit, column] = part[hit].values
+                # A changed Date can move rows to another month
+                if path not in self._write_partitions(df):
+                    os.remove(path)
+                updated += len(hit)
+            self._refresh_index()
+            version = self._bump_version()
+        self._notify(None, version)
+        return updated
+
+    @staticmethod
+    def _filter(start_date=None, end_date=None, months=None, categories=None, merchants=None,
+                min_amount=None, max_amount=None, is_anomaly=None, after_id=None):
+        """(pyarrow filter expression or None, columns it needs)."""
+        clauses, needed = [], set()
+        if after_id is not None:
+            clauses.append(pads.field("id") > int(after_id))
+        if start_date:
+            clauses.append(pads.field("Date") >= pa.scalar(pd.Timestamp(start_date), pa.timestamp("ms")))
+            needed.add("Date")
+        if end_date:
+            clauses.append(pads.field("Date") <= pa.scalar(pd.Timestamp(end_date), pa.timestamp("ms")))
+            needed.add("Date")
+        for col, values in (("Month", months), ("Category", categories), ("Merchant", merchants)):
+            values = _as_list(values)
+            if values is not None:
+                clauses.append(pads.field(col).isin([str(v) for v in values]))
+                needed.add(col)
+        # Compare at the stored precision so bounds equal to a value match it
+        if min_amount is not None:
+            clauses.append(pads.field("Amount") >= pa.scalar(float(min_amount), pa.float32()))
+            needed.add("Amount")
+        if max_amount is not None:
+            clauses.append(pads.field("Amount") <= pa.scalar(float(max_amount), pa.float32()))
+            needed.add("Amount")
+        if is_anomaly is not None:
+            clauses.append(pads.field("Is_Anomaly") == bool(is_anomaly))
+            needed.add("Is_Anomaly")
+        expr = None
+        for clause in clauses:
+            expr = clause if expr is None else expr & clause
+        return expr, needed
+
+    @staticmethod
+    def _file_matches(meta, start_date, end_date, after_id) -> bool:
+        if after_id is not None and meta["last_id"] <= after_id:
+            return False
+        if start_date or end_date:
+            month = meta["month"]
+            if month == "unknown":
+                return False
+            if start_date and month < str(start_date)[:7]:
+                return False
+            if end_date and month > str(end_date)[:7]:
+                return False
+        return True
+
+    def _scan(self, columns=None, limit=None, offset=0, **filters) -> Optional[pd.DataFrame]:
+        """Matching rows with their stored types, in id order (None if none)."""
+        with self._lock:
+            self._refresh_index()
+            files = dict(self._files)
+        expr, needed = self._filter(**filters)
+        candidates = sorted(
+            (meta["first_id"], path, meta) for path, meta in files.items()
+            if needed <= meta["columns"] and self._file_matches(
+                meta, filters.get("start_date"), filters.get("end_date"), filters.get("after_id"))
+        )
+        wanted = None if limit is None else offset + limit
+        frames, ids, seen = [], [], 0
+        for first_id, path, meta in candidates:
+            # Files of one append interleave ids across months; stop once no
+            # remaining file can hold one of the first `wanted` ids
+            if wanted is not None and seen >= wanted:
+                kth = np.partition(np.concatenate(ids), wanted - 1)[wanted - 1]
+                if first_id > kth:
+                    break
+            projection = None
+            if columns is not None:
+                projection = ["id"] + [c for c in columns if c != "id" and c in meta["columns"]]
+            try:
+                table = pq.read_table(path, columns=projection, filters=expr, partitioning=None)
+            except FileNotFoundError:
+                continue
+            if table.num_rows == 0:
+                continue
+            frames.append(table.to_pandas())
+            ids.append(frames[-1]["id"].to_numpy())
+            seen += table.num_rows
+        if not frames:
+            return None
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        df = df.sort_values("id", kind="mergesort").set_index("id")
+        if len(frames) > 1:
+            # A compaction in progress has its rows both in the parts and the merged file
+            df = df[~df.index.duplicated()]
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        if offset or limit is not None:
+            df = df.iloc[offset: wanted]
+        return df
+
+    def read(self, columns=None, limit=None, offset=0, **filters):
+        df = self._scan(columns=columns, limit=limit, offset=offset, **filters)
+        if df is None:
+            return pd.DataFrame(columns=list(columns or CORE_COLUMNS.keys())).rename_axis("id")
+        return _to_text(df)
+
+    def read_frame(self, columns=None, **filters):
+        # Straight from the typed columns, no round trip through text
+        df = self._scan(columns=columns, **filters)
+        if df is None:
+            df = pd.DataFrame(columns=list(columns or CORE_COLUMNS.keys())).rename_axis("id")
+        return typed_frame(df)
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh_index()
+            return sum(m["rows"] for m in self._files.values())
+
+
+# --- Factory ---
+
+_STORE: Optional[TransactionStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def open_store(backend: Optional[str] = None, data_dir: Optional[str] = None) -> TransactionStore:
+    """
+    Open a store for the given backend. On first use the store is seeded from
+    the legacy cleaned_transactions.csv if that file exists.
+    """
+    backend = (backend or os.getenv("FINMATE_STORE", "sqlite")).lower()
+    data_dir = data_dir or DATA_DIR
+    if backend == "sqlite":
+        store = SQLiteStore(os.path.join(data_dir, "transactions.db"))
+    elif backend in ("segments", "segment", "log"):
+        store = SegmentLogStore(os.path.join(data_dir, "segments"))
+    elif backend == "parquet":
+        store = ParquetStore(os.path.join(data_dir, "parquet"))
+    else:
+        raise ValueError(f"Unknown transaction store backend: {backend}")
+
+    legacy_csv = os.path.join(data_dir, "cleaned_transactions.csv")
+    if store.is_empty() and os.path.exists(legacy_csv):
+        seeded = store.seed(pd.read_csv(legacy_csv))
+        if seeded:
+            print(f"Seeded {backend} store with {seeded} rows from {legacy_csv}")
+    return store
+
+
+def get_store() -> TransactionStore:
+    """Process-wide store, opened on first use."""
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = open_store()
+    return _STORE
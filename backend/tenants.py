@@ -0,0 +1,145 @@
+"""
+Per-user transaction partitions.
+
+Each user_id gets its own store (same FINMATE_STORE backend) under
+DATA_DIR/users/<user_id>/, with its own indexes, spend aggregates and
+category backfill checkpoint, so one user's reads, summaries and forecasts
+only touch that user's rows and cost scales with their history. Requests
+without a user_id use the shared default store (get_store()), as before.
+
+Open tenants are kept in an LRU; an evicted tenant is reopened from disk on
+its next request and its aggregates are rebuilt from its own store.
+
+Under the multi-worker server each tenant's writes go through the writer
+process (writer.RemoteWriteStore) and its aggregates are shared between
+workers (sharedcache).
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import pandas as pd
+
+from aggregates import SpendAggregates
+from categorize import CategoryBackfill
+from sharedcache import get_shared_cache
+from store import DATA_DIR, TransactionStore, get_store, open_store
+from writer import RemoteWriteStore, writer_client
+
+USER_COLUMN = "User_Id"
+USERS_DIR = os.path.join(DATA_DIR, "users")
+MAX_OPEN_TENANTS = int(os.getenv("FINMATE_MAX_OPEN_TENANTS", 1024))
+
+_USER_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+def validate_user_id(user_id) -> str:
+    """The user id as a string safe to use as a directory name (ValueError if not)."""
+    user_id = str(user_id).strip()
+    if not _USER_ID.match(user_id):
+        raise ValueError(f"Invalid user_id {user_id!r}: use 1-64 letters, digits, '_', '-' or '.'")
+    return user_id
+
+
+class Tenant:
+    def __init__(self, user_id: Optional[str], store: TransactionStore, directory: str):
+        client = writer_client()
+        if client is not None:
+            store = RemoteWriteStore(store, client, user_id)
+        self.user_id = user_id
+        self.store = store
+        self.aggregates = SpendAggregates()
+        self.aggregates.attach(store, shared=get_shared_cache())
+        self.backfill = CategoryBackfill(os.path.join(directory, "category_backfill.json"),
+                                         shared=get_shared_cache())
+
+    @property
+    def busy(self) -> bool:
+        return self.backfill.running
+
+
+class TenantRegistry:
+    """
+    get(user_id) -> Tenant. user_id None is the default tenant, which is
+    never evicted; other tenants are opened on demand and at most
+    `max_open` of them stay open.
+    """
+
+    def __init__(self, users_dir: str = USERS_DIR, backend: Optional[str] = None,
+                 max_open: int = MAX_OPEN_TENANTS):
+        self.users_dir = users_dir
+        self.backend = backend
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        self._default: Optional[Tenant] = None
+        self._open: "OrderedDict[str, Tenant]" = OrderedDict()
+        self.opened = 0
+        self.evicted = 0
+
+    def default(self) -> Tenant:
+        with self._lock:
+            if self._default is None:
+                self._default = Tenant(None, get_store(), DATA_DIR)
+            return self._default
+
+    def get(self, user_id: Optional[str] = None) -> Tenant:
+        if user_id is None:
+            return self.default()
+        user_id = validate_user_id(user_id)
+        with self._lock:
+            tenant = self._open.get(user_id)
+            if tenant is not None:
+                self._open.move_to_end(user_id)
+                return tenant
+            directory = os.path.join(self.users_dir, user_id)
+            tenant = Tenant(user_id, open_store(self.backend, directory), directory)
+            self._open[user_id] = tenant
+            self.opened += 1
+            # Evict the least recently used, but never mid-backfill
+            for candidate in list(self._open)[: max(len(self._open) - self.max_open, 0)]:
+                if not self._open[candidate].busy:
+                    del self._open[candidate]
+                    self.evicted += 1
+            return tenant
+
+    def writer(self, user_id: Optional[str] = None) -> "TenantWriter":
+        return TenantWriter(self, user_id)
+
+    def users(self) -> list:
+        """Users with a partition on disk."""
+        if not os.path.isdir(self.users_dir):
+            return []
+        return sorted(d for d in os.listdir(self.users_dir) if _USER_ID.match(d))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"open": len(self._open), "max_open": self.max_open,
+                    "opened": self.opened, "evicted": self.evicted}
+
+
+class TenantWriter:
+    """
+    Store-like append target for ingestion: rows go to `user_id`'s store,
+    or, without one, are routed by the User_Id column (rows without a user
+    go to the default store). The User_Id column itself is not stored.
+    """
+
+    def __init__(self, registry: TenantRegistry, user_id: Optional[str] = None):
+        self.registry = registry
+        self.user_id = None if user_id is None else validate_user_id(user_id)
+
+    def append(self, df: pd.DataFrame) -> int:
+        if self.user_id is not None or USER_COLUMN not in df.columns:
+            return self.registry.get(self.user_id).store.append(df.drop(columns=[USER_COLUMN], errors="ignore"))
+        users = df[USER_COLUMN].astype(str).str.strip().where(df[USER_COLUMN].notna(), "")
+        # Check every id before writing anything from this chunk
+        for user_id in users.unique():
+            if user_id:
+                validate_user_id(user_id)
+        rows = df.drop(columns=[USER_COLUMN])
+        written = 0
+        for user_id, part in rows.groupby(users.to_numpy(), sort=False):
+            written += self.registry.get(user_id or None).store.append(part)
+        return written
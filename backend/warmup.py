@@ -0,0 +1,66 @@
+"""
+Background warm-up after startup.
+
+The server accepts traffic as soon as startup returns; slow initialization
+(loading and compiling models, opening the default store and building its
+aggregates, Gemini model discovery) runs as warm-up steps in the
+background, concurrently, on the executor pools. Every one of these
+resources also initializes lazily on first use, so requests that arrive
+during warm-up are served, only slower. GET /ready answers 503 until all
+steps have finished; GET / stays a plain liveness check.
+"""
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from executors import run_io
+
+
+class Warmup:
+    def __init__(self):
+        self._steps: List[Tuple[str, Callable, Callable]] = []
+        self.steps: Dict[str, dict] = {}
+        self.started_at: Optional[float] = None
+        self.seconds: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, name: str, fn: Callable, run=run_io):
+        """Add a step: `fn()` is called through `run` (run_io or run_model)."""
+        self._steps.append((name, fn, run))
+        self.steps[name] = {"status": "pending"}
+
+    async def _step(self, name: str, fn: Callable, run):
+        self.steps[name] = {"status": "running"}
+        start = time.perf_counter()
+        try:
+            await run(fn)
+            self.steps[name] = {"status": "done", "seconds": round(time.perf_counter() - start, 3)}
+        except Exception as e:
+            # The resource stays lazy: the first request that needs it retries
+            print(f"Warm-up step {name} failed: {e}")
+            self.steps[name] = {"status": "failed", "seconds": round(time.perf_counter() - start, 3),
+                                "error": str(e)}
+
+    async def _run(self):
+        start = time.perf_counter()
+        await asyncio.gather(*(self._step(name, fn, run) for name, fn, run in self._steps))
+        self.seconds = round(time.perf_counter() - start, 3)
+        print(f"Warm-up finished in {self.seconds:.2f}s: "
+              + ", ".join(f"{name} {s['status']} ({s['seconds']}s)" for name, s in self.steps.items()))
+
+    def start(self):
+        """Schedule the steps on the running event loop and return at once."""
+        self.started_at = time.time()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    @property
+    def ready(self) -> bool:
+        return self._task is not None and self._task.done()
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "started_at": self.started_at,
+            "seconds": self.seconds,
+            "steps": dict(self.steps),
+        }
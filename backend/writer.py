@@ -0,0 +1,202 @@
+"""
+Single writer process for the multi-worker server.
+
+With several API workers, every store write (uploads, POST /transactions,
+category backfill updates) is sent to one writer process over a Unix
+socket and applied there one at a time, so writers never contend for the
+SQLite write lock or the directory stores' LOCK file, and workers spend
+their cores on reads, scoring and serialization.
+
+server.py starts serve() in its own process and sets FINMATE_WRITER_ADDRESS
+/ FINMATE_WRITER_AUTHKEY for the workers. There, tenants.py wraps each
+store in a RemoteWriteStore: reads go straight to the local store, writes
+go through writer_client(). Without those variables writer_client() is None
+and stores are written directly, as before.
+"""
+import os
+import threading
+from collections import OrderedDict
+from multiprocessing.connection import Client, Listener
+from typing import Optional
+
+import pandas as pd
+
+from store import TransactionStore, _normalize_frame, open_store
+
+WRITER_ADDRESS = os.getenv("FINMATE_WRITER_ADDRESS")
+WRITER_AUTHKEY = os.getenv("FINMATE_WRITER_AUTHKEY")
+# Store methods a worker may call in the writer
+WRITE_OPS = ("append", "update_column")
+
+
+class WriterError(RuntimeError):
+    """The writer process could not be reached."""
+
+
+def serve(address: str, authkey: bytes, backend: Optional[str] = None, max_open: Optional[int] = None):
+    """
+    Writer process main loop: accept worker connections and apply their
+    writes, one at a time across all connections.
+    """
+    from tenants import MAX_OPEN_TENANTS, USERS_DIR, validate_user_id
+
+    max_open = max_open or MAX_OPEN_TENANTS
+    stores: "OrderedDict[Optional[str], TransactionStore]" = OrderedDict()
+    versions = {}
+    lock = threading.Lock()
+
+    def get(user_id):
+        store = stores.get(user_id)
+        if store is None:
+            directory = None if user_id is None else os.path.join(USERS_DIR, validate_user_id(user_id))
+            store = stores[user_id] = open_store(backend, directory)
+            store.subscribe(lambda df, version, key=user_id: versions.__setitem__(key, version))
+            # The default store stays open; others are reopened on demand
+            for candidate in [k for k in stores if k is not None][: max(len(stores) - 1 - max_open, 0)]:
+                del stores[candidate]
+        stores.move_to_end(user_id)
+        return store
+
+    def handle(conn):
+        with conn:
+            while True:
+                try:
+                    op, user_id, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if op not in WRITE_OPS:
+                        raise ValueError(f"Unknown write operation: {op}")
+                    with lock:
+                        store = get(user_id)
+                        versions.pop(user_id, None)
+                        result = getattr(store, op)(*args)
+                        # Version of this write, as notified by the store
+                        reply = ("ok", result, versions.get(user_id))
+                except Exception as e:
+                    reply = ("error", e, None)
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+                except Exception as e:
+                    # The result or exception could not be pickled; the worker
+                    # is waiting in recv(), so it must still get an answer
+                    print(f"Store writer: cannot send {op} reply: {e!r}")
+                    try:
+                        conn.send(("error", RuntimeError(repr(reply[1])), None))
+                    except (EOFError, OSError):
+                        return
+
+    # Open (and seed) the shared store before accepting writes
+    get(None)
+    if os.path.exists(address):
+        os.remove(address)
+    listener = Listener(address, family="AF_UNIX", authkey=authkey)
+    print(f"Store writer listening on {address} (pid {os.getpid()})")
+    while True:
+        conn = listener.accept()
+        threading.Thread(target=handle, args=(conn,), name="writer-conn", daemon=True).start()
+
+
+class WriterClient:
+    """Connection to the writer process, one per thread."""
+
+    def __init__(self, address: str, authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+        return conn
+
+    def call(self, op: str, user_id: Optional[str], *args):
+        """Run store.<op>(*args) in the writer; returns (result, version of the write)."""
+        for attempt in range(2):
+            try:
+                conn = self._conn()
+                conn.send((op, user_id, args))
+                break
+            except OSError as e:
+                # Stale connection (the writer was restarted): reconnect once
+                self._local.conn = None
+                if attempt:
+                    raise WriterError(f"Store writer unavailable: {e}") from e
+        try:
+            status, result, version = conn.recv()
+        except (EOFError, OSError) as e:
+            # The write may or may not have been applied: never resend it
+            self._local.conn = None
+            raise WriterError(f"Store writer failed during {op}: {e}") from e
+        if status == "error":
+            raise result
+        return result, version
+
+
+class RemoteWriteStore(TransactionStore):
+    """
+    A local store whose writes go through the writer process. Subscribers
+    are notified here, with the version the writer assigned, so this
+    worker's caches fold its own writes in incrementally.
+    """
+
+    def __init__(self, store: TransactionStore, client: WriterClient, user_id: Optional[str] = None):
+        super().__init__()
+        self.store = store
+        self.client = client
+        self.user_id = user_id
+
+    @property
+    def location(self) -> str:
+        return self.store.location
+
+    def version(self) -> int:
+        return self.store.version()
+
+    def append(self, df: pd.DataFrame) -> int:
+        written, version = self.client.call("append", self.user_id, df)
+        if written and version is not None:
+            self._notify(_normalize_frame(df), version)
+        return written
+
+    def update_column(self, ids, column, values) -> int:
+        updated, version = self.client.call("update_column", self.user_id, list(ids), column, list(values))
+        if version is not None:
+            self._notify(None, version)
+        return updated
+
+    def replace(self, df: pd.DataFrame) -> int:
+        raise NotImplementedError("replace() is for the offline pipeline, not API workers")
+
+    def seed(self, df: pd.DataFrame) -> int:
+        # The writer seeds the shared store before workers start
+        return 0
+
+    def read(self, columns=None, **filters) -> pd.DataFrame:
+        return self.store.read(columns=columns, **filters)
+
+    def read_frame(self, columns=None, **filters) -> pd.DataFrame:
+        return self.store.read_frame(columns=columns, **filters)
+
+    def iter_read(self, chunk_size: int = 5000, **kwargs):
+        return self.store.iter_read(chunk_size=chunk_size, **kwargs)
+
+    def count(self) -> int:
+        return self.store.count()
+
+    def is_empty(self) -> bool:
+        return self.store.is_empty()
+
+
+_CLIENT: Optional[WriterClient] = None
+
+
+def writer_client() -> Optional[WriterClient]:
+    """Client for the writer process when running under server.py, else None."""
+    global _CLIENT
+    if _CLIENT is None and WRITER_ADDRESS:
+        _CLIENT = WriterClient(WRITER_ADDRESS, bytes.fromhex(WRITER_AUTHKEY or ""))
+    return _CLIENT
@@ -0,0 +1,478 @@
+"""
+API benchmark and load test.
+
+Builds a synthetic dataset of --rows transactions (cached under
+data/benchmarks/datasets/), starts the API on it and drives every endpoint:
+
+  asgi  in-process through httpx's ASGI transport: no network, app cost only
+  http  concurrent HTTP load against a uvicorn server started on the dataset
+        (server.py with --workers N > 1; or --url for a server that is
+        already running)
+
+Per endpoint it records throughput, p50/p95/p99 latency, first-call
+latency, status codes and RSS, plus per run the startup time (until the
+server accepts requests) and time until GET /ready, i.e. until background
+warm-up finished, and writes everything to a JSON results file.
+--baseline compares against an earlier results file and exits non-zero when
+an endpoint's p95 or throughput got worse by more than --tolerance.
+
+    python scripts/benchmark_api.py --rows 100k
+    python scripts/benchmark_api.py --rows 10k 1M 10M --mode both --concurrency 16
+    python scripts/benchmark_api.py --rows 1M --baseline data/benchmarks/api-base.json
+
+Write endpoints (POST /transactions, /upload) add rows to the cached
+dataset; use --regenerate for a pristine one. Needs httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+
+import numpy as np
+
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.abspath(os.path.join(SCRIPTS_DIR, ".."))
+BACKEND_DIR = os.path.join(BASE_DIR, "backend")
+BENCH_DIR = os.path.join(BASE_DIR, "data", "benchmarks")
+sys.path.insert(0, BACKEND_DIR)
+# Backend modules read FINMATE_* at import, so they are imported inside the
+# functions, after the environment for the dataset has been set
+from generate_data import CATEGORIES, generate_chunk, plan_chunks
+
+# Fixed so datasets (and results) are comparable between runs
+START_DATE = datetime(2024, 1, 1)
+SPAN_DAYS = 365
+SERVER_START_TIMEOUT = 300
+DEFAULT_TOLERANCE = 0.2
+
+
+def parse_rows(text: str) -> int:
+    """'10k' -> 10000, '1.5M' -> 1500000."""
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)([kKmM]?)", text.strip())
+    if not m:
+        raise argparse.ArgumentTypeError(f"Bad row count: {text}")
+    scale = {"": 1, "k": 1000, "m": 1000000}[m.group(2).lower()]
+    return int(float(m.group(1)) * scale)
+
+
+def _rss_mb(pid=None, field="VmRSS"):
+    """Resident (VmRSS) or peak (VmHWM) memory of a process in MB, from /proc."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _server_rss_mb(pid, field="VmRSS"):
+    """
+    Memory of a server process and its children (server.py workers and
+    writer). Summed RSS counts pages the workers share copy-on-write once
+    per worker, so with workers > 1 it overstates what is really used.
+    """
+    if not pid:
+        return None
+    pids, total = [pid], 0.0
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    for p in pids:
+        total += _rss_mb(p, field) or 0.0
+    return round(total, 1)
+
+
+# ==========================================
+# Datasets
+# ==========================================
+
+def build_dataset(rows: int, backend: str, seed: int = 42, regenerate: bool = False) -> str:
+    """Directory holding a `backend` store with `rows` synthetic transactions."""
+    from store import open_store
+
+    directory = os.path.join(BENCH_DIR, "datasets", f"{backend}-{rows}-s{seed}")
+    marker = os.path.join(directory, "READY")
+    if os.path.exists(marker) and not regenerate:
+        return directory
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+    start = time.perf_counter()
+    store = open_store(backend, directory)
+    for i, spec in enumerate(plan_chunks(rows, SPAN_DAYS, seed)):
+        df = generate_chunk(spec, START_DATE, seed=seed)
+        df["Month"] = df["Date"].dt.strftime("%Y-%m")
+        df["Date"] = df["Date"].dt.strftime("%Y-%m-%d")
+        df["Merchant"] = df["Merchant"].astype(str)
+        df["Category"] = df["Category"].astype(str)
+        store.replace(df) if i == 0 else store.append(df)
+    with open(marker, "w") as f:
+        json.dump({"rows": rows, "backend": backend, "seed": seed,
+                   "built_s": round(time.perf_counter() - start, 1)}, f)
+    print(f"Built {backend} dataset of {rows} rows in {time.perf_counter() - start:.1f}s: {directory}")
+    return directory
+
+
+# ==========================================
+# Endpoint scenarios
+# ==========================================
+
+def _upload_csv(rng, rows=1000) -> bytes:
+    categories = [c for c in CATEGORIES if c != "Income"]
+    lines = ["Date,Merchant,Category,Amount"]
+    for _ in range(rows):
+        category = categories[rng.integers(len(categories))]
+        merchant = CATEGORIES[category][rng.integers(len(CATEGORIES[category]))]
+        day = START_DATE + timedelta(days=int(rng.integers(SPAN_DAYS)))
+        lines.append(f"{day:%Y-%m-%d},{merchant},{category},{rng.uniform(50, 5000):.2f}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def scenarios(seed: int = 0) -> dict:
+    """
+    name -> (method, path, build) where build(i) returns the httpx request
+    arguments of the i-th call. Names follow the handlers in main.py.
+    """
+    rng = np.random.default_rng(seed)
+    merchants = [m for ms in CATEGORIES.values() for m in ms]
+    categories = list(CATEGORIES)
+    upload = _upload_csv(rng)
+
+    def day(i):
+        return (START_DATE + timedelta(days=i % SPAN_DAYS)).strftime("%Y-%m-%d")
+
+    def tx(i):
+        return {"amount": round(float(rng.uniform(10, 20000)), 2), "category": categories[i % len(categories)],
+                "date": day(i), "merchant": merchants[i % len(merchants)]}
+
+    return {
+        "root": ("GET", "/", lambda i: {}),
+        "get_transactions_page": ("GET", "/transactions", lambda i: {"params": {"limit": 100, "offset": 100 * (i % 50)}}),
+        "get_transactions_filtered": ("GET", "/transactions", lambda i: {"params": {
+            "limit": 500, "category": categories[i % len(categories)], "start_date": day(i), "end_date": day(i + 30),
+            "fields": "Date,Merchant,Amount,Category"}}),
+        "get_transactions_stream_day": ("GET", "/transactions", lambda i: {"params": {
+            "start_date": day(i), "end_date": day(i), "format": "ndjson"}}),
+        "get_summary": ("GET", "/summary", lambda i: {"params": {"top": 5}}),
+        "forecast_spending": ("GET", "/forecast", lambda i: {"params": {"horizon": 3}}),
+        "check_anomaly": ("POST", "/analyze/anomaly", lambda i: {"json": tx(i)}),
+        "check_anomaly_batch": ("POST", "/analyze/anomaly/batch", lambda i: {
+            "json": {"transactions": [tx(i * 100 + k) for k in range(100)]}}),
+        "check_anomaly_stored": ("POST", "/analyze/anomaly/batch", lambda i: {
+            "json": {"stored": {"start_date": day(i), "end_date": day(i + 7), "limit": 1000}}}),
+        "categorize_merchant": ("POST", "/categorize", lambda i: {"json": {"merchant": f"{merchants[i % len(merchants)]} #{i}"}}),
+        "categorize_batch": ("POST", "/categorize/batch", lambda i: {
+            "json": {"merchants": [f"{merchants[(i + k) % len(merchants)]} store {k}" for k in range(50)]}}),
+        "add_transaction": ("POST", "/transactions", lambda i: {"json": tx(i)}),
+        "upload_csv": ("POST", "/upload", lambda i: {"files": {"file": ("bench.csv", upload, "text/csv")}}),
+        "chat": ("POST", "/chat", lambda i: {"json": {"query": f"How can I cut spending on {categories[i % len(categories)]}?"}}),
+        "model_status": ("GET", "/models", lambda i: {}),
+        "metrics": ("GET", "/metrics", lambda i: {}),
+    }
+
+
+# ==========================================
+# Load driver
+# ==========================================
+
+def _summary(latencies, statuses, wall_s, cold_s, concurrency, pid=None) -> dict:
+    ms = np.array(latencies) * 1000
+    ok = sum(n for status, n in statuses.items() if isinstance(status, int) and status < 400)
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(latencies) / wall_s, 1) if wall_s > 0 else None,
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "cold_ms": round(cold_s * 1000, 3),
+        "error_rate": round(1 - ok / len(latencies), 4),
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        "rss_mb": _rss_mb(pid),
+    }
+
+
+async def _call(client, method, path, kwargs):
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, path, **kwargs)
+        status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return time.perf_counter() - start, status
+
+
+async def drive(client, method, path, build, requests: int, concurrency: int, pid=None) -> dict:
+    """`requests` calls with `concurrency` in flight, after one untimed warm-up call."""
+    cold_s, _ = await _call(client, method, path, build(requests))
+    latencies, statuses = [], Counter()
+    counter = itertools.count()
+
+    async def worker():
+        for i in iter(lambda: next(counter), None):
+            if i >= requests:
+                return
+            elapsed, status = await _call(client, method, path, build(i))
+            latencies.append(elapsed)
+            statuses[status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return _summary(latencies, statuses, time.perf_counter() - start, cold_s, concurrency, pid)
+
+
+async def drive_all(client, names, requests, concurrency, pid=None) -> dict:
+    results = {}
+    for name in names:
+        method, path, build = scenarios()[name]
+        results[name] = await drive(client, method, path, build, requests, concurrency, pid)
+        r = results[name]
+        print(f"  {name:<30}{r['throughput_rps']:>10} rps  p50 {r['p50_ms']:>9} ms  p99 {r['p99_ms']:>9} ms"
+              f"  errors {r['error_rate']:.1%}")
+    return results
+
+
+# ==========================================
+# Modes
+# ==========================================
+
+def _bench_env(data_dir, backend, chat_backend, models_dir=None) -> dict:
+    env = {"FINMATE_DATA_DIR": data_dir, "FINMATE_STORE": backend, "FINMATE_CHAT_BACKEND": chat_backend}
+    if models_dir:
+        env["FINMATE_MODELS_DIR"] = models_dir
+    return env
+
+
+async def wait_ready(client, start: float):
+    """Seconds from `start` until GET /ready answers 200 (None on timeout), and its body."""
+    while time.perf_counter() - start < SERVER_START_TIMEOUT:
+        try:
+            response = await client.get("/ready")
+            if response.status_code == 200:
+                return time.perf_counter() - start, response.json()
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.05)
+    return None, None
+
+
+def _run_asgi(env, names, requests, concurrency) -> dict:
+    """In a fresh process: import the app on the dataset and drive it in-process."""
+    os.environ.update(env)
+    os.chdir(BACKEND_DIR)
+    start = time.perf_counter()
+    import main
+    import_s = time.perf_counter() - start
+
+    async def run():
+        async with main.app.router.lifespan_context(main.app):
+            startup_s = time.perf_counter() - start
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                ready_s, ready = await wait_ready(client, start)
+                endpoints = await drive_all(client, names, requests, concurrency)
+        return {"import_s": round(import_s, 3), "startup_s": round(startup_s, 3),
+                "ready_s": None if ready_s is None else round(ready_s, 3),
+                "warmup": ready and ready["steps"], "rss_mb": _rss_mb(), "peak_rss_mb": _rss_mb(field="VmHWM"),
+                "endpoints": endpoints}
+
+    return asyncio.run(run())
+
+
+def run_asgi(env, names, requests, concurrency) -> dict:
+    # A fresh interpreter per dataset: backend modules bind the data dir at import
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(_run_asgi, env, names, requests, concurrency).result()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(env, port: int, workers: int = 1):
+    """
+    uvicorn (or server.py with `workers` > 1) on the dataset; returns
+    (process, seconds until / answered, start time).
+    """
+    start = time.perf_counter()
+    if workers > 1:
+        command = [sys.executable, "server.py", "--workers", str(workers)]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "main:app"]
+    proc = subprocess.Popen(
+        command + ["--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env={**os.environ, **env},
+    )
+    url = f"http://127.0.0.1:{port}/"
+    while time.perf_counter() - start < SERVER_START_TIMEOUT:
+        if proc.poll() is not None:
+            raise RuntimeError(f"API server exited with code {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return proc, time.perf_counter() - start, start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"API server did not answer within {SERVER_START_TIMEOUT}s")
+
+
+def run_http(env, names, requests, concurrency, url=None, workers=1) -> dict:
+    proc, startup_s, pid, start = None, None, None, time.perf_counter()
+    if url is None:
+        port = _free_port()
+        proc, startup_s, start = start_server(env, port, workers)
+        url, pid = f"http://127.0.0.1:{port}", proc.pid
+
+    async def run():
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=None) as client:
+            ready_s, ready = await wait_ready(client, start)
+            return ready_s, ready, await drive_all(client, names, requests, concurrency, pid)
+
+    try:
+        ready_s, ready, endpoints = asyncio.run(run())
+        # Against --url the server started earlier: only its readiness is known
+        return {"url": url, "startup_s": None if startup_s is None else round(startup_s, 3),
+                "ready_s": None if ready_s is None or proc is None else round(ready_s, 3),
+                "workers": workers, "warmup": ready and ready["steps"], "rss_mb": _server_rss_mb(pid),
+                "peak_rss_mb": _server_rss_mb(pid, "VmHWM"), "endpoints": endpoints}
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+
+# ==========================================
+# Baseline comparison
+# ==========================================
+
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """
+    Print p95 and throughput against the baseline run with the same rows and
+    mode; return the (rows, mode, endpoint, reason) regressions.
+    """
+    base_runs = {(r["rows"], r["mode"]): r for r in baseline.get("runs", [])}
+    regressions = []
+    for run in results["runs"]:
+        base = base_runs.get((run["rows"], run["mode"]))
+        if base is None:
+            print(f"\nNo baseline for {run['rows']} rows / {run['mode']}")
+            continue
+        print(f"\n{run['rows']} rows / {run['mode']} vs baseline {baseline['meta'].get('created_at')}")
+        for key in ("startup_s", "ready_s"):
+            if run.get(key) is not None and base.get(key):
+                print(f"  {key}: {run[key]}s (baseline {base[key]}s, {run[key] / base[key] - 1:+.0%})")
+        print(f"  {'endpoint':<30}{'p95 ms':>10}{'base':>10}{'change':>9}{'rps':>10}{'base':>10}{'change':>9}")
+        for name, r in run["endpoints"].items():
+            b = base["endpoints"].get(name)
+            if b is None:
+                continue
+            p95 = r["p95_ms"] / b["p95_ms"] - 1 if b["p95_ms"] else 0.0
+            rps = r["throughput_rps"] / b["throughput_rps"] - 1 if b["throughput_rps"] else 0.0
+            flag = ""
+            if p95 > tolerance:
+                regressions.append((run["rows"], run["mode"], name, f"p95 +{p95:.0%}"))
+                flag = "  REGRESSION"
+            if rps < -tolerance:
+                regressions.append((run["rows"], run["mode"], name, f"throughput {rps:.0%}"))
+                flag = "  REGRESSION"
+            print(f"  {name:<30}{r['p95_ms']:>10}{b['p95_ms']:>10}{p95:>+9.0%}"
+                  f"{r['throughput_rps']:>10}{b['throughput_rps']:>10}{rps:>+9.0%}{flag}")
+    return regressions
+
+
+def run_benchmark(rows_list, modes=("asgi",), names=None, requests=200, concurrency=8, backend="sqlite",
+                  chat_backend="local", models_dir=None, url=None, seed=42, regenerate=False, workers=1) -> dict:
+    names = names or list(scenarios())
+    results = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "backend": backend,
+            "requests": requests,
+            "concurrency": concurrency,
+            "workers": workers,
+            "seed": seed,
+            "cpus": os.cpu_count(),
+            "python": sys.version.split()[0],
+        },
+        "runs": [],
+    }
+    for rows in rows_list:
+        data_dir = build_dataset(rows, backend, seed, regenerate)
+        env = _bench_env(data_dir, backend, chat_backend, models_dir)
+        for mode in modes:
+            print(f"\n== {rows} rows, {mode} ({requests} requests per endpoint, concurrency {concurrency})")
+            run = run_asgi(env, names, requests, concurrency) if mode == "asgi" else \
+                run_http(env, names, requests, concurrency, url, workers)
+            print(f"  startup {run['startup_s']}s, ready {run['ready_s']}s, RSS {run['rss_mb']} MB")
+            results["runs"].append({"rows": rows, "mode": mode, **run})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark and load-test the API on synthetic datasets.")
+    parser.add_argument("--rows", type=parse_rows, nargs="+", default=[parse_rows("100k")],
+                        help="dataset sizes, e.g. 10k 1M 10M")
+    parser.add_argument("--mode", choices=["asgi", "http", "both"], default="asgi")
+    parser.add_argument("--endpoints", nargs="+", choices=list(scenarios()), help="default: all")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight")
+    parser.add_argument("--backend", choices=["sqlite", "segments", "parquet"], default="sqlite")
+    parser.add_argument("--chat-backend", default="local", help="FINMATE_CHAT_BACKEND for the API (local: no Gemini calls)")
+    parser.add_argument("--models-dir", help="FINMATE_MODELS_DIR for the API")
+    parser.add_argument("--url", help="load-test this running server in http mode instead of starting one")
+    parser.add_argument("--workers", type=int, default=1, help="http mode: run server.py with this many workers")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--regenerate", action="store_true", help="rebuild cached datasets")
+    parser.add_argument("--output", help="results file (default: data/benchmarks/api-<time>.json)")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed p95 increase / throughput drop before flagging (0.2 = 20%%)")
+    args = parser.parse_args()
+    if not HAS_HTTPX:
+        sys.exit("The API benchmark needs httpx (pip install httpx)")
+
+    modes = ["asgi", "http"] if args.mode == "both" else [args.mode]
+    results = run_benchmark(args.rows, modes, args.endpoints, args.requests, args.concurrency, args.backend,
+                            args.chat_backend, args.models_dir, args.url, args.seed, args.regenerate, args.workers)
+    output = args.output or os.path.join(BENCH_DIR, f"api-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for rows, mode, name, reason in regressions:
+                print(f"  {rows} rows / {mode} / {name}: {reason}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
@@ -0,0 +1,136 @@
+"""
+Serving latency of the anomaly IsolationForest and the merchant categorizer
+RandomForest: sklearn's predict path vs the array-compiled forests in
+backend/forest.py, for single rows and batches, on stored transactions.
+
+    python scripts/benchmark_inference.py
+    python scripts/benchmark_inference.py --batch 1 100 10000 --iterations 500 --json
+
+The compiled numbers are for the array traversal itself; in serving,
+batches above a model's sklearn_above_rows go to sklearn instead. Each model
+is also checked to give exactly the same outputs on both paths.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from anomaly import build_features
+from categorize import normalize_merchant
+from forest import compile_forest, matches
+from registry import ModelRegistry
+from store import get_store
+
+SAMPLE_ROWS = 20000
+
+
+def _latencies(fn, iterations):
+    fn()  # warm up
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return np.array(times) * 1000
+
+
+def _stats(ms, rows):
+    p50 = float(np.percentile(ms, 50))
+    return {
+        "p50_ms": round(p50, 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "rows_per_sec": round(rows / p50 * 1000, 1) if p50 > 0 else None,
+    }
+
+
+def _inputs(registry, rows):
+    """Anomaly feature rows and TF-IDF merchant rows from the store, repeated up to `rows`."""
+    df = get_store().read(columns=["Amount", "Category", "Date", "Merchant"], limit=rows)
+    if df.empty:
+        raise SystemExit("No stored transactions to benchmark on")
+    df = pd.concat([df] * -(-rows // len(df))).iloc[:rows]
+    X_anomaly, valid = build_features(df["Amount"].to_numpy(), df["Category"].to_numpy(),
+                                      df["Date"].to_numpy(), registry.get("encoder"))
+    X_anomaly = X_anomaly[valid]
+    vectorizer = registry.get("vectorizer")
+    X_merchant = None
+    if vectorizer is not None:
+        X_merchant = vectorizer.transform(df["Merchant"].fillna("").astype(str).map(normalize_merchant))
+    return X_anomaly, X_merchant
+
+
+def run_benchmark(batch_sizes=(1, 100, 10000), iterations=200):
+    registry = ModelRegistry()
+    X_anomaly, X_merchant = _inputs(registry, max(max(batch_sizes), SAMPLE_ROWS))
+    targets = {}
+    if "anomaly" in registry:
+        model = registry["anomaly"]
+        names = getattr(model, "feature_names_in_", None)
+        # What score_frame hands sklearn: a frame when the model has feature names
+        as_input = (lambda X: pd.DataFrame(X, columns=names)) if names is not None else (lambda X: X)
+        targets["anomaly"] = (model, X_anomaly, as_input, "decision_function")
+    if "categorizer" in registry and X_merchant is not None:
+        targets["categorizer"] = (registry["categorizer"], X_merchant, lambda X: X, "predict")
+
+    report = {"version": registry.version, "iterations": iterations, "models": {}}
+    for name, (model, X, as_input, method) in targets.items():
+        start = time.perf_counter()
+        compiled = compile_forest(model)
+        entry = {
+            "compile_ms": round((time.perf_counter() - start) * 1000, 2),
+            "trees": compiled.n_estimators,
+            "nodes": compiled.node_count,
+            "max_depth": compiled.max_depth,
+            "identical": matches(compiled, X[:SAMPLE_ROWS]),
+            "sklearn_above_rows": compiled.sklearn_above_rows,
+            "sizes": {},
+        }
+        # Time the traversal at every size, not the serving dispatch
+        compiled.sklearn_above_rows = float("inf")
+        for size in batch_sizes:
+            X_batch = X[:size]
+            sk_input = as_input(X_batch)
+            # Fewer repeats for big batches; p99 needs at least a few dozen
+            n = max(iterations * min(1, 100 / size), 30)
+            sk = _latencies(lambda: getattr(model, method)(sk_input), int(n))
+            fast = _latencies(lambda: getattr(compiled, method)(X_batch), int(n))
+            entry["sizes"][size] = {
+                "sklearn": _stats(sk, size),
+                "compiled": _stats(fast, size),
+                "speedup_p50": round(float(np.percentile(sk, 50) / np.percentile(fast, 50)), 1),
+            }
+        report["models"][name] = entry
+    return report
+
+
+def print_report(report):
+    print(f"Model version: {report['version']}")
+    for name, entry in report["models"].items():
+        print(f"\n{name}: {entry['trees']} trees, {entry['nodes']} nodes, depth {entry['max_depth']}, "
+              f"compiled in {entry['compile_ms']} ms, identical outputs: {entry['identical']}, "
+              f"served by sklearn above {entry['sklearn_above_rows']} rows")
+        print(f"  {'rows':>7}{'sklearn p50':>14}{'p99':>10}{'compiled p50':>15}{'p99':>10}{'speedup':>10}")
+        for size, r in entry["sizes"].items():
+            print(f"  {size:>7}{r['sklearn']['p50_ms']:>14}{r['sklearn']['p99_ms']:>10}"
+                  f"{r['compiled']['p50_ms']:>15}{r['compiled']['p99_ms']:>10}{r['speedup_p50']:>9}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare sklearn and compiled forest inference latency.")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 100, 10000], help="batch sizes")
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per single-row size")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    # sklearn warns about feature names on every call otherwise
+    warnings.filterwarnings("ignore", category=UserWarning)
+    report = run_benchmark(args.batch, args.iterations)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
@@ -0,0 +1,81 @@
+"""
+Memory per loaded transaction: plain store.read() frame (object strings,
+float64) vs read_frame() (typed core columns) vs the compact frame shared by
+the API and scripts (frame.compact_frame).
+
+    python scripts/benchmark_memory.py --rows 500000
+    python scripts/benchmark_memory.py --csv data/processed/cleaned_transactions.csv --json
+
+The stored rows are repeated up to --rows so results do not depend on how
+much data happens to be stored. Sizes are pandas' deep memory_usage, which
+counts every string value of an object column in full.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from frame import bytes_per_row, compact_frame
+from store import get_store, typed_frame
+
+
+def _repeat(df, rows):
+    if df.empty or rows is None:
+        return df
+    reps = -(-rows // len(df))
+    out = pd.concat([df] * reps).iloc[:rows]
+    return out.set_axis(pd.RangeIndex(1, len(out) + 1, name='id'))
+
+
+def run_benchmark(rows=200000, csv_path=None):
+    base = pd.read_csv(csv_path) if csv_path else get_store().read()
+    plain = _repeat(base, rows)
+
+    results = {}
+    for name, build in (('read', lambda: plain),
+                        ('read_frame', lambda: typed_frame(plain)),
+                        ('compact', lambda: compact_frame(plain))):
+        start = time.perf_counter()
+        df = build()
+        results[name] = {
+            'bytes_per_row': round(bytes_per_row(df), 1),
+            'convert_ms': round((time.perf_counter() - start) * 1000, 1),
+            'columns': {col: round(int(n) / max(len(df), 1), 1)
+                        for col, n in df.memory_usage(deep=True, index=False).items()},
+            'dtypes': {col: str(t) for col, t in df.dtypes.items()},
+        }
+    return {
+        'rows': len(plain),
+        'results': results,
+        'reduction': round(results['read']['bytes_per_row'] / results['compact']['bytes_per_row'], 2),
+    }
+
+
+def print_report(report):
+    results = report['results']
+    print(f"Rows: {report['rows']}")
+    print(f"{'representation':<14}{'bytes/row':>12}{'convert ms':>12}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['bytes_per_row']:>12}{r['convert_ms']:>12}")
+    print(f"\nPer column (bytes/row)      {'read':>10}{'compact':>10}  compact dtype")
+    for col, n in results['read']['columns'].items():
+        print(f"  {col:<26}{n:>10}{results['compact']['columns'].get(col, 0):>10}  "
+              f"{results['compact']['dtypes'].get(col)}")
+    print(f"\nCompact frame is {report['reduction']}x smaller than read()")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure memory per loaded transaction.")
+    parser.add_argument("--rows", type=int, default=200000, help="rows to measure (stored rows repeated)")
+    parser.add_argument("--csv", help="measure a CSV instead of the configured store")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    report = run_benchmark(args.rows, args.csv)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
@@ -1,98 +1,224 @@
-import pandas as pd
-import numpy as np
-import random
+import argparse
+import functools
+import os
+from collections import deque
 from datetime import datetime, timedelta
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+CATEGORIES = {
+    'Food & Drink': ['Starbucks', 'McDonalds', 'Whole Foods', 'Local Cafe', 'Uber Eats'],
+    'Groceries': ['Walmart', 'Target', 'Kroger', 'Safeway'],
+    'Utilities': ['Electric Co', 'Water Dept', 'Internet Provider', 'Gas Company'],
+    'Transport': ['Uber', 'Lyft', 'Shell Gas', 'Subway Ticket'],
+    'Shopping': ['Amazon', 'Nike', 'H&M', 'Best Buy'],
+    'Entertainment': ['Netflix', 'Spotify', 'Cinema XYZ', 'Steam'],
+    'Health': ['CVS', 'Doctor Visit', 'Gym Membership'],
+    'Income': ['Salary', 'Freelance', 'Refund']
+}
+
+# Amount range per category (INR context)
+AMOUNT_RANGES = {
+    'Income': (30000, 150000),      # Salary range typical for freshers/mid-level
+    'Food & Drink': (100, 1500),    # Tea to fancy dinner
+    'Groceries': (500, 5000),       # Weekly grocery run
+    'Utilities': (500, 3000),       # Electricity, Internet
+    'Transport': (50, 800),         # Auto, Uber, Petrol
+    'Shopping': (1000, 10000),      # Clothes, Electronics
+    'Entertainment': (300, 2000),   # Movies, Netflix
+    'Health': (500, 5000),
+}
+
+CHUNK_ROWS = 250000
+
+# Lookup tables indexed by category number
+_CATS = list(CATEGORIES)
+_MERCHANTS = [m for cat in _CATS for m in CATEGORIES[cat]]
+_MERCHANT_COUNT = np.array([len(CATEGORIES[c]) for c in _CATS])
+_MERCHANT_OFFSET = np.concatenate([[0], np.cumsum(_MERCHANT_COUNT)[:-1]])
+_LOW = np.array([AMOUNT_RANGES[c][0] for c in _CATS], dtype=np.float64)
+_HIGH = np.array([AMOUNT_RANGES[c][1] for c in _CATS], dtype=np.float64)
+_IS_EXPENSE = np.array([c != 'Income' for c in _CATS])
+
+
+def plan_chunks(num_rows, span_days, seed, chunk_rows=CHUNK_ROWS):
+    """
+    Split the dataset into chunks that can be generated independently.
+    Rows are spread over the days of the span up front (a cheap multinomial
+    draw), so chunk k holds rows [start, end) of the date-sorted output and
+    concatenating chunks in order gives a date-sorted file. Each chunk gets
+    its own seed from one SeedSequence: output does not depend on how many
+    worker processes run.
+    """
+    root = np.random.SeedSequence(seed)
+    plan_seed, chunk_seeds_root = root.spawn(2)
+    per_day = np.random.default_rng(plan_seed).multinomial(num_rows, np.full(span_days + 1, 1 / (span_days + 1)))
+    day_ends = np.cumsum(per_day)
+    bounds = list(range(0, num_rows, chunk_rows)) + [num_rows]
+    seeds = chunk_seeds_root.spawn(max(len(bounds) - 1, 0))
+    return [
+        {'index': k, 'start': bounds[k], 'end': bounds[k + 1], 'seed': seeds[k], 'day_ends': day_ends}
+        for k in range(len(bounds) - 1)
+    ]
+
+
+@functools.lru_cache(maxsize=4)
+def user_weights(users, seed):
+    """Activity share of each user; some users are far more active than others."""
+    weights = np.random.default_rng([seed, users]).lognormal(0, 1, users)
+    return weights / weights.sum()
+
+
+@functools.lru_cache(maxsize=4)
+def user_ids(users):
+    return pd.Index([f'user_{i:06d}' for i in range(users)])
 
-def generate_synthetic_data(num_rows=5000):
+
+def generate_chunk(spec, start_date, anomaly_rate=0.02, users=None, seed=42):
+    """
+    One chunk of synthetic transactions: normal patterns (recurring bills,
+    daily spend) plus high-expense anomalies, all drawn as whole arrays.
+    """
+    rng = np.random.default_rng(spec['seed'])
+    n = spec['end'] - spec['start']
+
+    # 1. Dates: row position -> day, already sorted
+    positions = np.arange(spec['start'], spec['end'])
+    days = np.searchsorted(spec['day_ends'], positions, side='right')
+    dates = (np.datetime64(start_date.strftime('%Y-%m-%d'), 'D') + days).astype('datetime64[ns]')
+
+    # 2. Category & merchant
+    cat = rng.integers(0, len(_CATS), n)
+    merchant = _MERCHANT_OFFSET[cat] + (rng.random(n) * _MERCHANT_COUNT[cat]).astype(np.int64)
+
+    # 3. Amount based on category
+    amount = rng.uniform(_LOW[cat], _HIGH[cat])
+    is_expense = _IS_EXPENSE[cat]
+
+    # 4. Anomalies: high spending spikes on a share of expenses
+    is_anomaly = is_expense & (rng.random(n) < anomaly_rate)
+    amount = np.where(is_anomaly, amount * rng.uniform(3, 10, n), amount)
+
+    df = pd.DataFrame({
+        'Date': dates,  # written as YYYY-MM-DD
+        'Merchant': pd.Categorical.from_codes(merchant, categories=_MERCHANTS),
+        'Category': pd.Categorical.from_codes(cat, categories=_CATS),
+        'Amount': np.round(amount, 2),
+        'Is_Expense': is_expense,
+        'Is_Anomaly': is_anomaly,  # This is our ground truth for training
+    })
+    if users:
+        user = rng.choice(users, size=n, p=user_weights(users, seed))
+        df.insert(0, 'User_Id', pd.Categorical.from_codes(user, categories=user_ids(users)))
+    return df
+
+
+def _run_chunk(args):
+    spec, start_date, anomaly_rate, users, seed, shard_path, fmt = args
+    df = generate_chunk(spec, start_date, anomaly_rate, users, seed)
+    if shard_path is None:
+        return df
+    if fmt == 'parquet':
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), shard_path)
+    else:
+        df.to_csv(shard_path, index=False)
+    return len(df), int(df['Is_Anomaly'].sum())
+
+
+def _in_order(pool, tasks, ahead):
+    """Run tasks on the pool, yielding results in task order with at most
+    `ahead` chunks in flight, so a slow writer does not let results pile up."""
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(_run_chunk, (task,)))
+        if len(pending) >= ahead:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def generate_synthetic_data(num_rows=5000, output_path='data/raw/transactions.csv', users=None,
+                            span_days=365, anomaly_rate=0.02, seed=42, fmt='csv', workers=1,
+                            sharded=False, start_date=None, chunk_rows=CHUNK_ROWS):
     """
-    Generates a synthetic dataset of financial transactions.
-    Includes normal patterns (recurring bills, daily spend) and anomalies.
+    Generates a synthetic dataset of financial transactions and writes it
+    chunk by chunk, so memory stays at a few chunks whatever num_rows is.
+    With `sharded`, output_path is a directory and each chunk is written by
+    its worker as part-NNNNN.<fmt>; otherwise chunks are appended in order
+    to one file.
     """
-    np.random.seed(42)
-    random.seed(42)
-
-    categories = {
-        'Food & Drink': ['Starbucks', 'McDonalds', 'Whole Foods', 'Local Cafe', 'Uber Eats'],
-        'Groceries': ['Walmart', 'Target', 'Kroger', 'Safeway'],
-        'Utilities': ['Electric Co', 'Water Dept', 'Internet Provider', 'Gas Company'],
-        'Transport': ['Uber', 'Lyft', 'Shell Gas', 'Subway Ticket'],
-        'Shopping': ['Amazon', 'Nike', 'H&M', 'Best Buy'],
-        'Entertainment': ['Netflix', 'Spotify', 'Cinema XYZ', 'Steam'],
-        'Health': ['CVS', 'Doctor Visit', 'Gym Membership'],
-        'Income': ['Salary', 'Freelance', 'Refund']
-    }
-
-    data = []
-    
-    # Start date 1 year ago
-    start_date = datetime.now() - timedelta(days=365)
-
-    for _ in range(num_rows):
-        # 1. Random Date
-        random_days = random.randint(0, 365)
-        date = start_date + timedelta(days=random_days)
-        
-        # 2. Pick Category & Merchant
-        cat = random.choice(list(categories.keys()))
-        merchant = random.choice(categories[cat])
-        
-        # 3. Generate Amount based on Category (INR Context)
-        if cat == 'Income':
-            amount = random.uniform(30000, 150000) # Salary range typical for freshers/mid-level
-            is_expense = False
-        elif cat == 'Food & Drink':
-            amount = random.uniform(100, 1500) # Tea to fancy dinner
-            is_expense = True
-        elif cat == 'Groceries':
-            amount = random.uniform(500, 5000) # Weekly grocery run
-            is_expense = True
-        elif cat == 'Utilities':
-            amount = random.uniform(500, 3000) # Electricity, Internet
-            is_expense = True
-        elif cat == 'Transport':
-            amount = random.uniform(50, 800) # Auto, Uber, Petrol
-            is_expense = True
-        elif cat == 'Shopping':
-            amount = random.uniform(1000, 10000) # Clothes, Electronics
-            is_expense = True
-        elif cat == 'Entertainment':
-            amount = random.uniform(300, 2000) # Movies, Netflix
-            is_expense = True
-        else: # Health and others
-            amount = random.uniform(500, 5000)
-            is_expense = True
-
-        # 4. Inject some "Anomalies" (High spending spikes)
-        # 2% chance of a high expense anomaly
-        is_anomaly = False
-        if is_expense and random.random() < 0.02:
-            amount = amount * random.uniform(3, 10)
-            is_anomaly = True
-            
-        dataset_row = {
-            'Date': date.strftime('%Y-%m-%d'),
-            'Merchant': merchant,
-            'Category': cat,
-            'Amount': round(amount, 2),
-            'Is_Expense': is_expense,
-            'Is_Anomaly': is_anomaly # This is our ground truth for training
-        }
-        data.append(dataset_row)
-
-    # Convert to DataFrame
-    df = pd.DataFrame(data)
-    
-    # Sort by date
-    df['Date'] = pd.to_datetime(df['Date'])
-    df = df.sort_values('Date').reset_index(drop=True)
-    
-    # Save
-    output_path = 'data/raw/transactions.csv'
-    df.to_csv(output_path, index=False)
-    print(f"Successfully generated {num_rows} transactions to {output_path}")
-    print(df.head())
-    print("\nAnomaly Count:")
-    print(df['Is_Anomaly'].value_counts())
+    if fmt == 'parquet' and not HAS_PYARROW:
+        raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+    # Start date: span_days ago
+    start_date = start_date or (datetime.now() - timedelta(days=span_days))
+    chunks = plan_chunks(num_rows, span_days, seed, chunk_rows)
+    if sharded:
+        os.makedirs(output_path, exist_ok=True)
+    else:
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+
+    tasks = [
+        (spec, start_date, anomaly_rate, users, seed,
+         os.path.join(output_path, f"part-{spec['index']:05d}.{fmt}") if sharded else None, fmt)
+        for spec in chunks
+    ]
+    written, anomalies, writer = 0, 0, None
+    workers = min(workers, len(tasks))
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        results = _in_order(pool, tasks, 2 * workers) if pool else map(_run_chunk, tasks)
+        for result in results:
+            if sharded:
+                n, n_anomaly = result
+                written += n
+                anomalies += n_anomaly
+                continue
+            if fmt == 'parquet':
+                table = pa.Table.from_pandas(result, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                writer.write_table(table)
+            else:
+                result.to_csv(output_path, mode='w' if written == 0 else 'a', header=written == 0, index=False)
+            written += len(result)
+            anomalies += int(result['Is_Anomaly'].sum())
+    finally:
+        if writer is not None:
+            writer.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    print(f"Successfully generated {written} transactions to {output_path}")
+    print(f"\nAnomaly Count: {anomalies} ({anomalies / max(written, 1):.2%})")
+    return written
+
 
 if __name__ == "__main__":
-    generate_synthetic_data()
+    parser = argparse.ArgumentParser(description="Generate synthetic transactions.")
+    parser.add_argument("--rows", type=int, default=5000, help="number of transactions")
+    parser.add_argument("--users", type=int, default=None, help="spread rows over this many users (adds User_Id)")
+    parser.add_argument("--days", type=int, default=365, help="date span in days, ending today")
+    parser.add_argument("--start", help="first date (YYYY-MM-DD) instead of --days before today")
+    parser.add_argument("--anomaly-rate", type=float, default=0.02, help="share of expenses that are spikes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--output", help="output file (or directory with --sharded)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="generator processes")
+    parser.add_argument("--sharded", action="store_true", help="write one file per chunk into --output")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    output = args.output or ('data/raw/transactions_shards' if args.sharded else f'data/raw/transactions.{args.format}')
+    start = datetime.strptime(args.start, '%Y-%m-%d') if args.start else None
+    generate_synthetic_data(args.rows, output, args.users, args.days, args.anomaly_rate, args.seed,
+                            args.format, args.workers, args.sharded, start, args.chunk_rows)
@@ -0,0 +1,74 @@
+"""
+One-shot migration of the processed dataset into the month-partitioned
+Parquet store (data/processed/parquet/). Run it once, then start the API
+and the scripts with FINMATE_STORE=parquet.
+
+    python scripts/migrate_to_parquet.py                     # from cleaned_transactions.csv
+    python scripts/migrate_to_parquet.py --csv other.csv
+    python scripts/migrate_to_parquet.py --from-store sqlite # from the current store
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from store import DATA_DIR, ParquetStore, open_store
+
+CHUNK_ROWS = 500000
+
+
+def _parquet_files(path):
+    return [os.path.join(root, f) for root, _, files in os.walk(path) for f in files if f.endswith('.parquet')]
+
+
+def _chunks(csv_path=None, from_store=None, data_dir=DATA_DIR):
+    if from_store:
+        yield from open_store(from_store, data_dir).iter_read(chunk_size=CHUNK_ROWS)
+        return
+    yield from pd.read_csv(csv_path, chunksize=CHUNK_ROWS)
+
+
+def migrate(csv_path=None, from_store=None, data_dir=DATA_DIR, force=False):
+    csv_path = csv_path or os.path.join(data_dir, 'cleaned_transactions.csv')
+    if not from_store and not os.path.exists(csv_path):
+        print(f"Nothing to migrate: {csv_path} does not exist")
+        return 0
+    # Constructed directly: open_store() would seed it from the CSV itself
+    target = ParquetStore(os.path.join(data_dir, 'parquet'))
+    if not target.is_empty() and not force:
+        print(f"{target.directory} already holds {target.count()} rows; use --force to rebuild it")
+        return 0
+
+    start = time.perf_counter()
+    written = 0
+    for i, chunk in enumerate(_chunks(csv_path, from_store, data_dir)):
+        chunk = chunk.reset_index(drop=True)
+        written += target.replace(chunk) if i == 0 else target.append(chunk)
+    if written == 0:
+        target.replace(pd.DataFrame())
+    elapsed = time.perf_counter() - start
+
+    source = from_store or csv_path
+    files = _parquet_files(target.directory)
+    months = {os.path.basename(os.path.dirname(f)) for f in files}
+    print(f"Migrated {written} rows from {source} in {elapsed:.1f}s")
+    print(f"  {len(months)} month partitions, {len(files)} files, "
+          f"{sum(os.path.getsize(f) for f in files) / 1e6:.1f} MB in {target.directory}")
+    if not from_store:
+        print(f"  CSV was {os.path.getsize(csv_path) / 1e6:.1f} MB")
+    print("Set FINMATE_STORE=parquet to use it.")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the processed dataset to the Parquet store.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--csv", help="CSV to migrate (default: data/processed/cleaned_transactions.csv)")
+    source.add_argument("--from-store", choices=["sqlite", "segments"], help="migrate an existing store instead")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="processed data directory")
+    parser.add_argument("--force", action="store_true", help="rebuild the Parquet store if it already has rows")
+    args = parser.parse_args()
+    migrate(args.csv, args.from_store, args.data_dir, args.force)
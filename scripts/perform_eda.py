@@ -2,24 +2,31 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from frame import get_frame
+
+EDA_COLUMNS = ['Date', 'Category', 'Amount', 'Is_Expense', 'Is_Anomaly']
 
 def perform_eda():
-    # Load Data
-    df = pd.read_csv('data/raw/transactions.csv')
+    # Load Data: only the columns plotted, already typed (datetime Date,
+    # categorical Category, bool flags)
+    df = get_frame().get(EDA_COLUMNS)
     
     # Create directory for images if not exists
     os.makedirs('data/veda_images', exist_ok=True) # VEDA = Visual EDA
     
     # 1. Distribution of Categories
     plt.figure(figsize=(10, 6))
-    spending_df = df[df['Is_Expense'] == True]
+    spending_df = df[df['Is_Expense'] == True].copy()
+    spending_df['Category'] = spending_df['Category'].cat.remove_unused_categories()
     sns.countplot(data=spending_df, y='Category', order=spending_df['Category'].value_counts().index)
     plt.title('Distribution of Transactions by Category')
     plt.savefig('data/veda_images/category_distribution.png')
     plt.close()
     
     # 2. Monthly Spending Trend
-    df['Date'] = pd.to_datetime(df['Date'])
     df['Month'] = df['Date'].dt.to_period('M')
     monthly_spend = df[df['Is_Expense'] == True].groupby('Month')['Amount'].sum()
     
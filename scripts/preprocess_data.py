@@ -1,54 +1,108 @@
+import argparse
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import LabelEncoder
 import pickle
 import os
+import sys
 
-def preprocess_data():
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from anomaly import encode_categories
+from features import (ROLLING_COLUMNS, add_date_features, changed_rows, context_filter,
+                      rolling_features, update_rolling)
+from normalize import parse_amounts, parse_dates
+from registry import MODELS_DIR
+from store import get_store
+
+RAW_PATH = 'data/raw/transactions.csv'
+
+def read_raw(path):
+    """Raw transactions from a CSV, a Parquet file or a directory of shards
+    written by generate_data.py --sharded."""
+    if os.path.isdir(path):
+        shards = sorted(f for f in os.listdir(path) if f.endswith(('.csv', '.parquet')))
+        return pd.concat([read_raw(os.path.join(path, f)) for f in shards], ignore_index=True)
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+def preprocess_data(input_path=RAW_PATH):
     # Load raw data
-    input_path = 'data/raw/transactions.csv'
-    df = pd.read_csv(input_path)
-    df['Date'] = pd.to_datetime(df['Date'])
+    df = read_raw(input_path)
+    df['Date'] = parse_dates(df['Date'])
+    df['Amount'] = parse_amounts(df['Amount'])
     
     # 1. Handle Missing Values (Synthetic data shouldn't have any, but for robustness)
     df = df.dropna()
 
     # 2. Date Features
-    df['DayOfWeek'] = df['Date'].dt.dayofweek
-    df['DayOfMonth'] = df['Date'].dt.day
+    df = add_date_features(df)
     df['Month'] = df['Date'].dt.month
-    df['IsWeekend'] = df['DayOfWeek'].apply(lambda x: 1 if x >= 5 else 0)
     
     # 3. Encoding Categorical Variables
     # We need to save the encoder to use it during prediction/app phase
     le_category = LabelEncoder()
     df['Category_Encoded'] = le_category.fit_transform(df['Category'])
     
-    # Save Label Encoder
-    os.makedirs('models', exist_ok=True)
-    with open('models/category_encoder.pkl', 'wb') as f:
+    # Save Label Encoder; train_models.py publishes it with the models
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    with open(os.path.join(MODELS_DIR, 'category_encoder.pkl'), 'wb') as f:
         pickle.dump(le_category, f)
         
     # 4. Feature Engineering for Time Series / Anomaly Detection
-    # Rolling Average of last 7 days for that category to detect spikes
-    # For simplicity in this script, we'll just do rolling avg on 'Amount' irrespective of category for now
-    # But for a real model, we might want per-category rolling windows.
-    
-    # Let's do a per-category rolling average
-    df = df.sort_values(by=['Category', 'Date'])
-    df['Category_Rolling_Mean_7d'] = df.groupby('Category')['Amount'].transform(lambda x: x.rolling(window=7, min_periods=1).mean())
-    df['Category_Rolling_Std_7d'] = df.groupby('Category')['Amount'].transform(lambda x: x.rolling(window=7, min_periods=1).std().fillna(0))
-    
-    # Sort back by date
-    df = df.sort_values('Date').reset_index(drop=True)
-    
+    # Per-category mean/std over the last 7 and 30 days to detect spikes
+    df[ROLLING_COLUMNS] = rolling_features(df)
+    df = df.sort_values('Date', kind='mergesort').reset_index(drop=True)
+
     # Save Processed Data
-    os.makedirs('data/processed', exist_ok=True)
-    output_path = 'data/processed/cleaned_transactions.csv'
-    df.to_csv(output_path, index=False)
+    store = get_store()
+    store.replace(df)
     
-    print(f"Data preprocessing complete. Saved to {output_path}")
+    print(f"Data preprocessing complete. Saved {len(df)} rows to the {type(store).__name__}")
     print(df.head())
 
+def append_transactions(input_path):
+    """
+    Preprocess a new batch of raw transactions (e.g. one day's export) and
+    append it to the store, recomputing only the rolling windows it touches
+    instead of the whole history.
+    """
+    df = read_raw(input_path)
+    df['Date'] = parse_dates(df['Date'])
+    df['Amount'] = parse_amounts(df['Amount'])
+    df = df.dropna()
+    if df.empty:
+        print("Nothing to append.")
+        return
+
+    df = add_date_features(df)
+    df['Month'] = df['Date'].dt.month
+    # Reuse the fitted encoder; unseen categories encode as -1
+    with open(os.path.join(MODELS_DIR, 'category_encoder.pkl'), 'rb') as f:
+        le_category = pickle.load(f)
+    df['Category_Encoded'] = encode_categories(le_category, df['Category']).astype(int)
+
+    store = get_store()
+    existing = store.read(columns=['Category', 'Date', 'Amount'] + ROLLING_COLUMNS, **context_filter(df))
+    new_features, recomputed = update_rolling(existing, df)
+    df[ROLLING_COLUMNS] = new_features
+
+    # Only back-dated rows change windows of rows already stored
+    changed = changed_rows(existing, recomputed)
+    if not changed.empty:
+        for col in ROLLING_COLUMNS:
+            store.update_column(changed.index, col, changed[col])
+
+    store.append(df.sort_values('Date', kind='mergesort'))
+    print(f"Appended {len(df)} rows (read {len(existing)} rows of context, "
+          f"updated {len(changed)} existing rows) to the {type(store).__name__}")
+
 if __name__ == "__main__":
-    preprocess_data()
+    parser = argparse.ArgumentParser(description="Preprocess raw transactions into the store.")
+    parser.add_argument("--input", default=RAW_PATH, help="raw CSV, Parquet file or shard directory")
+    parser.add_argument("--append", metavar="PATH", help="append a new batch incrementally instead of rebuilding")
+    args = parser.parse_args()
+    if args.append:
+        append_transactions(args.append)
+    else:
+        preprocess_data(args.input)
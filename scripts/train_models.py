@@ -1,113 +1,354 @@
-import pandas as pd
-import numpy as np
-import pickle
+import argparse
+import hashlib
+import json
 import os
+import pickle
+import shutil
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
 from sklearn.ensemble import IsolationForest, RandomForestRegressor, RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, classification_report, accuracy_score
 from sklearn.feature_extraction.text import TfidfVectorizer
 
-def train_models():
-    print("Loading data...")
-    df = pd.read_csv('data/processed/cleaned_transactions.csv')
-    df['Date'] = pd.to_datetime(df['Date'])
-    
-    # Ensure models directory exists
-    os.makedirs('models', exist_ok=True)
-
-    # ==========================================
-    # 1. Anomaly Detection (Isolation Forest)
-    # ==========================================
-    print("\nTraining Anomaly Detection Model...")
-    # Features: Amount, Category_Encoded, DayOfWeek, IsWeekend
-    # We filter for expenses only for anomaly detection
-    df_expenses = df[df['Is_Expense'] == True].copy()
-    
-    features_anomaly = ['Amount', 'Category_Encoded', 'DayOfWeek', 'IsWeekend']
-    X_anomaly = df_expenses[features_anomaly]
-    
-    # Isolation Forest is unsupervised, but we have labels to check performance
-    iso_forest = IsolationForest(n_estimators=100, contamination=0.02, random_state=42)
-    iso_forest.fit(X_anomaly)
-    
-    # Predict (-1 is anomaly, 1 is normal)
-    preds = iso_forest.predict(X_anomaly)
-    # Map to 0 (normal) and 1 (anomaly) for comparison with our 'Is_Anomaly' ground truth
-    preds_mapped = [1 if x == -1 else 0 for x in preds]
-    
-    print("Anomaly Detection Report:")
-    print(classification_report(df_expenses['Is_Anomaly'], preds_mapped, target_names=['Normal', 'Anomaly']))
-    
-    # Save Model
-    with open('models/anomaly_model.pkl', 'wb') as f:
-        pickle.dump(iso_forest, f)
-
-    # ==========================================
-    # 2. Categorization Model (Random Forest Classifier)
-    # ==========================================
-    print("\nTraining Categorization Model...")
-    # Goal: Predict 'Category_Encoded' from 'Merchant' name
-    # We need a vectorizer for text
-    
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:
+    # Windows: report tracemalloc peaks only
+    HAS_RESOURCE = False
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from categorize import build_merchant_lookup
+from forecast import FORECAST_FEATURES, monthly_totals, training_set
+from forest import compile_forest, matches
+from frame import get_frame
+from registry import MODELS_DIR, ModelRegistry, frame_hash, publish
+
+FEATURES_ANOMALY = ['Amount', 'Category_Encoded', 'DayOfWeek', 'IsWeekend']
+# Bump when feature building changes so cached matrices are rebuilt
+FEATURE_CACHE_VERSION = 1
+# Models the API serves through forest.compile_forest, and the rows checked
+COMPILED_MODELS = ['anomaly', 'categorizer']
+COMPILE_CHECK_ROWS = 10000
+CACHE_DIR = os.path.join(MODELS_DIR, '.feature_cache')
+REPORT_PATH = os.path.join(MODELS_DIR, 'training_report.json')
+
+
+class CompileCheckError(RuntimeError):
+    """A compiled forest disagrees with its sklearn model; nothing was published."""
+
+
+# ==========================================
+# Timing / memory report
+# ==========================================
+
+def _max_rss_mb():
+    if not HAS_RESOURCE:
+        return None
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class Stage:
+    """Records wall-clock time and peak traced memory of a block."""
+
+    def __init__(self, name, report):
+        self.name = name
+        self.report = report
+
+    def __enter__(self):
+        tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.report[self.name] = {
+            'wall_s': round(time.perf_counter() - self.start, 3),
+            'peak_traced_mb': round(peak / 1024 / 1024, 1),
+            'max_rss_mb': _max_rss_mb(),
+            'pid': os.getpid(),
+        }
+
+
+def _hash_arrays(*arrays):
+    h = hashlib.sha256()
+    for a in arrays:
+        if sp.issparse(a):
+            a = a.tocsr()
+            for part in (a.data, a.indices, a.indptr):
+                h.update(np.ascontiguousarray(part).tobytes())
+            h.update(str(a.shape).encode())
+        else:
+            h.update(np.ascontiguousarray(a).tobytes())
+    return h.hexdigest()
+
+
+# ==========================================
+# Features (cached per data fingerprint)
+# ==========================================
+
+def build_features(df):
+    """All training inputs, as plain arrays / sparse matrices."""
+    features = {}
+
+    # 1. Anomaly: expenses only. Rows appended through the API since the
+    # last preprocess run have no engineered features yet and are skipped.
+    df_expenses = df[df['Is_Expense'] == True].dropna(subset=FEATURES_ANOMALY)
+    features['anomaly'] = {
+        'X': df_expenses[FEATURES_ANOMALY].to_numpy(dtype=np.float64),
+        'y': df_expenses['Is_Anomaly'].fillna(False).astype(int).to_numpy(),
+    }
+
+    # 2. Categorizer: TF-IDF stays a sparse CSR matrix end to end
+    labelled = df.dropna(subset=['Category_Encoded'])
     vectorizer = TfidfVectorizer(max_features=100)
-    X_text = vectorizer.fit_transform(df['Merchant']).toarray()
-    y_cat = df['Category_Encoded']
-    
-    X_train_cat, X_test_cat, y_train_cat, y_test_cat = train_test_split(X_text, y_cat, test_size=0.2, random_state=42)
-    
-    clf = RandomForestClassifier(n_estimators=50, random_state=42)
-    clf.fit(X_train_cat, y_train_cat)
-    
-    y_pred_cat = clf.predict(X_test_cat)
-    print(f"Categorization Accuracy: {accuracy_score(y_test_cat, y_pred_cat):.4f}")
-    
-    # Save Model and Vectorizer
-    with open('models/merchant_categorizer.pkl', 'wb') as f:
-        pickle.dump(clf, f)
-    with open('models/merchant_vectorizer.pkl', 'wb') as f:
-        pickle.dump(vectorizer, f)
-
-    # ==========================================
-    # 3. Spending Prediction Model (Random Forest Regressor)
-    # ==========================================
-    print("\nTraining Spending Prediction Model...")
-    # Goal: Predict next month's total spend based on previous months
-    # We need to aggregate data by month first
-    
-    # Create simple features: Month index, and previous month's total
-    monthly_data = df[df['Is_Expense'] == True].groupby('Month')['Amount'].sum().reset_index()
+    features['categorizer'] = {
+        'X': vectorizer.fit_transform(labelled['Merchant'].astype(object).fillna('')).tocsr(),
+        'y': labelled['Category_Encoded'].astype(int).to_numpy(),
+    }
+    features['vectorizer'] = vectorizer
+
+    # 3. Spending prediction: monthly totals with previous month's spend
+    monthly_data = df[df['Is_Expense'] == True].groupby('Month', observed=True)['Amount'].sum().reset_index()
     monthly_data['MonthIndex'] = range(len(monthly_data))
-    
-    # Lag feature: Previous Month Spend
     monthly_data['PrevMonthSpend'] = monthly_data['Amount'].shift(1)
     monthly_data = monthly_data.dropna()
-    
-    X_reg = monthly_data[['MonthIndex', 'PrevMonthSpend']]
-    y_reg = monthly_data['Amount']
-    
-    # If we have enough data, split. 
-    if len(monthly_data) > 5:
-        X_train_reg, X_test_reg, y_train_reg, y_test_reg = train_test_split(X_reg, y_reg, test_size=0.2, shuffle=False)
-        
-        reg = RandomForestRegressor(n_estimators=100, random_state=42)
-        reg.fit(X_train_reg, y_train_reg)
-        
-        y_pred_reg = reg.predict(X_test_reg)
-        rmse = np.sqrt(mean_squared_error(y_test_reg, y_pred_reg))
-        print(f"Spending Prediction RMSE: {rmse:.2f}")
-        
-        # Save Model
-        with open('models/spending_forecaster.pkl', 'wb') as f:
-            pickle.dump(reg, f)
+    features['forecast'] = {
+        'X': monthly_data[['MonthIndex', 'PrevMonthSpend']].to_numpy(dtype=np.float64),
+        'y': monthly_data['Amount'].to_numpy(dtype=np.float64),
+    }
+
+    # 4. Per-category monthly forecaster (served by GET /forecast)
+    X_fc, y_fc = training_set(monthly_totals(df))
+    features['spend_forecaster'] = {'X': X_fc, 'y': y_fc}
+    return features
+
+
+def _cache_paths(fingerprint):
+    base = os.path.join(CACHE_DIR, fingerprint[:16])
+    return base, {
+        'anomaly': os.path.join(base, 'anomaly.npz'),
+        'categorizer_X': os.path.join(base, 'categorizer_X.npz'),
+        'categorizer_y': os.path.join(base, 'categorizer_y.npy'),
+        'vectorizer': os.path.join(base, 'vectorizer.joblib'),
+        'forecast': os.path.join(base, 'forecast.npz'),
+        'spend_forecaster': os.path.join(base, 'spend_forecaster.npz'),
+    }
+
+
+def save_features(fingerprint, features):
+    base, paths = _cache_paths(fingerprint)
+    tmp = base + '.partial'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    tmp_paths = {k: os.path.join(tmp, os.path.basename(p)) for k, p in paths.items()}
+    for name in ('anomaly', 'forecast', 'spend_forecaster'):
+        np.savez(tmp_paths[name], X=features[name]['X'], y=features[name]['y'])
+    sp.save_npz(tmp_paths['categorizer_X'], features['categorizer']['X'])
+    np.save(tmp_paths['categorizer_y'], features['categorizer']['y'])
+    joblib.dump(features['vectorizer'], tmp_paths['vectorizer'])
+    # Only the latest fingerprint is kept
+    if os.path.isdir(CACHE_DIR):
+        for old in os.listdir(CACHE_DIR):
+            if old != os.path.basename(tmp):
+                shutil.rmtree(os.path.join(CACHE_DIR, old), ignore_errors=True)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    os.replace(tmp, base)
+
+
+def load_features(fingerprint):
+    base, paths = _cache_paths(fingerprint)
+    if not os.path.isdir(base):
+        return None
+    features = {}
+    for name in ('anomaly', 'forecast', 'spend_forecaster'):
+        with np.load(paths[name]) as data:
+            features[name] = {'X': data['X'], 'y': data['y']}
+    features['categorizer'] = {'X': sp.load_npz(paths['categorizer_X']).tocsr(),
+                               'y': np.load(paths['categorizer_y'])}
+    features['vectorizer'] = joblib.load(paths['vectorizer'])
+    return features
+
+
+# ==========================================
+# Training tasks (run in worker processes)
+# ==========================================
+
+def train_anomaly(X, y, n_jobs):
+    # Fit on a frame so the model records feature names (the API relies on them)
+    X = pd.DataFrame(X, columns=FEATURES_ANOMALY)
+    # Isolation Forest is unsupervised, but we have labels to check performance
+    iso_forest = IsolationForest(n_estimators=100, contamination=0.02, random_state=42, n_jobs=n_jobs)
+    iso_forest.fit(X)
+
+    # Predict (-1 is anomaly, 1 is normal) and map to 0/1 like 'Is_Anomaly'
+    preds_mapped = (iso_forest.predict(X) == -1).astype(int)
+    log = "Anomaly Detection Report:\n" + classification_report(
+        y, preds_mapped, labels=[0, 1], target_names=['Normal', 'Anomaly'], zero_division=0)
+    return iso_forest, log
+
+
+def train_categorizer(X, y, n_jobs):
+    # Goal: Predict 'Category_Encoded' from the sparse TF-IDF of 'Merchant'
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    clf = RandomForestClassifier(n_estimators=50, random_state=42, n_jobs=n_jobs)
+    clf.fit(X_train, y_train)
+    y_pred = clf.predict(X_test)
+    return clf, f"Categorization Accuracy: {accuracy_score(y_test, y_pred):.4f}"
+
+
+def train_forecast(X, y, n_jobs):
+    # Goal: Predict next month's total spend based on previous months
+    reg = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs)
+    # If we have enough data, split.
+    if len(y) > 5:
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+        reg.fit(X_train, y_train)
+        rmse = np.sqrt(mean_squared_error(y_test, reg.predict(X_test)))
+        return reg, f"Spending Prediction RMSE: {rmse:.2f}"
+    # Train on all available to have something
+    reg.fit(X, y)
+    return reg, "Not enough monthly data for robust regression training (need >5 months)."
+
+
+def train_spend_forecaster(X, y, n_jobs):
+    forecaster = RandomForestRegressor(n_estimators=100, min_samples_leaf=2, random_state=42, n_jobs=n_jobs)
+    forecaster.fit(X, y)
+    return forecaster, f"Monthly category forecaster trained on {len(y)} (category, month, horizon) rows"
+
+
+TASKS = {
+    'anomaly': train_anomaly,
+    'categorizer': train_categorizer,
+    'forecast': train_forecast,
+    'spend_forecaster': train_spend_forecaster,
+}
+
+
+def _run_task(name, X, y, n_jobs):
+    report = {}
+    with Stage(f'train:{name}', report):
+        model, log = TASKS[name](X, y, n_jobs)
+    return name, model, log, report
+
+
+# ==========================================
+# Pipeline
+# ==========================================
+
+def train_models(workers=None, n_jobs=-1, force=False):
+    report = {'stages': {}, 'reused': [], 'trained': []}
+    stages = report['stages']
+    started = time.perf_counter()
+
+    print("Loading data...")
+    with Stage('load', stages):
+        # Compact typed frame: datetime Date, categorical strings, float32 numbers
+        df = get_frame().get().reset_index(drop=True)
+
+    with Stage('features', stages):
+        fingerprint = f"{frame_hash(df)}-v{FEATURE_CACHE_VERSION}"
+        features = None if force else load_features(fingerprint)
+        report['feature_cache'] = 'hit' if features is not None else 'miss'
+        if features is None:
+            features = build_features(df)
+            save_features(fingerprint, features)
+        inputs = {name: _hash_arrays(features[name]['X'], features[name]['y']) for name in TASKS}
+        with open(os.path.join(MODELS_DIR, 'category_encoder.pkl'), 'rb') as f:
+            encoder = pickle.load(f)
+        lookup = build_merchant_lookup(df['Merchant'], df['Category'], labels=encoder.classes_)
+    print(f"Feature cache {report['feature_cache']} ({fingerprint[:16]})")
+
+    # Models whose inputs did not change since the current version are reused
+    previous = ModelRegistry(MODELS_DIR)
+    previous_inputs = previous.manifest.get('inputs', {})
+    trained = {}
+    if not force:
+        for name in TASKS:
+            if previous_inputs.get(name) == inputs[name] and name in previous:
+                trained[name] = previous[name]
+                report['reused'].append(name)
+    pending = [name for name in TASKS if name not in trained]
+
+    if not pending and previous.manifest.get('data_hash') == fingerprint:
+        print(f"\nModels are up to date (version {previous.version}); nothing to train.")
+        report['version'] = previous.version
     else:
-        print("Not enough monthly data for robust regression training (need >5 months).")
-        # Train on all available to have something
-        reg = RandomForestRegressor(n_estimators=100, random_state=42)
-        reg.fit(X_reg, y_reg)
-        with open('models/spending_forecaster.pkl', 'wb') as f:
-            pickle.dump(reg, f)
+        print(f"\nTraining {', '.join(pending) or 'nothing'} in parallel"
+              f"{' (reusing ' + ', '.join(report['reused']) + ')' if report['reused'] else ''}...")
+        with Stage('train', stages), ProcessPoolExecutor(max_workers=workers or len(pending) or 1) as pool:
+            futures = [pool.submit(_run_task, name, features[name]['X'], features[name]['y'], n_jobs)
+                       for name in pending]
+            for future in as_completed(futures):
+                name, model, log, task_report = future.result()
+                trained[name] = model
+                stages.update(task_report)
+                report['trained'].append(name)
+                print(f"\n[{name}] {log}")
+
+        # The API serves these through their array-compiled form; make sure
+        # it reproduces the sklearn outputs before publishing
+        with Stage('compile-check', stages):
+            report['compiled'] = {}
+            for name in COMPILED_MODELS:
+                X = features[name]['X'][:COMPILE_CHECK_ROWS]
+                ok = matches(compile_forest(trained[name]), X)
+                report['compiled'][name] = ok
+                print(f"[{name}] compiled forest {'matches' if ok else 'DOES NOT match'} sklearn "
+                      f"on {X.shape[0]} rows")
+        # The API would serve the compiled form; never publish one that differs
+        mismatched = [name for name, ok in report['compiled'].items() if not ok]
+        if mismatched:
+            raise CompileCheckError(f"compiled forest does not match sklearn for {', '.join(mismatched)}")
+
+        trained['vectorizer'] = features['vectorizer']
+        # Exact-match table the API checks before running the model
+        trained['lookup'] = lookup
+        # The label encoder comes from preprocess_data.py; ship it with the
+        # models whose Category_Encoded values it defines
+        trained['encoder'] = encoder
+
+        with Stage('publish', stages):
+            version = publish(trained, fingerprint, {
+                'anomaly': FEATURES_ANOMALY,
+                'forecast': ['MonthIndex', 'PrevMonthSpend'],
+                'spend_forecaster': FORECAST_FEATURES,
+                'categorizer': {'input': 'Merchant', 'vectorizer': 'tfidf',
+                                'vocabulary_size': len(features['vectorizer'].vocabulary_)},
+                'categories': [str(c) for c in encoder.classes_],
+            }, inputs=inputs)
+        report['version'] = version
+        print(f"\nAll models trained and published to {MODELS_DIR} as version {version}.")
+        print("Running APIs pick it up on POST /models/reload.")
+
+    report['total_wall_s'] = round(time.perf_counter() - started, 3)
+    report['max_rss_mb'] = _max_rss_mb()
+    with open(REPORT_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
 
-    print("\nAll models trained and saved to 'models/' directory.")
+    print(f"\n{'stage':<26}{'wall s':>10}{'peak MB':>10}")
+    for name, s in stages.items():
+        print(f"{name:<26}{s['wall_s']:>10.2f}{s['peak_traced_mb']:>10.1f}")
+    print(f"Report written to {REPORT_PATH}")
+    return report
 
 if __name__ == "__main__":
-    train_models()
+    parser = argparse.ArgumentParser(description="Train and publish the FinMate models.")
+    parser.add_argument("--workers", type=int, default=None, help="training processes (default: one per model)")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="cores per estimator (default: all)")
+    parser.add_argument("--force", action="store_true", help="ignore the feature cache and retrain everything")
+    args = parser.parse_args()
+    try:
+        train_models(workers=args.workers, n_jobs=args.n_jobs, force=args.force)
+    except CompileCheckError as e:
+        sys.exit(f"Not published: {e}")
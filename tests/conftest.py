@@ -0,0 +1,48 @@
+"""
+Test setup: the backend modules read FINMATE_* at import, so the
+environment points them at a scratch data dir (seeded from BASELINE_CSV),
+an empty models dir and the local chat stand-in before anything imports them.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BACKEND_DIR = os.path.join(ROOT, "backend")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+SCRATCH = tempfile.mkdtemp(prefix="finmate-tests-")
+DATA_DIR = os.path.join(SCRATCH, "data")
+os.makedirs(DATA_DIR)
+os.environ["FINMATE_DATA_DIR"] = DATA_DIR
+os.environ["FINMATE_MODELS_DIR"] = os.path.join(SCRATCH, "models")
+os.environ["FINMATE_STORE"] = "sqlite"
+os.environ["FINMATE_CHAT_BACKEND"] = "local"
+os.environ.pop("FINMATE_SHARED_CACHE", None)
+os.environ.pop("FINMATE_WRITER_ADDRESS", None)
+
+# Amounts that pick up noise digits when printed with more precision than they have
+BASELINE_CSV = os.path.join(DATA_DIR, "cleaned_transactions.csv")
+with open(BASELINE_CSV, "w") as f:
+    f.write(
+        "Date,Merchant,Amount,Category,Is_Expense,Month,Is_Anomaly,Description\n"
+        "2025-11-03,Starbucks,780.59,Food,True,2025-11,False,Coffee\n"
+        "2025-11-04,Uber,0.1,Transport,True,2025-11,False,\n"
+        "2025-11-10,Amazon,1234.57,Shopping,True,2025-11,False,Order\n"
+        "2025-11-15,Employer,55000.33,Income,False,2025-11,False,Salary\n"
+        "2025-12-01,Netflix,19.99,Entertainment,True,2025-12,False,\n"
+        "2025-12-02,Rent,12000.0,Housing,True,2025-12,True,Monthly rent\n"
+    )
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
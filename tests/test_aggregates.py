@@ -0,0 +1,73 @@
+import pandas as pd
+
+from aggregates import SpendAggregates
+from sharedcache import SharedCache
+from store import open_store
+
+
+def rows(dates, amounts, categories, expense=None):
+    return pd.DataFrame({"Date": dates, "Merchant": "Shop", "Amount": amounts, "Category": categories,
+                         "Is_Expense": expense or [True] * len(dates),
+                         "Month": [d[:7] for d in dates], "Is_Anomaly": False})
+
+
+def attached(store, shared=None):
+    aggregates = SpendAggregates()
+    aggregates.attach(store, shared=shared)
+    return aggregates
+
+
+def test_appends_fold_to_the_same_totals_as_a_rebuild(tmp_path):
+    store = open_store("sqlite", str(tmp_path))
+    store.append(rows(["2025-10-01", "2025-10-05"], [10.0, 20.0], ["Food", "Transport"]))
+    aggregates = attached(store)
+    first = aggregates.snapshot()
+    assert first["total"] == 30.0 and first["count"] == 2
+
+    store.append(rows(["2025-12-02", "2025-12-03", "2025-12-04"], [5.0, 1000.0, "oops"],
+                      ["Food", "Income", "Food"], expense=[True, False, True]))
+    folded = aggregates.snapshot()
+    assert folded["version"] == store.version()
+    # Income is not an expense and "oops" is not an amount
+    assert folded["total"] == 35.0 and folded["count"] == 3
+    assert folded["by_category"][0] == {"category": "Transport", "total": 20.0, "count": 1}
+    assert folded == attached(store).snapshot()
+
+
+def test_write_from_another_process_triggers_rebuild(tmp_path):
+    store = open_store("sqlite", str(tmp_path))
+    store.append(rows(["2025-10-01"], [10.0], ["Food"]))
+    aggregates = attached(store)
+    assert aggregates.snapshot()["total"] == 10.0
+    # A second handle on the same database does not notify `aggregates`
+    open_store("sqlite", str(tmp_path)).append(rows(["2025-10-02"], [7.0], ["Food"]))
+    assert aggregates.snapshot()["total"] == 17.0
+
+    store.update_column([1], "Category", ["Travel"])
+    categories = {c["category"]: c["total"] for c in aggregates.snapshot()["by_category"]}
+    assert categories == {"Travel": 10.0, "Food": 7.0}
+
+
+def test_monthly_totals_fill_missing_months(tmp_path):
+    store = open_store("sqlite", str(tmp_path))
+    store.append(rows(["2025-09-10", "2025-09-11", "2025-12-01"], [10.0, 5.0, 8.0], ["Food", "Rent", "Food"]))
+    wide = attached(store).monthly_totals()
+    assert [str(m) for m in wide.index] == ["2025-09", "2025-10", "2025-11", "2025-12"]
+    assert wide["Food"].tolist() == [10.0, 0.0, 0.0, 8.0]
+    assert wide.columns.tolist() == ["Food", "Rent"]
+
+
+def test_other_worker_adopts_published_state(tmp_path):
+    shared_path = str(tmp_path / "shared.db")
+    store = open_store("sqlite", str(tmp_path))
+    store.append(rows(["2025-10-01"], [10.0], ["Food"]))
+    publisher = attached(store, SharedCache(shared_path))
+    assert publisher.snapshot()["total"] == 10.0
+
+    other = open_store("sqlite", str(tmp_path))
+    scans = []
+    iter_read = other.iter_read
+    other.iter_read = lambda **kwargs: scans.append(kwargs) or iter_read(**kwargs)
+    adopter = attached(other, SharedCache(shared_path))
+    assert adopter.snapshot()["total"] == 10.0
+    assert scans == []
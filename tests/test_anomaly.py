@@ -0,0 +1,101 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import LabelEncoder
+
+from anomaly import build_features, encode_categories, score_frame
+from registry import LEGACY_FILES, ModelRegistry
+
+CATEGORIES = ["Entertainment", "Food", "Housing", "Income", "Shopping", "Transport"]
+
+
+def fitted():
+    encoder = LabelEncoder().fit(CATEGORIES)
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.gamma(2.0, 50.0, 300), rng.integers(0, 6, 300),
+                         rng.integers(0, 7, 300), np.zeros(300)])
+    X[:, 3] = X[:, 2] >= 5
+    return IsolationForest(n_estimators=25, random_state=0).fit(X), encoder
+
+
+def test_encode_categories():
+    encoder = LabelEncoder().fit(CATEGORIES)
+    encoded = encode_categories(encoder, ["Food", "Travel", "Transport", None])
+    assert encoded.tolist() == [1.0, -1.0, 5.0, -1.0]
+    assert encode_categories(None, ["Food", "Travel"]).tolist() == [0.0, 0.0]
+
+
+def test_build_features_marks_invalid_rows():
+    X, valid = build_features([10.0, "abc", 30.0], ["Food", "Food", "Food"],
+                              ["2025-11-08", "2025-11-09", "not a date"])
+    assert valid.tolist() == [True, False, False]
+    # 2025-11-08 is a Saturday
+    assert X[0].tolist() == [10.0, 0.0, 5.0, 1.0]
+    assert X[1, 0] == 0.0 and X[2, 0] == 0.0
+
+
+def test_score_frame_matches_row_by_row_scoring():
+    model, encoder = fitted()
+    df = pd.DataFrame({"Amount": [12.5, 5000.0, 80.0, 40.0],
+                       "Category": ["Food", "Housing", "Unknown", "Food"],
+                       "Date": ["2025-11-03", "2025-11-08", "2025-11-04", "bad"]})
+    result = score_frame(model, encoder, df)
+    for i in range(3):
+        X, _ = build_features(df["Amount"][i:i + 1], df["Category"][i:i + 1], df["Date"][i:i + 1], encoder)
+        assert result["scores"][i] == model.decision_function(X)[0]
+        assert result["is_anomaly"][i] == (model.predict(X)[0] == -1)
+    assert np.isnan(result["scores"][3]) and result["is_anomaly"][3] is None
+    assert result["valid"].tolist() == [True, True, True, False]
+    assert result["timing"]["rows"] == 4
+
+
+@pytest.fixture
+def anomaly_models(tmp_path, monkeypatch):
+    import main
+
+    model, encoder = fitted()
+    for name, obj in (("anomaly", model), ("encoder", encoder)):
+        with open(tmp_path / LEGACY_FILES[name], "wb") as f:
+            pickle.dump(obj, f)
+    monkeypatch.setattr(main, "MODELS", ModelRegistry(str(tmp_path)))
+    monkeypatch.setattr(main, "ENGINES", {})
+    return model
+
+
+def test_batch_endpoint_without_model_is_503(client):
+    response = client.post("/analyze/anomaly/batch", json={"transactions": []})
+    assert response.status_code == 503
+
+
+def test_batch_endpoint_matches_single_endpoint(client, anomaly_models):
+    transactions = [{"amount": 12.5, "category": "Food", "date": "2025-11-03"},
+                    {"amount": 9000.0, "category": "Housing", "date": "2025-11-08"},
+                    {"amount": 40.0, "category": "Food", "date": "bad"}]
+    result = client.post("/analyze/anomaly/batch", json={"transactions": transactions}).json()
+    assert result["count"] == 3 and result["invalid"] == 1
+    for row, tx in zip(result["results"][:2], transactions):
+        single = client.post("/analyze/anomaly", json=tx).json()
+        assert row["is_anomaly"] == single["is_anomaly"]
+    assert result["results"][2] == {"index": 2, "score": None, "is_anomaly": None}
+    assert result["throughput"]["rows"] == 3
+
+
+def test_batch_endpoint_scores_stored_rows(client, anomaly_models):
+    result = client.post("/analyze/anomaly/batch",
+                         json={"stored": {"start_date": "2025-12-01", "limit": 10}}).json()
+    assert [row["id"] for row in result["results"]] == [5, 6]
+    assert all(isinstance(row["score"], float) for row in result["results"])
+
+
+def test_batch_endpoint_validates_input(client, anomaly_models, monkeypatch):
+    import main
+
+    both = {"transactions": [], "stored": {}}
+    assert client.post("/analyze/anomaly/batch", json=both).status_code == 400
+    assert client.post("/analyze/anomaly/batch", json={}).status_code == 400
+    monkeypatch.setattr(main, "MAX_ANOMALY_BATCH", 1)
+    tx = {"amount": 1.0, "category": "Food", "date": "2025-11-03"}
+    assert client.post("/analyze/anomaly/batch", json={"transactions": [tx, tx]}).status_code == 413
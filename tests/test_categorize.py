@@ -0,0 +1,59 @@
+from sklearn.preprocessing import LabelEncoder
+
+from categorize import MerchantCategorizer, build_merchant_lookup
+
+
+def test_lookup_restricted_to_model_labels():
+    encoder = LabelEncoder().fit(["Food", "Shopping"])
+    categorizer = MerchantCategorizer(encoder=encoder, lookup={"starbucks": "Food", "netflix": "Entertainment"})
+    assert categorizer.categorize("Starbucks") == ("Food", "lookup")
+    # Not a model label: falls through to the (absent) model
+    assert categorizer.categorize("Netflix") == (None, None)
+
+
+def test_build_lookup_with_labels():
+    lookup = build_merchant_lookup(["Starbucks", "Netflix"], ["Food", "Entertainment"], labels=["Food"])
+    assert lookup == {"starbucks": "Food"}
+
+
+def test_lookup_not_derived_from_store(client):
+    import main
+
+    # The test models dir has no lookup artifact; the stored rows must not stand in for one
+    assert main.MODELS.get("lookup") is None
+    assert main.get_categorizer().lookup == {}
+
+
+class RecordingCategorizer(MerchantCategorizer):
+    """Answers every merchant with the model and records what it was asked."""
+
+    has_model = True
+
+    def __init__(self):
+        super().__init__()
+        self.asked = []
+
+    def predict_many(self, keys):
+        self.asked.extend(keys)
+        return ["Shopping"] * len(keys)
+
+    def predict_model(self, key):
+        return self.predict_many([key])[0]
+
+
+def test_blank_merchants_skip_the_model():
+    categorizer = RecordingCategorizer()
+    categories, sources, info = categorizer.categorize_many(["", None, "   ", "--", "Acme Corp"])
+    assert categories == ["Uncategorized"] * 4 + ["Shopping"]
+    assert sources == ["blank"] * 4 + ["model"]
+    assert categorizer.asked == ["acme corp"]
+    assert info["model_rows"] == 1
+    assert categorizer.categorize(" ") == ("Uncategorized", "blank")
+    assert categorizer.asked == ["acme corp"]
+    assert categorizer.stats()["by_source"]["blank"] == 5
+
+
+def test_batch_endpoint_rejects_blank_merchants(client):
+    response = client.post("/categorize/batch", json={"merchants": ["Starbucks", "  ", ""]})
+    assert response.status_code == 400
+    assert "[1, 2]" in response.json()["detail"]
@@ -0,0 +1,99 @@
+import asyncio
+import sqlite3
+import threading
+
+from chat import SAFETY_FALLBACK, ChatGateway, LocalChatBackend, ResponseCache, TokenBucket
+from sharedcache import SharedCache, SharedResponseCache
+
+
+def gateway(cache, backend=None):
+    return ChatGateway(backend or LocalChatBackend(), cache, TokenBucket(rate=1000, capacity=1000, max_queue=100))
+
+
+def collect(stream):
+    async def run():
+        return [piece async for piece in stream]
+    return asyncio.run(run())
+
+
+class RecordingCache(SharedResponseCache):
+    """Notes the thread each SQLite call runs on."""
+
+    def __init__(self, shared):
+        super().__init__(shared)
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return super().get(key)
+
+    def put(self, key, value):
+        self.threads.append(threading.get_ident())
+        super().put(key, value)
+
+
+def test_shared_cache_runs_off_the_event_loop(tmp_path):
+    cache = RecordingCache(SharedCache(str(tmp_path / "cache.db")))
+    chat = gateway(cache)
+    loop_threads = []
+
+    async def run():
+        loop_threads.append(threading.get_ident())
+        first = await chat.generate("USER QUERY: hi", key="k")
+        pieces = [piece async for piece in chat.stream("USER QUERY: hi", key="k")]
+        return first, pieces
+
+    first, pieces = asyncio.run(run())
+    assert pieces == [first]
+    assert chat.hits == 1
+    assert cache.threads and loop_threads[0] not in cache.threads
+
+
+def test_locked_shared_cache_is_a_miss(tmp_path):
+    class LockedCache:
+        def get(self, *args, **kwargs):
+            raise sqlite3.OperationalError("database is locked")
+
+        put = get
+
+    chat = gateway(SharedResponseCache(LockedCache()))
+    text = asyncio.run(chat.generate("USER QUERY: hi", key="k"))
+    assert text.startswith('You asked: "hi"')
+    assert chat.misses == 1
+
+
+class SlowBackend(LocalChatBackend):
+    def __init__(self, reply=None):
+        super().__init__(token_delay=0.01)
+        self.reply = reply
+        self.calls = 0
+
+    def _reply(self, prompt):
+        self.calls += 1
+        return self.reply or super()._reply(prompt)
+
+
+def test_identical_streams_share_one_upstream_call():
+    backend = SlowBackend()
+    chat = gateway(ResponseCache(), backend)
+
+    async def run():
+        return await asyncio.gather(*(asyncio.ensure_future(_join(chat.stream("USER QUERY: hi", key="k")))
+                                      for _ in range(3)))
+
+    texts = asyncio.run(run())
+    assert len(set(texts)) == 1
+    assert backend.calls == 1 and chat.upstream_calls == 1
+    assert chat.coalesced == 2
+    assert chat.cache.get("k") == texts[0]
+
+
+def test_safety_fallback_is_not_cached():
+    chat = gateway(ResponseCache(), SlowBackend(reply=SAFETY_FALLBACK))
+    assert asyncio.run(chat.generate("USER QUERY: hi", key="k")) == SAFETY_FALLBACK
+    assert "".join(collect(chat.stream("USER QUERY: hi", key="k"))) == SAFETY_FALLBACK
+    assert len(chat.cache) == 0 and chat.hits == 0
+
+
+async def _join(stream):
+    return "".join([piece async for piece in stream])
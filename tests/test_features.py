@@ -0,0 +1,107 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+import preprocess_data
+from features import (MAX_WINDOW, ROLLING_COLUMNS, WINDOWS, add_date_features, changed_rows,
+                      context_filter, rolling_features, update_rolling)
+from store import open_store
+
+
+def transactions(rows=120, seed=0, start="2025-01-01", days=90):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, rows), unit="D")
+    return pd.DataFrame({
+        "Date": dates,
+        "Merchant": "Shop",
+        "Amount": rng.uniform(5, 500, rows).round(2),
+        "Category": rng.choice(["Food", "Rent", "Travel"], rows),
+    })
+
+
+def naive_rolling(df):
+    """Row by row: earlier rows (stable order on ties) of the category inside the window."""
+    ordered = df.sort_values(["Category", "Date"], kind="mergesort")
+    out = pd.DataFrame(index=ordered.index, columns=ROLLING_COLUMNS, dtype=float)
+    for category, rows in ordered.groupby("Category", sort=False):
+        for k, (idx, row) in enumerate(rows.iterrows()):
+            seen = rows.iloc[:k + 1]
+            for name, window in WINDOWS.items():
+                amounts = seen.loc[seen["Date"] > row["Date"] - window, "Amount"]
+                out.loc[idx, f"Category_Rolling_Mean_{name}"] = amounts.mean()
+                out.loc[idx, f"Category_Rolling_Std_{name}"] = amounts.std() if len(amounts) > 1 else 0.0
+    return out.reindex(df.index)
+
+
+def test_rolling_features_are_time_windows():
+    df = transactions()
+    np.testing.assert_allclose(rolling_features(df).to_numpy(), naive_rolling(df).to_numpy())
+
+
+def test_rolling_features_skip_undated_rows():
+    df = transactions(rows=5)
+    df["Date"] = df["Date"].astype(object)
+    df.loc[2, "Date"] = None
+    feats = rolling_features(df)
+    assert feats.loc[2].isna().all() and feats.drop(index=2).notna().all().all()
+
+
+def test_add_date_features():
+    df = add_date_features(pd.DataFrame({"Date": pd.to_datetime(["2025-11-08", "2025-11-10"])}))
+    assert df["DayOfWeek"].tolist() == [5, 0]
+    assert df["IsWeekend"].tolist() == [1, 0]
+    assert df["DayOfMonth"].tolist() == [8, 10]
+
+
+def test_update_rolling_matches_full_recompute():
+    history = transactions(rows=150)
+    history[ROLLING_COLUMNS] = rolling_features(history)
+    # Includes back-dated rows that land inside stored windows
+    new = transactions(rows=20, seed=1, start="2025-03-10", days=30)
+    new.index = new.index + len(history)
+
+    filters = context_filter(new)
+    assert filters["start_date"] == (new["Date"].min() - MAX_WINDOW).strftime("%Y-%m-%d")
+    context = history[(history["Date"] >= filters["start_date"]) & history["Category"].isin(filters["categories"])]
+    new_feats, recomputed = update_rolling(context, new)
+
+    full = rolling_features(pd.concat([history, new]))
+    np.testing.assert_allclose(new_feats.to_numpy(), full.loc[new.index].to_numpy())
+    changed = changed_rows(history, recomputed)
+    assert len(changed) > 0
+    np.testing.assert_allclose(changed.to_numpy(), full.loc[changed.index].to_numpy())
+    # Every stored row left alone keeps the value a full recompute gives it
+    untouched = history.index.difference(changed.index)
+    np.testing.assert_allclose(history.loc[untouched, ROLLING_COLUMNS].to_numpy(),
+                               full.loc[untouched].to_numpy())
+
+
+def test_update_rolling_without_context():
+    new = transactions(rows=10)
+    new_feats, recomputed = update_rolling(new.iloc[:0], new)
+    np.testing.assert_allclose(new_feats.to_numpy(), rolling_features(new).to_numpy())
+    assert recomputed.empty
+
+
+def test_append_transactions_matches_full_recompute(tmp_path, monkeypatch):
+    store = open_store("sqlite", str(tmp_path / "data"))
+    monkeypatch.setattr(preprocess_data, "get_store", lambda: store)
+    monkeypatch.setattr(preprocess_data, "MODELS_DIR", str(tmp_path))
+    with open(tmp_path / "category_encoder.pkl", "wb") as f:
+        pickle.dump(LabelEncoder().fit(["Food", "Rent", "Travel"]), f)
+
+    history = transactions(rows=60)
+    raw = tmp_path / "raw.csv"
+    history.assign(Date=history["Date"].dt.strftime("%Y-%m-%d")).to_csv(raw, index=False)
+    preprocess_data.preprocess_data(str(raw))
+    batch = transactions(rows=8, seed=2, start="2025-03-20", days=5)
+    batch_csv = tmp_path / "batch.csv"
+    batch.assign(Date=batch["Date"].dt.strftime("%Y-%m-%d")).to_csv(batch_csv, index=False)
+    preprocess_data.append_transactions(str(batch_csv))
+
+    stored = store.read()
+    assert len(stored) == 68
+    expected = rolling_features(stored.assign(Date=pd.to_datetime(stored["Date"])))
+    np.testing.assert_allclose(stored[ROLLING_COLUMNS].astype(float).to_numpy(), expected.to_numpy())
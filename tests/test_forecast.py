@@ -0,0 +1,49 @@
+import pandas as pd
+
+from forecast import SpendForecaster, complete_months
+
+
+def totals(months, amounts):
+    return pd.DataFrame({"Food": amounts}, index=pd.period_range(months, periods=len(amounts), freq="M"))
+
+
+def test_mid_month_origin_is_last_complete_month():
+    # Data through 2025-12-10: December is a third spent
+    history = totals("2025-09", [300.0, 300.0, 300.0, 100.0])
+    result = SpendForecaster().forecast(None, None, history, horizon=2, today="2025-12-10")
+    assert result["as_of"] == "2025-11"
+    assert [p["month"] for p in result["total"]] == ["2025-12", "2026-01"]
+    # The partial month does not drag the forecast down
+    assert [p["amount"] for p in result["total"]] == [300.0, 300.0]
+
+
+def test_only_partial_month_is_scaled_to_a_full_month():
+    scaled = complete_months(totals("2025-12", [100.0]), today="2025-12-10")
+    assert scaled.index[-1] == pd.Period("2025-12", "M")
+    assert scaled["Food"].iloc[0] == 310.0
+
+
+def test_forecast_endpoint_skips_current_month(client):
+    # The test data ends in 2025-12, a complete month by now
+    result = client.get("/forecast", params={"horizon": 1}).json()
+    assert result["as_of"] == "2025-12"
+
+
+def test_forecast_unknown_category_is_404(client):
+    response = client.get("/forecast", params={"category": "Nope"})
+    assert response.status_code == 404 and "Nope" in response.json()["detail"]
+    assert client.get("/forecast", params={"category": "Food"}).status_code == 200
+
+
+def test_forecast_internal_key_error_is_500(client, monkeypatch):
+    import main
+
+    def broken(*args, **kwargs):
+        raise KeyError("amounts")
+
+    monkeypatch.setattr(main.SPEND_FORECASTER, "forecast", broken)
+    from fastapi.testclient import TestClient
+
+    # Started by the `client` fixture; without `with`, no second startup
+    c = TestClient(main.app, raise_server_exceptions=False)
+    assert c.get("/forecast", params={"category": "Food"}).status_code == 500
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.ensemble import IsolationForest, RandomForestClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from forest import compile_forest, matches
+
+MERCHANTS = ["starbucks coffee", "uber trip", "amazon market", "netflix monthly", "shell fuel",
+             "costa coffee", "lyft ride", "walmart store", "spotify premium", "bp fuel station"]
+LABELS = ["Food", "Transport", "Shopping", "Entertainment", "Transport"] * 2
+
+
+class NoDenseCSR(sparse.csr_matrix):
+    def toarray(self, *args, **kwargs):
+        raise AssertionError("sparse input was densified")
+
+
+@pytest.fixture(scope="module")
+def categorizer():
+    vectorizer = TfidfVectorizer().fit(MERCHANTS)
+    model = RandomForestClassifier(n_estimators=15, random_state=0).fit(vectorizer.transform(MERCHANTS), LABELS)
+    return vectorizer, model, compile_forest(model)
+
+
+def test_classifier_matches_sklearn_on_sparse_rows(categorizer):
+    vectorizer, model, compiled = categorizer
+    queries = MERCHANTS + ["coffee uber", "unknown merchant", "", "fuel fuel amazon"]
+    X = vectorizer.transform(queries)
+    proba = compiled.predict_proba(NoDenseCSR(X))
+    assert np.array_equal(proba, model.predict_proba(X))
+    assert np.array_equal(proba, compiled.predict_proba(X.toarray()))
+    assert list(compiled.predict(NoDenseCSR(X))) == list(model.predict(X))
+    assert matches(compiled, X)
+
+
+def test_classifier_sparse_input_without_canonical_format(categorizer):
+    vectorizer, model, compiled = categorizer
+    X = vectorizer.transform(["starbucks uber", "netflix fuel"])
+    # Every entry split in two halves, listed in reverse within the row
+    data, indices, indptr = [], [], [0]
+    for r in range(X.shape[0]):
+        row = X.getrow(r)
+        halves = np.r_[row.data, row.data][::-1] / 2
+        data.extend(halves)
+        indices.extend(np.r_[row.indices, row.indices][::-1])
+        indptr.append(len(data))
+    messy = sparse.csr_matrix((data, indices, indptr), shape=X.shape)
+    assert not messy.has_canonical_format
+    assert np.array_equal(compiled.predict_proba(messy), model.predict_proba(X))
+
+
+def test_isolation_forest_matches_sklearn():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 3))
+    model = IsolationForest(n_estimators=20, random_state=0).fit(X)
+    compiled = compile_forest(model)
+    assert np.array_equal(compiled.score_samples(X[:50]), model.score_samples(X[:50]))
+    assert matches(compiled, X)
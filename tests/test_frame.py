@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from frame import SharedFrame, compact_frame
+from store import open_store
+
+
+def rows(n, start=0):
+    return pd.DataFrame({
+        "Date": [f"2025-11-{1 + (start + i) % 28:02d}" for i in range(n)],
+        "Merchant": ["Starbucks", "Uber"] * (n // 2) + ["Starbucks"] * (n % 2),
+        "Amount": np.arange(start, start + n, dtype=float) + 0.5,
+        "Category": "Food",
+        "Is_Expense": True,
+        "Month": "2025-11",
+        "Is_Anomaly": False,
+    })
+
+
+def test_compact_frame_dtypes():
+    df = compact_frame(rows(10).assign(Score=np.arange(10), Ratio=np.linspace(0, 1, 10)))
+    assert df["Date"].dtype == "datetime64[ns]"
+    assert isinstance(df["Merchant"].dtype, pd.CategoricalDtype)
+    assert df["Amount"].dtype == np.float32
+    assert df["Is_Expense"].dtype == bool
+    assert df["Score"].dtype == np.int8
+    assert df["Ratio"].dtype == np.float32
+
+
+def test_shared_frame_extends_on_append_and_reloads_on_update(tmp_path):
+    store = open_store("sqlite", str(tmp_path))
+    store.append(rows(4))
+    frame = SharedFrame(store)
+    assert len(frame.get()) == 4 and frame.loads == 1
+
+    store.append(rows(2, start=4))
+    df = frame.get()
+    assert len(df) == 6 and frame.loads == 1 and frame.extends == 1
+    assert isinstance(df["Merchant"].dtype, pd.CategoricalDtype)
+
+    store.update_column([int(df.index[0])], "Category", ["Travel"])
+    assert frame.get()["Category"].iloc[0] == "Travel"
+    assert frame.loads == 2
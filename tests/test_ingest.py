@@ -0,0 +1,99 @@
+import io
+import threading
+import time
+
+import pytest
+
+from ingest import QueueReader, ingest_csv
+from store import open_store
+
+CSV = (
+    "Date,Merchant,Amount,Category\n"
+    "2025-11-03,Starbucks,\"₹1,200.50\",Food\n"
+    "2025-11-04,Uber,300,Transport\n"
+    "not a date,Ghost,10,Food\n"
+    "2025-11-06,,45,\n"
+    "2025-11-07,Amazon,999,Shopping\n"
+)
+
+
+def test_ingest_csv_in_chunks(tmp_path):
+    store = open_store("sqlite", str(tmp_path))
+    progress = []
+    stats = ingest_csv(io.BytesIO(CSV.encode()), store, None, None, chunk_rows=2,
+                       on_progress=progress.append)
+    assert stats["accepted"] == 4 and stats["rejected"] == 1 and stats["chunks"] == 3
+    assert stats["anomalies"] == 0 and stats["bytes_read"] == len(CSV.encode())
+    assert [p["accepted"] for p in progress] == [2, 3, 4]
+    df = store.read()
+    assert df["Amount"].tolist() == [1200.5, 300.0, 45.0, 999.0]
+    assert df["Merchant"].tolist()[2] == "Unknown" and df["Category"].tolist()[2] == "Uncategorized"
+    assert df["Month"].unique().tolist() == ["2025-11"]
+
+
+def test_ingest_from_queue_reader(tmp_path):
+    store = open_store("sqlite", str(tmp_path))
+    reader = QueueReader(maxsize=2)
+    data = CSV.encode()
+
+    def produce():
+        for i in range(0, len(data), 7):
+            reader.feed(data[i:i + 7])
+        reader.feed(None)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    stats = ingest_csv(reader, store, None, None, chunk_rows=2)
+    producer.join(5)
+    assert stats["accepted"] == 4 and reader.tell() == len(data)
+
+
+def test_abandoned_reader_unblocks_producer():
+    reader = QueueReader(maxsize=1)
+    reader.feed(b"Date\n")
+    done = threading.Event()
+    threading.Thread(target=lambda: (reader.feed(b"more"), done.set()), daemon=True).start()
+    time.sleep(0.2)
+    assert not done.is_set()
+    reader.abandon()
+    assert done.wait(2)
+
+
+def test_stream_upload_reports_job(client):
+    response = client.post("/upload/stream", params={"user_id": "ingest-stream", "job_id": "stream-1"},
+                           content=CSV.encode(), headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["job_id"] == "stream-1" and body["count"] == 4 and body["rejected"] == 1
+    job = client.get("/upload/jobs/stream-1").json()
+    assert job["status"] == "completed" and job["progress"] == 1.0
+    assert client.post("/upload/stream", params={"job_id": "stream-1"}, content=b"").status_code == 409
+    rows = client.get("/transactions", params={"user_id": "ingest-stream"}).json()
+    assert len(rows) == 4
+
+
+def test_stream_upload_rejects_empty_body(client):
+    response = client.post("/upload/stream", params={"user_id": "ingest-empty"}, content=b"")
+    assert response.status_code == 400
+
+
+def test_large_upload_runs_as_background_job(client, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "INLINE_UPLOAD_BYTES", 10)
+    response = client.post("/upload", params={"user_id": "ingest-job"},
+                           files={"file": ("tx.csv", CSV.encode(), "text/csv")})
+    assert response.status_code == 202
+    status_url = response.json()["status_url"]
+    for _ in range(100):
+        job = client.get(status_url).json()
+        if job["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.05)
+    assert job["status"] == "completed" and job["accepted"] == 4
+
+
+@pytest.mark.parametrize("user_id", ["../etc", "a b"])
+def test_upload_rejects_bad_user_id(client, user_id):
+    response = client.post("/upload/stream", params={"user_id": user_id}, content=CSV.encode())
+    assert response.status_code == 400
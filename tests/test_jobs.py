@@ -0,0 +1,102 @@
+import threading
+import time
+from multiprocessing import get_context
+
+import pandas as pd
+
+from categorize import CategoryBackfill
+from ingest import JOB_NAMESPACE, IngestJobs
+from sharedcache import SharedCache
+
+
+def dead_pid():
+    process = get_context("fork").Process(target=lambda: None)
+    process.start()
+    process.join()
+    return process.pid
+
+
+def test_job_status_visible_from_other_workers(tmp_path):
+    path = str(tmp_path / "shared.db")
+    here, there = IngestJobs(shared=SharedCache(path)), IngestJobs(shared=SharedCache(path))
+    job_id = here.create(bytes_total=100)
+    here.update(job_id, status="running", bytes_read=50)
+    job = there.get(job_id)
+    assert job["status"] == "running" and job["progress"] == 0.5
+    assert there.get("missing") is None
+
+
+def test_job_of_exited_worker_is_failed(tmp_path):
+    shared = SharedCache(str(tmp_path / "shared.db"))
+    jobs = IngestJobs(shared=shared)
+    job_id = IngestJobs(shared=shared).create()
+    job = shared.get(JOB_NAMESPACE, job_id)
+    shared.put(JOB_NAMESPACE, job_id, {**job, "status": "running", "pid": dead_pid()})
+    assert jobs.get(job_id)["status"] == "failed"
+
+
+def test_finished_jobs_are_pruned():
+    jobs = IngestJobs(ttl=60, max_jobs=3)
+    old = jobs.create()
+    jobs.update(old, status="completed", finished_at=time.time() - 120)
+    running = jobs.create()
+    jobs.update(running, status="running")
+    jobs.create()
+    # Past the TTL
+    assert jobs.get(old) is None
+    done = []
+    for _ in range(3):
+        done.append(jobs.create())
+        jobs.update(done[-1], status="failed", finished_at=time.time())
+    # Over the cap the oldest finished go; the running job stays
+    assert len(jobs._jobs) == 3
+    assert jobs.get(running)["status"] == "running"
+    assert jobs.get(done[0]) is None and jobs.get(done[-1]) is not None
+
+
+class SlowStore:
+    """One chunk of uncategorized rows, released when `go` is set."""
+
+    def __init__(self):
+        self.go = threading.Event()
+        self.reads = 0
+        self.updates = []
+
+    def read(self, columns=None, categories=None, after_id=None, limit=None):
+        self.go.wait(10)
+        self.reads += 1
+        if after_id is not None:
+            return pd.DataFrame({"Merchant": []})
+        return pd.DataFrame({"Merchant": ["Starbucks", "Uber"]}, index=[1, 2])
+
+    def update_column(self, ids, column, values):
+        self.updates.append((list(ids), column, list(values)))
+        return len(values)
+
+
+class FakeCategorizer:
+    has_model = True
+
+    def categorize_many(self, texts):
+        return ["Food"] * len(texts), None, None
+
+
+def test_backfill_runs_once_across_workers(tmp_path):
+    path = str(tmp_path / "shared.db")
+    checkpoint = str(tmp_path / "category_backfill.json")
+    first = CategoryBackfill(checkpoint, chunk_rows=10, shared=SharedCache(path))
+    second = CategoryBackfill(checkpoint, chunk_rows=10, shared=SharedCache(path))
+    store = SlowStore()
+
+    assert first.start(store, FakeCategorizer())
+    # Another worker: refused while the first run holds the lock, but sees it
+    assert not second.start(store, FakeCategorizer())
+    assert second.get()["status"] in ("queued", "running")
+
+    store.go.set()
+    first._thread.join(10)
+    assert store.updates == [([1, 2], "Category", ["Food", "Food"])]
+    assert second.get()["status"] == "completed" and second.get()["updated"] == 2
+    # The lock is released with the run
+    assert second.start(store, FakeCategorizer())
+    second._thread.join(10)
@@ -0,0 +1,101 @@
+from multiprocessing import get_context
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from metrics import Metrics, MetricsMiddleware, span, record_stage
+from sharedcache import SharedCache
+
+
+def sample(text, name):
+    for line in text.splitlines():
+        if line.startswith(name + " ") or line.startswith(name + "{"):
+            return line
+    return None
+
+
+def test_render_counts_requests_and_stages():
+    metrics = Metrics()
+    metrics.observe_request("GET", "/summary", 200, 0.003, {"aggregate": 0.002})
+    metrics.observe_request("GET", "/summary", 500, 0.2)
+    text = metrics.render()
+    assert 'finmate_http_requests_total{method="GET",route="/summary",status="200"} 1' in text
+    assert 'finmate_http_request_errors_total{method="GET",route="/summary"} 1' in text
+    assert 'finmate_http_request_duration_seconds_bucket{method="GET",route="/summary",le="0.005"} 1' in text
+    assert 'finmate_http_request_duration_seconds_count{method="GET",route="/summary"} 2' in text
+    assert 'finmate_stage_duration_seconds_count{route="/summary",stage="aggregate"} 1' in text
+
+
+def test_spans_outside_a_request_are_background():
+    import metrics as metrics_module
+
+    with span("backfill"):
+        pass
+    record_stage("backfill", 0.01)
+    assert metrics_module.METRICS.stages[("background", "backfill")].count == 2
+
+
+def _worker(path):
+    metrics = Metrics()
+    metrics.share(SharedCache(path))
+    for _ in range(3):
+        metrics.observe_request("GET", "/summary", 200, 0.01)
+    metrics.in_flight = 5
+    metrics._publish()
+
+
+def test_shared_metrics_sum_over_workers(tmp_path):
+    path = str(tmp_path / "shared.db")
+    worker = get_context("fork").Process(target=_worker, args=(path,))
+    worker.start()
+    worker.join()
+
+    metrics = Metrics()
+    metrics.share(SharedCache(path))
+    metrics.observe_request("GET", "/summary", 200, 0.01)
+    text = metrics.render()
+    # Counters of the exited worker still count; its in-flight gauge does not
+    assert 'finmate_http_requests_total{method="GET",route="/summary",status="200"} 4' in text
+    assert 'finmate_http_request_duration_seconds_count{method="GET",route="/summary"} 4' in text
+    assert sample(text, "finmate_http_requests_in_flight") == "finmate_http_requests_in_flight 0"
+
+
+def test_middleware_labels_routes_and_stages():
+    metrics = Metrics()
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        with span("lookup"):
+            pass
+        return {"id": item_id}
+
+    @app.get("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    client = TestClient(app, raise_server_exceptions=False)
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/nowhere")
+    assert client.get("/boom").status_code == 500
+    text = metrics.render()
+    # One series per route template, not per URL
+    assert 'finmate_http_requests_total{method="GET",route="/items/{item_id}",status="200"} 2' in text
+    assert 'finmate_http_requests_total{method="GET",route="unmatched",status="404"} 1' in text
+    assert 'finmate_http_request_errors_total{method="GET",route="/boom"} 1' in text
+    assert 'finmate_stage_duration_seconds_count{route="/items/{item_id}",stage="lookup"} 2' in text
+    assert sample(text, "finmate_http_requests_in_flight") == "finmate_http_requests_in_flight 0"
+
+
+def test_metrics_endpoint(client):
+    client.get("/transactions", params={"limit": 1})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    text = response.text
+    assert 'route="/transactions",status="200"' in text
+    assert 'finmate_stage_duration_seconds_count{route="/transactions",stage="store_read"}' in text
+    assert sample(text, "finmate_ready") is not None
+    assert "finmate_tenants_open" in text
@@ -0,0 +1,53 @@
+import math
+
+import pandas as pd
+import pytest
+
+from normalize import detect_layout, infer_date_format, parse_amounts, parse_dates
+
+
+@pytest.mark.parametrize("text, amount", [
+    ("500DR", -500.0),
+    ("1,234.00Dr", -1234.0),
+    ("500 DR", -500.0),
+    ("75.5 dr.", -75.5),
+    ("12cr", 12.0),
+    ("₹1,200 CR", 1200.0),
+    ("Rs. 2,500.50", 2500.5),
+    ("(20)", -20.0),
+    ("$-7", -7.0),
+])
+def test_parse_amounts(text, amount):
+    assert parse_amounts(pd.Series([text])).tolist() == [amount]
+
+
+def test_parse_amounts_unparseable_is_nan():
+    values = parse_amounts(pd.Series(["n/a", None, "DR"])).tolist()
+    assert all(math.isnan(v) for v in values)
+
+
+def test_parse_amounts_decimal_comma():
+    values = parse_amounts(pd.Series(["1.234,56", "12,50", "€ 3.000,00 DR"]))
+    assert values.tolist() == [1234.56, 12.5, -3000.0]
+
+
+def test_parse_amounts_numeric_passthrough():
+    assert parse_amounts(pd.Series([1, 2.5])).tolist() == [1.0, 2.5]
+
+
+def test_detect_layout_swapped_columns():
+    df = pd.DataFrame({"Date": ["03/11/2025", "15/11/2025"], "Merchant": ["A", "B"],
+                       "Category": ["1,200.00", "35 DR"], "Amount": ["Food", "Fuel"]})
+    # Merchant present: no swap check needed
+    assert not detect_layout(df)["swap"]
+    layout = detect_layout(df.drop(columns=["Merchant"]))
+    assert layout["swap"]
+    assert layout["date_format"] == "%d/%m/%Y"
+
+
+def test_parse_dates_day_first_and_stragglers():
+    series = pd.Series(["03/11/2025", "15/11/2025", "2025-12-01", None])
+    assert infer_date_format(series.iloc[:2]) == "%d/%m/%Y"
+    parsed = parse_dates(series, "%d/%m/%Y")
+    assert parsed.iloc[:3].dt.strftime("%Y-%m-%d").tolist() == ["2025-11-03", "2025-11-15", "2025-12-01"]
+    assert pd.isna(parsed.iloc[3])
@@ -0,0 +1,33 @@
+import json
+import os
+
+import pytest
+
+from registry import ModelRegistry, version_dir
+
+
+@pytest.mark.parametrize("version", ["..", "../models", "../../etc", "a/../../b", "v1/..", ".", "x..y"])
+def test_reload_rejects_traversal(client, version):
+    response = client.post("/models/reload", params={"version": version})
+    assert response.status_code == 400
+
+
+def test_reload_unknown_version(client):
+    response = client.post("/models/reload", params={"version": "20990101-000000-deadbeef"})
+    assert response.status_code == 404
+
+
+def test_version_dir_stays_under_models_dir(tmp_path):
+    models_dir = tmp_path / "models"
+    models_dir.mkdir()
+    # A manifest one level up must not be reachable by name
+    outside = tmp_path / "evil"
+    outside.mkdir()
+    (outside / "manifest.json").write_text(json.dumps({"version": "evil", "files": {}}))
+    os.symlink(outside, models_dir / "linked")
+    with pytest.raises(ValueError):
+        version_dir(str(models_dir), "linked")
+    with pytest.raises(ValueError):
+        ModelRegistry(str(models_dir)).reload("../evil")
+    assert version_dir(str(models_dir), "20250101-000000-abc.1") == os.path.join(
+        os.path.realpath(models_dir), "20250101-000000-abc.1")
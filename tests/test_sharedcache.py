@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import time
+from multiprocessing import get_context
+
+import pytest
+
+import server
+from sharedcache import SharedCache, SharedResponseCache, pid_alive
+
+
+def _put_from_child(path):
+    SharedCache(path).put("aggregates", "store", {"total": 42}, version=3)
+
+
+def test_entries_are_shared_between_processes(tmp_path):
+    path = str(tmp_path / "shared.db")
+    cache = SharedCache(path)
+    child = get_context("fork").Process(target=_put_from_child, args=(path,))
+    child.start()
+    child.join()
+    assert cache.get_versioned("aggregates", "store") == (3, {"total": 42})
+    assert cache.get("aggregates", "missing") is None
+
+
+def test_versioned_put_never_goes_backwards(tmp_path):
+    cache = SharedCache(str(tmp_path / "shared.db"))
+    cache.put("aggregates", "store", "v5", version=5)
+    cache.put("aggregates", "store", "v4", version=4)
+    assert cache.get_versioned("aggregates", "store") == (5, "v5")
+    cache.put("aggregates", "store", "v6", version=6)
+    assert cache.get("aggregates", "store") == "v6"
+    # Unversioned entries are simply replaced
+    cache.put("chat", "q", "a1")
+    cache.put("chat", "q", "a2")
+    assert cache.get("chat", "q") == "a2"
+
+
+def test_expired_and_excess_entries_go(tmp_path):
+    cache = SharedCache(str(tmp_path / "shared.db"), maxsize=3)
+    cache.put("jobs", "old", 1, ttl=-1)
+    cache.put("jobs", "live", 2, ttl=60)
+    assert cache.get("jobs", "old") is None
+    assert cache.items("jobs") == [("live", 2)]
+    for i in range(4):
+        cache.put("chat", str(i), i)
+        time.sleep(0.001)
+    cache.prune()
+    assert cache.count() == 3
+    assert cache.count("jobs") == 0
+    assert sorted(key for key, _ in cache.items("chat")) == ["1", "2", "3"]
+
+
+def test_pid_alive():
+    assert pid_alive(os.getpid())
+    child = get_context("fork").Process(target=lambda: None)
+    child.start()
+    child.join()
+    assert not pid_alive(child.pid)
+
+
+def test_response_cache_treats_errors_as_misses(tmp_path, monkeypatch):
+    responses = SharedResponseCache(SharedCache(str(tmp_path / "shared.db")), ttl=60)
+    responses.put("prompt", "answer")
+    assert responses.get("prompt") == "answer" and len(responses) == 1
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(responses.shared, "get", locked)
+    monkeypatch.setattr(responses.shared, "put", locked)
+    assert responses.get("prompt") is None
+    responses.put("other", "answer")
+
+
+def test_server_reports_writer_that_exits(tmp_path):
+    process = get_context("fork").Process(target=os._exit, args=(3,))
+    process.start()
+    process.join()
+    with pytest.raises(RuntimeError, match="code 3"):
+        server._wait_for_writer(process, str(tmp_path / "writer.sock"), b"key")
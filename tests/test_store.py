@@ -0,0 +1,188 @@
+import glob
+import os
+
+import pandas as pd
+import pytest
+
+from store import HAS_PYARROW, ParquetStore, open_store
+
+if HAS_PYARROW:
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+needs_pyarrow = pytest.mark.skipif(not HAS_PYARROW, reason="pyarrow not installed")
+BACKENDS = ["sqlite", "segments", pytest.param("parquet", marks=needs_pyarrow)]
+COLUMNS = ["Date", "Merchant", "Amount", "Category", "Is_Expense", "Month", "Is_Anomaly"]
+
+
+def row(i, month="2025-11"):
+    return pd.DataFrame({"Date": [f"{month}-{1 + i % 28:02d}"], "Merchant": [f"Shop {i}"],
+                         "Amount": [10.0 + i], "Category": ["Food"], "Is_Expense": [True],
+                         "Month": [month], "Is_Anomaly": [False]})
+
+
+def sample():
+    return pd.DataFrame({
+        "Date": ["2025-10-30", "2025-11-02", "2025-11-15", "2025-12-01", "2025-12-24"],
+        "Merchant": ["Uber", "Starbucks", "Amazon", "Starbucks", "Apple Store"],
+        "Amount": [5.0, 3.5, 120.0, 4.25, 999.0],
+        "Category": ["Transport", "Food", "Shopping", "Food", "Shopping"],
+        "Is_Expense": [True, True, True, True, True],
+        "Month": ["2025-10", "2025-11", "2025-11", "2025-12", "2025-12"],
+        "Is_Anomaly": [False, False, False, False, True],
+    })
+
+
+@pytest.fixture(params=BACKENDS)
+def store(request, tmp_path):
+    store = open_store(request.param, str(tmp_path))
+    store.append(sample())
+    return store
+
+
+def part_files(directory, month="*"):
+    return glob.glob(os.path.join(directory, f"month={month}", "part-*.parquet"))
+
+
+@needs_pyarrow
+def test_parquet_single_row_appends_are_compacted(tmp_path):
+    store = ParquetStore(str(tmp_path), compact_files=4)
+    for i in range(25):
+        store.append(row(i))
+    store.append(row(25, month="2025-12"))
+    assert len(part_files(str(tmp_path), "2025-11")) < 4
+    df = store.read()
+    assert df.index.tolist() == list(range(1, 27))
+    assert df["Merchant"].tolist() == [f"Shop {i}" for i in range(26)]
+    assert store.count() == 26
+    assert store.read(months=["2025-12"])["Amount"].tolist() == [35.0]
+
+
+@needs_pyarrow
+def test_parquet_compaction_survives_leftover_parts(tmp_path):
+    store = ParquetStore(str(tmp_path), compact_files=3)
+    for i in range(3):
+        store.append(row(i))
+    merged = part_files(str(tmp_path))
+    assert len(merged) == 1
+    # A compaction interrupted before removing its parts leaves rows twice
+    leftover = os.path.join(os.path.dirname(merged[0]), "part-000000000002-000000000002.parquet")
+    table = pq.read_table(merged[0], partitioning=None)
+    pq.write_table(table.filter(pc.equal(table["id"], 2)), leftover)
+    store = ParquetStore(str(tmp_path), compact_files=3)
+    assert store.read().index.tolist() == [1, 2, 3]
+    for i in range(3, 5):
+        store.append(row(i))
+    assert store.read().index.tolist() == [1, 2, 3, 4, 5]
+    # The next compaction merged the leftover away
+    assert len(part_files(str(tmp_path))) == 2
+    assert store.count() == 5
+
+
+def test_append_and_read_round_trip(store):
+    df = store.read(columns=COLUMNS)
+    assert df.index.tolist() == [1, 2, 3, 4, 5]
+    pd.testing.assert_frame_equal(df.reset_index(drop=True), sample())
+    assert store.count() == 5 and not store.is_empty()
+    assert store.append(sample().iloc[:2]) == 2
+    assert store.read(columns=["Merchant"]).index.tolist() == list(range(1, 8))
+
+
+def test_read_filters(store):
+    ids = lambda **filters: store.read(columns=["Amount"], **filters).index.tolist()  # noqa: E731
+    assert ids(start_date="2025-11-02", end_date="2025-12-01") == [2, 3, 4]
+    assert ids(months=["2025-12"]) == [4, 5]
+    assert ids(categories=["Food"]) == [2, 4]
+    assert ids(merchants=["Starbucks", "Uber"]) == [1, 2, 4]
+    assert ids(min_amount=5.0, max_amount=120.0) == [1, 3]
+    assert ids(is_anomaly=True) == [5]
+    assert ids(after_id=3) == [4, 5]
+    assert ids(limit=2, offset=1) == [2, 3]
+    assert ids(categories=["Food"], months=["2025-11"]) == [2]
+    assert ids(categories=["Travel"]) == []
+
+
+def test_iter_read_chunks(store):
+    chunks = list(store.iter_read(chunk_size=2))
+    assert [chunk.index.tolist() for chunk in chunks] == [[1, 2], [3, 4], [5]]
+    chunks = list(store.iter_read(chunk_size=2, limit=3, categories=["Food", "Shopping"]))
+    assert [chunk.index.tolist() for chunk in chunks] == [[2, 3], [4]]
+
+
+def test_update_column_bumps_version_and_notifies(store):
+    seen = []
+    store.subscribe(lambda df, version: seen.append((df, version)))
+    before = store.version()
+    assert store.update_column([2, 4], "Category", ["Coffee", "Coffee"]) == 2
+    assert store.read(categories=["Coffee"]).index.tolist() == [2, 4]
+    assert store.version() > before
+    assert seen == [(None, store.version())]
+
+    store.append(sample().iloc[:1])
+    df, version = seen[-1]
+    assert df["Merchant"].tolist() == ["Uber"] and version == store.version()
+
+
+def test_seed_only_when_empty(store, tmp_path):
+    assert store.seed(sample()) == 0
+    assert store.count() == 5
+    assert store.replace(sample().iloc[:2]) == 2
+    assert store.read(columns=["Merchant"])["Merchant"].tolist() == ["Uber", "Starbucks"]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_open_store_seeds_from_legacy_csv(backend, tmp_path):
+    sample().to_csv(tmp_path / "cleaned_transactions.csv", index=False)
+    store = open_store(backend, str(tmp_path))
+    assert store.count() == 5
+    # Not seeded twice
+    assert open_store(backend, str(tmp_path)).count() == 5
+    assert store.read_frame(columns=["Date", "Amount"])["Date"].dtype == "datetime64[ns]"
+
+
+def test_open_store_unknown_backend(tmp_path):
+    with pytest.raises(ValueError):
+        open_store("mongodb", str(tmp_path))
+
+
+@needs_pyarrow
+def test_parquet_files_are_typed_and_partitioned(tmp_path):
+    store = ParquetStore(str(tmp_path))
+    store.append(sample())
+    assert sorted(os.path.basename(os.path.dirname(p)) for p in part_files(str(tmp_path))) == [
+        "month=2025-10", "month=2025-11", "month=2025-12"]
+    schema = pq.read_schema(part_files(str(tmp_path), "2025-11")[0])
+    assert str(schema.field("Date").type) == "timestamp[ms]"
+    assert str(schema.field("Amount").type) == "float"
+    assert str(schema.field("Is_Anomaly").type) == "bool"
+    assert schema.field("Merchant").type.value_type == "string"
+    frame = store.read_frame(columns=["Date", "Merchant", "Amount", "Is_Anomaly"])
+    assert frame["Date"].dtype == "datetime64[ns]" and frame["Amount"].dtype == "float32"
+    assert isinstance(frame["Merchant"].dtype, pd.CategoricalDtype)
+
+
+@needs_pyarrow
+def test_parquet_reads_across_months(tmp_path):
+    store = ParquetStore(str(tmp_path))
+    # One append interleaves ids across month files
+    store.append(sample().sort_values("Amount"))
+    assert store.read(columns=["Amount"], limit=2).index.tolist() == [1, 2]
+    # Bounds equal to a float32-stored amount still match it
+    assert store.read(min_amount=4.25, max_amount=4.25)["Amount"].tolist() == [4.25]
+
+
+@needs_pyarrow
+def test_parquet_update_rewrites_only_touched_files(tmp_path):
+    store = ParquetStore(str(tmp_path))
+    store.append(sample())
+    before = {p: os.path.getmtime(p) for p in part_files(str(tmp_path))}
+    october = part_files(str(tmp_path), "2025-10")[0]
+    os.utime(october, (0, 0))
+    assert store.update_column([4], "Category", ["Coffee"]) == 1
+    assert os.path.getmtime(october) == 0
+    assert set(part_files(str(tmp_path))) == set(before)
+    # A new Date moves the row to its month's partition
+    store.update_column([1], "Date", ["2025-12-31"])
+    assert part_files(str(tmp_path), "2025-10") == []
+    assert store.read(start_date="2025-12-01", columns=["Category"]).index.tolist() == [1, 4, 5]
+    assert store.read(columns=["Date"]).loc[1, "Date"] == "2025-12-31"
@@ -0,0 +1,99 @@
+import pandas as pd
+import pytest
+
+import tenants
+from store import open_store
+from tenants import TenantRegistry, validate_user_id
+
+
+def rows(merchants, users=None):
+    df = pd.DataFrame({"Date": "2025-11-03", "Merchant": merchants, "Amount": 10.0, "Category": "Food",
+                       "Is_Expense": True, "Month": "2025-11", "Is_Anomaly": False})
+    if users is not None:
+        df["User_Id"] = users
+    return df
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    default = open_store("sqlite", str(tmp_path / "default"))
+    monkeypatch.setattr(tenants, "get_store", lambda: default)
+    return TenantRegistry(str(tmp_path / "users"), backend="sqlite", max_open=2)
+
+
+@pytest.mark.parametrize("user_id", ["alice", "u-42", "A.b_c", " bob ", 7])
+def test_valid_user_ids(user_id):
+    assert validate_user_id(user_id) == str(user_id).strip()
+
+
+@pytest.mark.parametrize("user_id", ["", "..", "../alice", "a/b", ".hidden", "a b", "x" * 65])
+def test_invalid_user_ids(user_id):
+    with pytest.raises(ValueError):
+        validate_user_id(user_id)
+
+
+def test_users_get_separate_partitions(registry, tmp_path):
+    registry.get("alice").store.append(rows(["Starbucks"]))
+    registry.get("bob").store.append(rows(["Uber", "Amazon"]))
+    assert registry.get("alice").store.count() == 1
+    assert registry.get("bob").store.count() == 2
+    assert registry.default().store.count() == 0
+    assert registry.get("alice").store.location.startswith(str(tmp_path / "users" / "alice"))
+    assert registry.users() == ["alice", "bob"]
+    assert registry.get("alice").aggregates.snapshot()["total"] == 10.0
+
+
+def test_least_recently_used_tenant_is_evicted(registry):
+    alice = registry.get("alice")
+    registry.get("bob")
+    registry.get("alice")
+    registry.get("carol")
+    assert registry.stats()["open"] == 2 and registry.evicted == 1
+    assert registry.get("alice") is alice
+    # bob was evicted and is reopened from disk
+    assert registry.get("bob") is not None and registry.opened == 4
+
+
+def test_busy_tenant_is_not_evicted(registry, monkeypatch):
+    alice = registry.get("alice")
+    monkeypatch.setattr(type(alice), "busy", property(lambda tenant: tenant.user_id == "alice"))
+    registry.get("bob")
+    registry.get("carol")
+    # Over the limit while alice is busy; the next open evicts bob instead
+    assert registry.stats()["open"] == 3
+    registry.get("dave")
+    assert registry.get("alice") is alice
+    assert registry.stats()["open"] == 3 and registry.evicted == 1
+
+
+def test_writer_routes_rows_by_user_column(registry):
+    writer = registry.writer()
+    written = writer.append(rows(["Starbucks", "Uber", "Amazon", "Netflix"], ["alice", "bob", None, " alice "]))
+    assert written == 4
+    assert registry.get("alice").store.read()["Merchant"].tolist() == ["Starbucks", "Netflix"]
+    assert registry.get("bob").store.count() == 1
+    default = registry.default().store.read()
+    assert default["Merchant"].tolist() == ["Amazon"] and "User_Id" not in default.columns
+
+
+def test_writer_for_one_user_ignores_user_column(registry):
+    registry.writer("carol").append(rows(["Starbucks", "Uber"], ["alice", "bob"]))
+    assert registry.get("carol").store.count() == 2
+    assert registry.users() == ["carol"]
+
+
+def test_writer_rejects_chunk_with_bad_user_id(registry):
+    with pytest.raises(ValueError):
+        registry.writer().append(rows(["Starbucks", "Uber"], ["alice", "../evil"]))
+    assert registry.users() == []
+    with pytest.raises(ValueError):
+        registry.writer("../evil")
+
+
+def test_api_keeps_users_apart(client):
+    tx = {"date": "2025-11-20", "merchant": "Bakery", "amount": 4.5, "category": "Food", "user_id": "tenant-api"}
+    before = len(client.get("/transactions").json())
+    assert client.post("/transactions", json=tx).status_code in (200, 201)
+    assert [r["Description"] for r in client.get("/transactions", params={"user_id": "tenant-api"}).json()] == ["Bakery"]
+    assert len(client.get("/transactions").json()) == before
+    assert client.get("/transactions", params={"user_id": "../x"}).status_code == 400
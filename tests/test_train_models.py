@@ -0,0 +1,54 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import LabelEncoder
+
+import train_models
+
+
+class FakeFrame:
+    def __init__(self, df):
+        self.df = df
+
+    def get(self, columns=None):
+        return self.df if columns is None else self.df[columns]
+
+
+def training_frame(encoder, rows=240):
+    rng = np.random.default_rng(0)
+    dates = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 240, rows), unit="D")
+    merchants = rng.choice(["Starbucks", "Amazon", "Uber"], rows)
+    categories = pd.Series(merchants).map({"Starbucks": "Food", "Amazon": "Shopping", "Uber": "Transport"})
+    return pd.DataFrame({
+        "Date": dates,
+        "Merchant": merchants,
+        "Amount": rng.uniform(10, 500, rows),
+        "Category": categories,
+        "Category_Encoded": encoder.transform(categories),
+        "DayOfWeek": dates.dayofweek,
+        "IsWeekend": (dates.dayofweek >= 5).astype(int),
+        "Is_Expense": True,
+        "Is_Anomaly": False,
+        "Month": dates.strftime("%Y-%m"),
+    })
+
+
+def test_compile_mismatch_blocks_publish(tmp_path, monkeypatch):
+    encoder = LabelEncoder().fit(["Food", "Shopping", "Transport"])
+    with open(tmp_path / "category_encoder.pkl", "wb") as f:
+        pickle.dump(encoder, f)
+    published = []
+    monkeypatch.setattr(train_models, "MODELS_DIR", str(tmp_path))
+    monkeypatch.setattr(train_models, "CACHE_DIR", str(tmp_path / ".feature_cache"))
+    monkeypatch.setattr(train_models, "REPORT_PATH", str(tmp_path / "training_report.json"))
+    monkeypatch.setattr(train_models, "get_frame", lambda: FakeFrame(training_frame(encoder)))
+    monkeypatch.setattr(train_models, "matches", lambda compiled, X: False)
+    monkeypatch.setattr(train_models, "publish", lambda *args, **kwargs: published.append(args))
+
+    with pytest.raises(train_models.CompileCheckError):
+        train_models.train_models(workers=1, n_jobs=1, force=True)
+    assert published == []
+    assert not os.path.exists(tmp_path / "CURRENT")
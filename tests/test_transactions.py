@@ -0,0 +1,87 @@
+import json
+import math
+
+import pandas as pd
+import pytest
+
+from conftest import BASELINE_CSV
+
+
+def baseline_records():
+    """What GET /transactions returned before the store: the CSV rows, NaN as null."""
+    records = pd.read_csv(BASELINE_CSV).to_dict(orient="records")
+    return [{k: None if isinstance(v, float) and math.isnan(v) else v for k, v in r.items()} for r in records]
+
+
+def test_transactions_match_baseline_values(client):
+    response = client.get("/transactions")
+    assert response.status_code == 200
+    rows = response.json()
+    expected = baseline_records()
+    assert len(rows) == len(expected)
+    for row, want in zip(rows, expected):
+        for key in ("Date", "Merchant", "Amount", "Category", "Is_Expense", "Is_Anomaly", "Description"):
+            assert row[key] == want[key], key
+    # Exact text too: no noise digits such as 780.590000000000032
+    assert '"Amount":780.59,' in response.text
+    assert '"Amount":0.1,' in response.text
+
+
+def test_paged_transactions_match_baseline_values(client):
+    rows = client.get("/transactions", params={"limit": 2, "fields": "Merchant,Amount"}).json()
+    assert rows == [{"Merchant": "Starbucks", "Amount": 780.59}, {"Merchant": "Uber", "Amount": 0.1}]
+
+
+def test_fields_id_streams_every_row(client):
+    rows = client.get("/transactions", params={"fields": "id"}).json()
+    assert len(rows) == len(baseline_records())
+    assert all(list(row) == ["id"] for row in rows)
+    assert client.get("/transactions", params={"fields": "id", "format": "ndjson"}).text.count("\n") == len(rows)
+
+
+def test_fields_id_with_other_columns(client):
+    rows = client.get("/transactions", params={"fields": "id,Amount"}).json()
+    assert [list(row) for row in rows] == [["id", "Amount"]] * len(rows)
+
+
+def test_unknown_field_is_rejected(client):
+    response = client.get("/transactions", params={"fields": "Amount,bogus"})
+    assert response.status_code == 400
+    assert "bogus" in response.json()["detail"]
+
+
+def failing_store(monkeypatch, fail_at):
+    """Make the default store's chunked reads fail at chunk `fail_at`."""
+    import main
+
+    store = main.TENANTS.default().store
+    iter_read = store.iter_read
+
+    def broken(*args, **kwargs):
+        for i, chunk in enumerate(iter_read(*args, **{**kwargs, "chunk_size": 2})):
+            if i == fail_at:
+                raise RuntimeError("disk on fire")
+            yield chunk
+
+    monkeypatch.setattr(store, "iter_read", broken)
+
+
+def test_store_error_before_streaming_is_500(client, monkeypatch):
+    failing_store(monkeypatch, 0)
+    response = client.get("/transactions")
+    assert response.status_code == 500
+    assert "disk on fire" in response.json()["detail"]
+
+
+def test_store_error_mid_stream_ends_ndjson_with_error(client, monkeypatch):
+    failing_store(monkeypatch, 1)
+    response = client.get("/transactions", params={"format": "ndjson"})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 3
+    assert lines[-1] == {"error": "disk on fire"}
+
+
+def test_store_error_mid_stream_aborts_json(client, monkeypatch):
+    failing_store(monkeypatch, 1)
+    with pytest.raises(RuntimeError, match="disk on fire"):
+        client.get("/transactions")
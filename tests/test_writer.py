@@ -0,0 +1,55 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import writer
+from store import open_store
+
+
+class LockedError(Exception):
+    """Carries a lock, so it cannot be pickled back to the worker."""
+
+
+@pytest.fixture
+def writer_address(tmp_path, monkeypatch):
+    store = open_store("sqlite", str(tmp_path))
+
+    def update_column(ids, column, values):
+        raise LockedError(threading.Lock())
+
+    monkeypatch.setattr(store, "update_column", update_column)
+    monkeypatch.setattr(writer, "open_store", lambda backend, directory: store)
+    address = str(tmp_path / "writer.sock")
+    threading.Thread(target=writer.serve, args=(address, b"key"), daemon=True).start()
+    for _ in range(100):
+        if os.path.exists(address):
+            break
+        time.sleep(0.05)
+    return address, store
+
+
+def test_writes_go_through_the_writer(writer_address):
+    address, store = writer_address
+    client = writer.WriterClient(address, b"key")
+    remote = writer.RemoteWriteStore(store, client)
+    seen = []
+    remote.subscribe(lambda df, version: seen.append(version))
+    written = remote.append(pd.DataFrame({"Date": ["2025-11-03"], "Merchant": ["Uber"], "Amount": [5.0]}))
+    assert written == 1
+    assert seen == [store.version()]
+    assert remote.count() == 1
+    with pytest.raises(ValueError):
+        client.call("replace", None, pd.DataFrame())
+
+
+def test_unpicklable_error_still_answers(writer_address):
+    address, _ = writer_address
+    client = writer.WriterClient(address, b"key")
+    with pytest.raises(RuntimeError, match="LockedError"):
+        client.call("update_column", None, [1], "Category", ["Food"])
+    # The connection is still usable afterwards
+    with pytest.raises(ValueError):
+        client.call("replace", None, pd.DataFrame())